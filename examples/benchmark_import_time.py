@@ -0,0 +1,37 @@
+"""
+Benchmark of the time to import the engine and the GUI, each one in a fresh interpreter.
+
+`import checkers` must only load NumPy and the engine: the GUI (the gui package, with matplotlib and Pillow) is an
+optional extra imported on demand, e.g., by `StateVector.visualize`.
+
+Run it with `python examples/benchmark_import_time.py`.
+"""
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ('matplotlib', 'PIL', 'gui')
+
+
+def cold_import(module, repeat=5):
+	"""Return the best time of the import of the module in a fresh interpreter, in ms, and the heavy modules it loads."""
+	script = (f'import sys, time; t = time.perf_counter(); import {module}; t = time.perf_counter() - t; '
+	          f'print(t, *sorted({{m.split(".")[0] for m in sys.modules}} & set({HEAVY_MODULES!r})))')
+	env = {**os.environ, 'PYTHONPATH': os.pathsep.join(p for p in sys.path if p)}
+	times, heavy = [], []
+	for _ in range(repeat):
+		output = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True)
+		t, *heavy = output.stdout.split()
+		times.append(float(t) * 1e3)
+	return min(times), heavy
+
+
+def main():
+	print(f'{"module":<12}{"import (ms)":>14}  heavy modules loaded')
+	for module in ('numpy', 'checkers', 'gui'):
+		t, heavy = cold_import(module)
+		print(f'{module:<12}{t:>14.1f}  {", ".join(heavy) or "-"}')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,62 @@
+"""
+Micro-benchmark of the `PieceHelper` kernels against the `np.vectorize` and list-building versions they replaced.
+
+Run it with `python examples/benchmark_piece_helper.py`.
+"""
+import timeit
+
+import numpy as np
+
+from checkers import StateVector, StateTransitions
+from checkers.piece import PieceHelper
+
+
+@np.vectorize
+def vectorized_piece_color(piece):
+	if piece == PieceHelper.empty_square:
+		return 0
+	else:
+		return PieceHelper.dark if piece < PieceHelper.empty_square else PieceHelper.light
+
+
+def list_get_diagonals(piece_value):
+	if abs(piece_value) == PieceHelper.queen:
+		return [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+	if abs(piece_value) == PieceHelper.piece:
+		color = vectorized_piece_color(piece_value)
+		return [(1 * color, 1), (1 * color, -1)]
+
+
+def vectorized_pieces_in_turn(state):
+	return list(*np.where(vectorized_piece_color(state[:-1]) == state.turn))
+
+
+def benchmark(statement, number):
+	"""Return the best time of a call of the statement in microseconds."""
+	return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+	state = StateVector()
+	piece = state[0]
+	board = np.asarray(state[:-1])
+
+	cases = [
+		('piece_color (scalar)', lambda: vectorized_piece_color(piece), lambda: PieceHelper.piece_color(piece), 20000),
+		('piece_color (board)', lambda: vectorized_piece_color(board), lambda: PieceHelper.piece_colors(board), 20000),
+		('get_diagonals', lambda: list_get_diagonals(piece), lambda: PieceHelper.get_diagonals(piece), 20000),
+		('get_pieces_in_turn', lambda: vectorized_pieces_in_turn(state), state.get_pieces_in_turn, 20000),
+	]
+
+	print(f'{"helper":<24}{"before (us)":>14}{"after (us)":>14}{"speed-up":>10}')
+	for name, before, after, number in cases:
+		t_before, t_after = benchmark(before, number), benchmark(after, number)
+		print(f'{name:<24}{t_before:>14.2f}{t_after:>14.2f}{t_before / t_after:>9.1f}x')
+
+	StateTransitions.set_backend('numpy')
+	t = benchmark(lambda: StateTransitions.feasible_next_moves(state), 500)
+	print(f'\nfeasible_next_moves of the initial state with the numpy backend: {t:.1f} us')
+
+
+if __name__ == '__main__':
+	main()
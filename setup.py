@@ -5,8 +5,9 @@ import os
 data_files = []
 
 
-# List your package requirements.
-requires = []
+# List your package requirements. The GUI (the gui package) is an optional extra: `pip install .[gui]`.
+requires = ['numpy']
+extras = {'gui': ['matplotlib', 'Pillow']}
 
 setup(
 	name='',
@@ -16,7 +17,9 @@ setup(
 	package_dir={"": "src"},
 	# include data files
 	data_files=data_files,
+	package_data={'gui': ['data/gui_data/*.png']},
 	install_requires=requires,
+	extras_require=extras,
 	# If you want to create a cli list your entry points in the following format:
 	# [console_scripts]
 	# 'command_name' = 'path_to_python_file:function_to_call'
@@ -1,3 +1,15 @@
 from .board import *
+from .move import Move
+from .bitboard import BitBoard, BitboardTransitions
+from .adjudication import Adjudicator
 from .game import *
+from .history import StateHistory, MoveHistory
+from .records import GameRecordWriter, GameRecordReader
+from .tablebase import EndgameTablebase
+from .book import OpeningBook
+from .instrumentation import Instrumentation
+from .features import FeatureExtractor
+from .evaluation import BatchEvaluator
+from .batched import BatchedSimulator
 from .players import *
+from .tournament import Tournament
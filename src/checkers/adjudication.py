@@ -0,0 +1,110 @@
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+
+from checkers.board import StateVector
+from checkers.piece import PieceHelper
+
+
+class Adjudicator:
+    """
+    Ends games that would otherwise go on for too long.
+
+    The adjudicator watches the states of a game, from `Adjudicator.reset` on, and `Adjudicator.update` returns the
+    reason to stop it:
+
+    - 'repetition': the same position, with the same player in turn, appears for the repetitions-th time.
+    - 'quiet_moves': quiet_plies plies have been played without captures or moves of men, as in the 40-move rule.
+    - 'material': the same player is ahead by at least material_margin (men count 1 and queens 2) during
+      resign_plies plies in a row, so the other player resigns.
+
+    The winner of an adjudicated game is given by `CheckersGame.decide_winner` with the reason: the player ahead in
+    material for 'material' and a tie otherwise. An adjudicator keeps the state of one game at a time, so every
+    `CheckersGame` needs its own.
+
+    Attributes:
+    __________
+    repetitions: Optional[int]
+        Number of appearances of a position that ends the game, or None to allow any number.
+    quiet_plies: Optional[int]
+        Number of plies without captures or moves of men that ends the game, or None to allow any number.
+    material_margin: Optional[int]
+        Material advantage that makes the other player resign, or None to never resign.
+    resign_plies: int
+        Number of plies in a row with the advantage before the resignation.
+    """
+    reasons = ('repetition', 'quiet_moves', 'material')
+
+    def __init__(
+            self,
+            repetitions: Optional[int] = 3,
+            quiet_plies: Optional[int] = 80,
+            material_margin: Optional[int] = None,
+            resign_plies: int = 10):
+        self.repetitions = repetitions
+        self.quiet_plies = quiet_plies
+        self.material_margin = material_margin
+        self.resign_plies = resign_plies
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the game watched so far."""
+        # hashes of the positions since the last irreversible move, which are the only ones that can be repeated.
+        self._positions = Counter()
+        self._men = None
+        self._pieces = None
+        self._quiet = 0
+        self._ahead = 0
+        self._leader = PieceHelper.empty_square
+
+    def update(self, state: StateVector) -> Optional[str]:
+        """
+        Watch the next state of the game.
+
+        Parameters
+        ----------
+        state: StateVector
+            The state of the game after the last move, or its initial state after `Adjudicator.reset`.
+
+        Returns
+        -------
+        Optional[str]:
+            The reason to stop the game, or None to go on.
+        """
+        values = np.asarray(state[:-1])
+        men = np.abs(values) == PieceHelper.piece
+        pieces = np.count_nonzero(values)
+
+        if self._men is None or pieces != self._pieces or (men != self._men).any():
+            self._positions.clear()
+            self._quiet = 0
+        else:
+            self._quiet += 1
+        self._men, self._pieces = men, pieces
+
+        if self.repetitions is not None:
+            key = state.zobrist_hash
+            self._positions[key] += 1
+            if self._positions[key] >= self.repetitions:
+                return 'repetition'
+
+        if self.quiet_plies is not None and self._quiet >= self.quiet_plies:
+            return 'quiet_moves'
+
+        if self.material_margin is not None:
+            material = int(values.sum())
+            leader = PieceHelper.piece_color(material) if abs(material) >= self.material_margin \
+                else PieceHelper.empty_square
+            if leader == PieceHelper.empty_square:
+                self._ahead = 0
+            elif leader == self._leader:
+                self._ahead += 1
+            else:
+                # the lead changed sides, so the plies in a row start again.
+                self._ahead = 1
+            self._leader = leader
+            if self._ahead >= self.resign_plies:
+                return 'material'
+
+        return None
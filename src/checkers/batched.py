@@ -0,0 +1,387 @@
+import numpy as np
+from typing import List, Optional, Tuple
+
+from checkers.board import StateVector
+from checkers.piece import PieceHelper
+from checkers.tables import BoardTables, get_tables
+
+
+class BatchedSimulator:
+    """
+    Simulates many games between uniform random players in lockstep.
+
+    The K games are stored as a single (K, n + 1) int8 array, where the last column is a wall that stops the pieces
+    from leaving the board, and the moves of all the active games are generated and applied with vectorized operations
+    on every ply. The games follow the rules of `StateTransitions.feasible_next_moves` and every player chooses
+    uniformly among the successors returned by it, i.e., they play as `UniformPlayer` does.
+
+    Attributes:
+    __________
+    size_of_the_board: int
+        Size of the board.
+    rng: np.random.Generator
+        Source of randomness of the players.
+    """
+    # Value of the wall column. It is neither empty nor reachable by a jump, since the square behind it is the wall too.
+    _wall = 100
+
+    def __init__(self, size_of_the_board: int = 8, seed: Optional[int] = None):
+        self.size_of_the_board = size_of_the_board
+        self.rng = np.random.default_rng(seed)
+
+        tables = get_tables(size_of_the_board)
+        n = tables.number_of_squares
+        self._number_of_squares = n
+
+        # squares outside the board point to the wall column.
+        self._neighbours = np.where(tables.neighbours == -1, n, tables.neighbours)
+        self._jumps = np.where(tables.jumps == -1, n, tables.jumps)
+
+        # allowed directions indexed by piece value + PieceHelper.queen
+        self._allowed = np.zeros((2 * PieceHelper.queen + 1, len(BoardTables.diagonals)), dtype=bool)
+        for value in (-PieceHelper.queen, -PieceHelper.piece, PieceHelper.piece, PieceHelper.queen):
+            for d in PieceHelper.get_diagonals(piece_value=value):
+                self._allowed[value + PieceHelper.queen, BoardTables.direction_index(d)] = True
+
+        # squares in which the men of each color are promoted, indexed by color + 1
+        rows = np.array(tables.rows)
+        self._promotion = np.zeros((3, n), dtype=bool)
+        self._promotion[PieceHelper.light + 1] = rows == size_of_the_board - 1
+        self._promotion[PieceHelper.dark + 1] = rows == 0
+
+    def simulate_games(
+            self,
+            number_of_games: int,
+            number_of_moves: Optional[int] = np.inf,
+            initial_state: Optional[StateVector] = None
+    ) -> Tuple[List[List[StateVector]], List[int]]:
+        """
+        Simulate number_of_games checkers games until someone wins.
+
+        Parameters
+        ----------
+        number_of_games: int
+            Number of games that will be played.
+        number_of_moves: Optional[int]
+            The maximum number of turns of every game, as in `CheckersGame.simulate_game`.
+        initial_state: Optional[StateVector]
+            The initial state of every game.
+
+        Returns
+        -------
+        Tuple[List[List[StateVector]], List[int]]
+            The list of histories and the list of results for the simulated games, with the same structure as the
+            ones of `CheckersGame.simulate_games`.
+        """
+        if initial_state is None:
+            initial_state = StateVector(self.size_of_the_board)
+        n = self._number_of_squares
+
+        # active games: boards with the wall column, turns and global index.
+        boards = np.empty((number_of_games, n + 1), dtype=PieceHelper.dtype)
+        boards[:, :n] = initial_state[:-1]
+        boards[:, n] = self._wall
+        turns = np.full(number_of_games, initial_state.turn, dtype=PieceHelper.dtype)
+        games = np.arange(number_of_games)
+
+        snapshots, snapshot_games = [], []
+        winners = np.zeros(number_of_games, dtype=int)
+
+        turn = 0
+        while len(games):
+            snapshot = np.empty((len(games), n + 1), dtype=PieceHelper.dtype)
+            snapshot[:, :n] = boards[:, :n]
+            snapshot[:, n] = turns
+            snapshots.append(snapshot)
+            snapshot_games.append(games)
+
+            if turn > number_of_moves:
+                has_move = np.zeros(len(games), dtype=bool)
+            else:
+                has_move = self._play_random_moves(boards, turns)
+
+            finished = ~has_move
+            if finished.any():
+                winners[games[finished]] = self.decide_winners(boards[finished, :n])
+                boards, turns, games = boards[has_move], turns[has_move], games[has_move]
+            turn += 1
+
+        # group the snapshots by game. The stable sort keeps them in the order in which they were played.
+        states = np.concatenate(snapshots)
+        order = np.argsort(np.concatenate(snapshot_games), kind='stable')
+        lengths = np.bincount(np.concatenate(snapshot_games), minlength=number_of_games)
+        states = states[order].view(StateVector)
+        states.size_of_the_board = self.size_of_the_board
+
+        histories = []
+        start = 0
+        for length in lengths.tolist():
+            histories.append(list(states[start: start + length]))
+            start += length
+
+        return histories, winners.tolist()
+
+    def play_out(self, states: np.ndarray, number_of_moves: Optional[int] = np.inf) -> np.ndarray:
+        """
+        Play random games from many states at once and return only their results.
+
+        Parameters
+        ----------
+        states: np.ndarray
+            Array of shape (K, n) with the initial states, including the turn in the last column. Every game can start
+            from a different state.
+        number_of_moves: Optional[int]
+            The maximum number of turns of every game, as in `CheckersGame.simulate_game`.
+
+        Returns
+        -------
+        np.ndarray:
+            The winning color of every game, or `PieceHelper.empty_square` for a tie.
+        """
+        n = self._number_of_squares
+        states = np.asarray(states)
+
+        boards = np.empty((len(states), n + 1), dtype=PieceHelper.dtype)
+        boards[:, :n] = states[:, :n]
+        boards[:, n] = self._wall
+        turns = states[:, n].astype(PieceHelper.dtype)
+        games = np.arange(len(states))
+        winners = np.zeros(len(states), dtype=int)
+
+        turn = 0
+        while len(games):
+            if turn > number_of_moves:
+                has_move = np.zeros(len(games), dtype=bool)
+            else:
+                has_move = self._play_random_moves(boards, turns)
+
+            finished = ~has_move
+            if finished.any():
+                winners[games[finished]] = self.decide_winners(boards[finished, :n])
+                boards, turns, games = boards[has_move], turns[has_move], games[has_move]
+            turn += 1
+
+        return winners
+
+    @staticmethod
+    def decide_winners(boards: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of `CheckersGame.decide_winner`.
+
+        Parameters
+        ----------
+        boards: np.ndarray
+            Array of shape (K, n) with the squares of K final states (without the turn).
+
+        Returns
+        -------
+        np.ndarray:
+            The winning color of every game, or `PieceHelper.empty_square` for a tie.
+        """
+        min_ = boards.min(axis=1)
+        max_ = boards.max(axis=1)
+        return np.where((min_ != PieceHelper.empty_square) & (max_ == PieceHelper.empty_square), np.sign(min_),
+                        np.where((max_ != PieceHelper.empty_square) & (min_ == PieceHelper.empty_square),
+                                 np.sign(max_), PieceHelper.empty_square))
+
+    def count_feasible_moves(self, states: np.ndarray) -> np.ndarray:
+        """
+        Count the successors that `StateTransitions.feasible_next_moves` returns for many states at once.
+
+        Parameters
+        ----------
+        states: np.ndarray
+            Array of shape (K, n) with K states, including the turn in the last column.
+
+        Returns
+        -------
+        np.ndarray:
+            The number of successors of every state.
+        """
+        n = self._number_of_squares
+        boards = np.empty((len(states), n + 1), dtype=PieceHelper.dtype)
+        boards[:, :n] = np.asarray(states)[:, :n]
+        boards[:, n] = self._wall
+        turns = np.asarray(states)[:, n].astype(PieceHelper.dtype)
+
+        return np.bincount(self._feasible_moves(boards, turns)[0], minlength=len(states))
+
+    def successors(self, states: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Generate the successors that `StateTransitions.feasible_next_moves` returns for many states at once.
+
+        Parameters
+        ----------
+        states: np.ndarray
+            Array of shape (K, n) with K states, including the turn in the last column.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]:
+            The index of the state of every successor, in increasing order, and an array of shape (M, n) with the
+            successors, including the turn. The successors of every state are the same as the ones returned by
+            `StateTransitions.feasible_next_moves`, although not necessarily in the same order.
+        """
+        n = self._number_of_squares
+        states = np.asarray(states)
+        boards = np.empty((len(states), n + 1), dtype=PieceHelper.dtype)
+        boards[:, :n] = states[:, :n]
+        boards[:, n] = self._wall
+        turns = states[:, n].astype(PieceHelper.dtype)
+
+        candidate_games, candidates, moves, jumps = self._feasible_moves(boards, turns)
+        move_games, move_origins, move_targets = moves
+        jump_games, jump_boards = jumps
+
+        number_of_moves = len(move_games)
+        simple = candidates[candidates < number_of_moves]
+        jumped = candidates[candidates >= number_of_moves] - number_of_moves
+
+        g, o, t = move_games[simple], move_origins[simple], move_targets[simple]
+        moved = boards[g, o]
+        promote = (np.abs(moved) == PieceHelper.piece) & self._promotion[turns[g] + 1, t]
+        simple_boards = boards[g]
+        rows = np.arange(len(g))
+        simple_boards[rows, o] = PieceHelper.empty_square
+        simple_boards[rows, t] = np.where(promote, moved * PieceHelper.queen, moved)
+
+        games = np.concatenate([g, jump_games[jumped]])
+        successors = np.concatenate([simple_boards, jump_boards[jumped]])
+        successors[:, n] = -turns[games]
+
+        order = np.argsort(games, kind='stable')
+        return games[order], successors[order]
+
+    def _play_random_moves(self, boards: np.ndarray, turns: np.ndarray) -> np.ndarray:
+        """
+        Apply in place one uniformly random feasible move to every game.
+
+        Returns a boolean array indicating which games had at least one feasible move.
+        """
+        n = self._number_of_squares
+        number_of_games = len(boards)
+        values = boards[:, :n]
+
+        candidate_games, candidates, moves, jumps = self._feasible_moves(boards, turns)
+        move_games, move_origins, move_targets = moves
+        jump_games, jump_boards = jumps
+
+        counts = np.bincount(candidate_games, minlength=number_of_games)
+        has_move = counts > 0
+        order = candidates[np.argsort(candidate_games, kind='stable')]
+        starts = np.cumsum(counts) - counts
+        choice = (self.rng.random(number_of_games) * counts).astype(int)
+        chosen = order[(starts + choice)[has_move]]
+
+        # apply the one square moves
+        number_of_moves = len(move_games)
+        simple = chosen[chosen < number_of_moves]
+        g, o, t = move_games[simple], move_origins[simple], move_targets[simple]
+        moved = values[g, o]
+        promote = (np.abs(moved) == PieceHelper.piece) & self._promotion[turns[g] + 1, t]
+        boards[g, o] = PieceHelper.empty_square
+        boards[g, t] = np.where(promote, moved * PieceHelper.queen, moved)
+
+        # apply the jumps
+        jumped = chosen[chosen >= number_of_moves] - number_of_moves
+        boards[jump_games[jumped]] = jump_boards[jumped]
+
+        turns[has_move] *= -1
+        return has_move
+
+    def _feasible_moves(self, boards: np.ndarray, turns: np.ndarray):
+        """
+        Generate the feasible moves of every game.
+
+        Returns
+        -------
+        Tuple:
+            - the game of every feasible move,
+            - the index of every feasible move among the candidates, one square moves first and jumps afterwards,
+            - the game, origin and target of the one square candidates,
+            - the game and resulting board of the jump candidates.
+        """
+        n = self._number_of_squares
+        number_of_games = len(boards)
+        neighbours, jumps = self._neighbours, self._jumps
+
+        values = boards[:, :n]
+        colors = turns[:, None, None]
+        allowed = self._allowed[values + PieceHelper.queen] & (np.sign(values) == turns[:, None])[:, :, None]
+        neighbour_values = boards[:, neighbours]
+        can_jump = allowed & (neighbour_values * colors < 0) & (boards[:, jumps] == PieceHelper.empty_square)
+        can_move = allowed & (neighbour_values == PieceHelper.empty_square)
+
+        # one square moves
+        move_games, move_origins, move_directions = np.nonzero(can_move)
+        move_targets = neighbours[move_origins, move_directions]
+
+        # sequences of jumps, explored breadth first. The frontier holds the boards after each jump.
+        game, origin, direction = np.nonzero(can_jump)
+        value = values[game, origin]
+        square = jumps[origin, direction]
+        frontier = boards[game]
+        rows = np.arange(len(game))
+        frontier[rows, origin] = PieceHelper.empty_square
+        frontier[rows, neighbours[origin, direction]] = PieceHelper.empty_square
+        frontier[rows, square] = value
+        captures = np.ones(len(game), dtype=int)
+
+        jump_games, jump_origins, jump_captures, jump_boards = [], [], [], []
+        while len(game):
+            rows = np.arange(len(game))[:, None]
+            square_neighbours = neighbours[square]
+            square_jumps = jumps[square]
+            neighbour_values = frontier[rows, square_neighbours]
+            allowed = self._allowed[value + PieceHelper.queen]
+            can_jump = allowed & (neighbour_values * np.sign(value)[:, None] < 0) \
+                & (frontier[rows, square_jumps] == PieceHelper.empty_square)
+            stops = allowed & (neighbour_values == PieceHelper.empty_square)
+
+            # the piece stops once for every empty diagonal, exactly as `StateTransitions._feasible_state_diagonal`.
+            # The repeated boards are removed below.
+            stop, _ = np.nonzero(stops)
+            jump_games.append(game[stop])
+            jump_origins.append(origin[stop])
+            jump_captures.append(captures[stop])
+            jump_boards.append(frontier[stop])
+
+            keep, direction = np.nonzero(can_jump)
+            rows = np.arange(len(keep))
+            next_frontier = frontier[keep]
+            next_frontier[rows, square[keep]] = PieceHelper.empty_square
+            next_frontier[rows, square_neighbours[keep, direction]] = PieceHelper.empty_square
+            next_frontier[rows, square_jumps[keep, direction]] = value[keep]
+
+            game, origin, value = game[keep], origin[keep], value[keep]
+            square, captures, frontier = square_jumps[keep, direction], captures[keep] + 1, next_frontier
+
+        jump_games = np.concatenate(jump_games) if jump_games else np.zeros(0, dtype=int)
+        jump_origins = np.concatenate(jump_origins) if jump_origins else np.zeros(0, dtype=int)
+        jump_captures = np.concatenate(jump_captures) if jump_captures else np.zeros(0, dtype=int)
+        jump_boards = np.concatenate(jump_boards) if jump_boards else np.zeros((0, n + 1), dtype=PieceHelper.dtype)
+
+        # a piece stopping in several diagonals reaches the same board several times. As
+        # `StateTransitions.feasible_next_moves`, keep the first appearance of every (game, board) pair.
+        if len(jump_games):
+            rows = np.concatenate([jump_games.astype('<i8').view(np.uint8).reshape(-1, 8), jump_boards.view(np.uint8)],
+                                  axis=1)
+            _, first = np.unique(rows.view(f'V{rows.shape[1]}').ravel(), return_index=True)
+            first.sort()
+            jump_games, jump_origins = jump_games[first], jump_origins[first]
+            jump_captures, jump_boards = jump_captures[first], jump_boards[first]
+
+        # all the candidates: one square moves first, then the jumps.
+        number_of_moves = len(move_games)
+        candidate_games = np.concatenate([move_games, jump_games])
+        candidate_origins = np.concatenate([move_origins, jump_origins])
+        candidate_captures = np.concatenate([np.zeros(number_of_moves, dtype=int), jump_captures])
+
+        # each piece keeps only the moves that capture the most pieces.
+        piece = candidate_games * n + candidate_origins
+        most_captures = np.zeros(number_of_games * n, dtype=int)
+        np.maximum.at(most_captures, piece, candidate_captures)
+        candidates = np.flatnonzero(candidate_captures == most_captures[piece])
+
+        return (candidate_games[candidates], candidates, (move_games, move_origins, move_targets),
+                (jump_games, jump_boards))
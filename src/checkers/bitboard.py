@@ -0,0 +1,333 @@
+import numpy as np
+from functools import lru_cache
+from typing import List, Tuple
+
+from checkers.board import StateVector, StateTransitions
+from checkers.piece import PieceHelper
+
+
+class BitboardLayout:
+    """
+    Bit layout used by the bitboard engine for a given board size.
+
+    The squares are stored in the same order as in `StateVector`, but a ghost bit is inserted after every pair of
+    rows. With that padding a diagonal step is always the same shift regardless of the parity of the row, and a step
+    out of the board always lands either on a ghost bit or outside of the valid mask.
+
+    Attributes:
+    __________
+    size_of_the_board: int
+        Size of the board.
+    number_of_squares: int
+        Number of playable squares, i.e., `len(StateVector) - 1`.
+    bits: Tuple[int, ...]
+        Bit (as an integer with a single bit set) of every square index.
+    valid: int
+        Mask with the bits of all the playable squares.
+    light_promotion: int
+        Mask with the squares in which the light pieces are promoted.
+    dark_promotion: int
+        Mask with the squares in which the dark pieces are promoted.
+    shifts: dict
+        Signed shift of every diagonal in the `PieceHelper.get_diagonals` convention.
+    piece_shifts: dict
+        Shifts of the diagonals in which every piece value can move, in the order of `PieceHelper.get_diagonals`.
+    """
+
+    def __init__(self, size_of_the_board: int = 8):
+        if size_of_the_board % 2:
+            raise Exception('The bitboard engine only supports boards with an even size.')
+
+        n = size_of_the_board
+        h = n // 2
+
+        self.size_of_the_board = n
+        self.number_of_squares = n * n // 2
+
+        positions = [k + k // n for k in range(self.number_of_squares)]
+        self.bits = tuple(1 << p for p in positions)
+        self._index_of_position = {p: k for k, p in enumerate(positions)}
+
+        self.valid = sum(self.bits)
+        self.light_promotion = sum(self.bits[-h:])
+        self.dark_promotion = sum(self.bits[:h])
+
+        self.shifts = {(1, 1): h + 1, (1, -1): h, (-1, 1): -h, (-1, -1): -(h + 1)}
+        self.piece_shifts = {
+            color * kind: tuple(self.shifts[d] for d in PieceHelper.get_diagonals(piece_value=color * kind))
+            for color in (PieceHelper.light, PieceHelper.dark)
+            for kind in (PieceHelper.piece, PieceHelper.queen)
+        }
+
+    def index_of_bit(self, bit: int) -> int:
+        """Return the `StateVector` index of a single bit."""
+        return self._index_of_position[bit.bit_length() - 1]
+
+    def iterate_bits(self, mask: int):
+        """Iterate over the single bits of a mask in increasing index order."""
+        while mask:
+            bit = mask & -mask
+            yield bit
+            mask ^= bit
+
+
+@lru_cache(maxsize=None)
+def get_layout(size_of_the_board: int = 8) -> BitboardLayout:
+    """Return the (cached) bitboard layout for the given board size."""
+    return BitboardLayout(size_of_the_board)
+
+
+def shift(mask: int, amount: int) -> int:
+    """Shift a mask to the left if amount is positive and to the right otherwise."""
+    return mask << amount if amount > 0 else mask >> -amount
+
+
+class BitBoard:
+    """
+    A checkers position stored as three integer masks.
+
+    Attributes:
+    __________
+    light: int
+        Squares occupied by light pieces (men or queens).
+    dark: int
+        Squares occupied by dark pieces (men or queens).
+    kings: int
+        Squares occupied by queens of any color.
+    turn: int
+        `PieceHelper.light` or `PieceHelper.dark`.
+    size_of_the_board: int
+        Size of the board.
+    """
+    __slots__ = ('light', 'dark', 'kings', 'turn', 'size_of_the_board')
+
+    def __init__(self, light: int, dark: int, kings: int, turn: int, size_of_the_board: int = 8):
+        self.light = light
+        self.dark = dark
+        self.kings = kings
+        self.turn = turn
+        self.size_of_the_board = size_of_the_board
+
+    def __eq__(self, other):
+        return (isinstance(other, BitBoard)
+                and (self.light, self.dark, self.kings, self.turn, self.size_of_the_board)
+                == (other.light, other.dark, other.kings, other.turn, other.size_of_the_board))
+
+    def __hash__(self):
+        return hash((self.light, self.dark, self.kings, self.turn, self.size_of_the_board))
+
+    def __repr__(self):
+        return (f'BitBoard(light={self.light:#x}, dark={self.dark:#x}, kings={self.kings:#x}, '
+                f'turn={self.turn}, size_of_the_board={self.size_of_the_board})')
+
+    @staticmethod
+    def from_state(state: StateVector) -> 'BitBoard':
+        """
+        Build the bitboard representation of a StateVector.
+
+        Parameters
+        ----------
+        state: StateVector
+            The state to convert.
+
+        Returns
+        -------
+        BitBoard:
+            The same position stored as masks.
+        """
+        layout = get_layout(state.size_of_the_board)
+        bits = layout.bits
+        light = dark = kings = 0
+        for k in np.flatnonzero(state[:-1]).tolist():
+            value = state[k]
+            if value > PieceHelper.empty_square:
+                light |= bits[k]
+            else:
+                dark |= bits[k]
+            if abs(value) == PieceHelper.queen:
+                kings |= bits[k]
+
+        return BitBoard(light, dark, kings, int(state.turn), state.size_of_the_board)
+
+    def to_state(self) -> StateVector:
+        """
+        Build the StateVector representation of the position.
+
+        Returns
+        -------
+        StateVector:
+            The same position stored as a StateVector.
+        """
+        layout = get_layout(self.size_of_the_board)
+        values = np.zeros(layout.number_of_squares + 1, dtype=PieceHelper.dtype)
+
+        for color, mask in ((PieceHelper.light, self.light), (PieceHelper.dark, self.dark)):
+            for bit in layout.iterate_bits(mask):
+                values[layout.index_of_bit(bit)] = color * (PieceHelper.queen if bit & self.kings
+                                                            else PieceHelper.piece)
+        values[-1] = self.turn
+
+        state = values.view(StateVector)
+        state.size_of_the_board = self.size_of_the_board
+        return state
+
+
+class BitboardTransitions:
+    """
+    Move generator working on `BitBoard` positions.
+
+    It follows exactly the same rules as `StateTransitions.feasible_next_moves`, including the order in which the
+    successors are returned: pieces are visited in increasing index order, diagonals in the order given by
+    `PieceHelper.get_diagonals`, and only the moves that capture the most pieces are kept for each piece.
+    """
+
+    @staticmethod
+    def feasible_next_moves(board: BitBoard) -> List[BitBoard]:
+        """
+        Return all the possible next positions.
+
+        Parameters
+        ----------
+        board: BitBoard
+            The position in which the move will be made.
+
+        Returns
+        -------
+        List[BitBoard]:
+            List of BitBoard with the feasible positions that the game can reach in one step.
+        """
+        layout = get_layout(board.size_of_the_board)
+        valid = layout.valid
+
+        if board.turn == PieceHelper.light:
+            own, opponent = board.light, board.dark
+            promotion = layout.light_promotion
+        else:
+            own, opponent = board.dark, board.light
+            promotion = layout.dark_promotion
+        empty = valid & ~(board.light | board.dark)
+
+        men_shifts = layout.piece_shifts[board.turn * PieceHelper.piece]
+        king_shifts = layout.piece_shifts[board.turn * PieceHelper.queen]
+
+        # pieces having at least one immediate jump. The rest of them can only move one square.
+        men = own & ~board.kings
+        kings = own & board.kings
+        jumpers = 0
+        for pieces, shifts in ((men, men_shifts), (kings, king_shifts)):
+            for s in shifts:
+                jumpers |= shift(shift(shift(shift(pieces, s) & opponent, s) & empty, -s), -s)
+
+        successors = []
+        for bit in layout.iterate_bits(own):
+            is_king = bool(bit & board.kings)
+            shifts = king_shifts if is_king else men_shifts
+
+            if bit & jumpers:
+                moves = []
+                BitboardTransitions._jumps(board, layout, bit, bit, is_king, shifts, opponent, empty | bit, 0,
+                                           promotion, moves)
+                if moves:
+                    most_captures = max(c for c, _ in moves)
+                    # a position reached through several stops of the same jumps is listed once.
+                    successors.extend(dict.fromkeys(m for c, m in moves if c == most_captures))
+            else:
+                for s in shifts:
+                    target = shift(bit, s) & empty
+                    if target:
+                        successors.append(BitboardTransitions._simple_move(board, bit, target, is_king, promotion))
+
+        return successors
+
+    @staticmethod
+    def _simple_move(board: BitBoard, origin: int, target: int, is_king: bool, promotion: int) -> BitBoard:
+        """Return the position after moving the piece in origin one square to target."""
+        kings = board.kings & ~origin
+        if is_king or target & promotion:
+            kings |= target
+
+        if board.turn == PieceHelper.light:
+            return BitBoard(board.light ^ origin ^ target, board.dark, kings, PieceHelper.dark,
+                            board.size_of_the_board)
+        else:
+            return BitBoard(board.light, board.dark ^ origin ^ target, kings, PieceHelper.light,
+                            board.size_of_the_board)
+
+    @staticmethod
+    def _jumps(
+            board: BitBoard,
+            layout: BitboardLayout,
+            origin: int,
+            square: int,
+            is_king: bool,
+            shifts: List[int],
+            opponent: int,
+            empty: int,
+            captured: int,
+            promotion: int,
+            moves: List[Tuple[int, BitBoard]]) -> None:
+        """
+        Explore the moves of the piece standing in square, appending (number of captures, position) pairs to moves.
+
+        `empty` must already contain the origin square of the piece and `opponent` must not contain the pieces that
+        were captured along the way. The rules are the ones of `StateTransitions._feasible_state_diagonal`: a piece
+        that has jumped stops in every diagonal whose next square is empty, and it does not produce any move in
+        the diagonals that are blocked.
+        """
+        valid = layout.valid
+        for s in shifts:
+            neighbour = shift(square, s)
+            if not neighbour & valid:
+                continue
+
+            landing = shift(neighbour, s)
+            if neighbour & opponent and landing & empty:
+                BitboardTransitions._jumps(board, layout, origin, landing, is_king, shifts, opponent & ~neighbour,
+                                           (empty | neighbour | square) & ~landing, captured | neighbour,
+                                           promotion, moves)
+            elif neighbour & empty:
+                if captured:
+                    moves.append((bin(captured).count('1'),
+                                  BitboardTransitions._jump_result(board, origin, square, captured)))
+                else:
+                    moves.append((0, BitboardTransitions._simple_move(board, origin, neighbour, is_king, promotion)))
+
+    @staticmethod
+    def _jump_result(board: BitBoard, origin: int, landing: int, captured: int) -> BitBoard:
+        """
+        Return the position after a sequence of jumps from origin to landing capturing the pieces in captured.
+
+        As in `StateTransitions._feasible_state_diagonal`, a piece is never promoted by a jump.
+        """
+        kings = board.kings & ~captured
+        if kings & origin:
+            kings = kings & ~origin | landing
+
+        if board.turn == PieceHelper.light:
+            return BitBoard(board.light & ~origin | landing, board.dark & ~captured, kings, PieceHelper.dark,
+                            board.size_of_the_board)
+        else:
+            return BitBoard(board.light & ~captured, board.dark & ~origin | landing, kings, PieceHelper.light,
+                            board.size_of_the_board)
+
+    @staticmethod
+    def feasible_next_states(state: StateVector) -> List[StateVector]:
+        """
+        Return all the possible next moves of a StateVector computed with the bitboard engine.
+
+        This is the function registered as the 'bitboard' backend of `StateTransitions`.
+
+        Parameters
+        ----------
+        state: StateVector:
+            The state in which the move will be made.
+
+        Returns
+        -------
+        List[StateVector]:
+            List of StateVector with the feasible states that the game can reach in one step.
+        """
+        return [board.to_state() for board in BitboardTransitions.feasible_next_moves(BitBoard.from_state(state))]
+
+
+StateTransitions.register_backend('bitboard', BitboardTransitions.feasible_next_states)
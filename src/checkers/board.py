@@ -1,12 +1,13 @@
 import numpy as np
-from typing import List, Tuple, Union
+from typing import List, Optional, Tuple, Union
 import logging
 from copy import deepcopy
-import matplotlib.pyplot as plt
 
-from gui import Visualizer
+from checkers.move import Move
 from checkers.piece import PieceHelper
-from utils import flatten_list
+from checkers.tables import BoardTables, get_tables
+from checkers.zobrist import PositionKey, get_zobrist_keys
+from utils import flatten_list, rm_duplicates
 
 
 class StateVector(np.ndarray):
@@ -45,9 +46,76 @@ class StateVector(np.ndarray):
         if obj is None: return
 
         self.size_of_the_board = getattr(obj, 'size_of_the_board', 8)
-    
+        # a copy keeps the cached hash, which is checked against the contents before being used.
+        self._zobrist = getattr(obj, '_zobrist', None)
+
     def __hash__(self):
-        return hash(str(self))
+        return self.zobrist_hash
+
+    @property
+    def zobrist_hash(self) -> int:
+        """
+        64-bit Zobrist hash of the position (see `ZobristKeys`).
+
+        The hash is cached together with the contents of the state for which it was computed, and it is only used
+        while the contents are the same, so writes of any kind (item assignment, views, `np.copyto`...) never leave a
+        stale hash. `StateTransitions.make_move` and `StateTransitions.unmake_move` update it incrementally.
+        """
+        zobrist = self._cached_hash()
+        if zobrist is None:
+            zobrist = get_zobrist_keys(self.size_of_the_board).hash(self)
+            self._zobrist = (self.tobytes(), zobrist)
+        return zobrist
+
+    def _cached_hash(self) -> Optional[int]:
+        """Return the cached hash if it belongs to the current contents of the state, or None."""
+        cached = getattr(self, '_zobrist', None)
+        if cached is None or cached[0] != self.tobytes():
+            return None
+        return cached[1]
+
+    def invalidate_hash(self) -> None:
+        """Forget the cached hash."""
+        self._zobrist = None
+
+    def position_key(self) -> PositionKey:
+        """
+        Return a hashable snapshot of the position, to be used as the key of dictionaries and sets.
+
+        StateVector itself cannot be used as a key because, as any array, it compares element-wise.
+
+        Returns
+        -------
+        PositionKey:
+            Key whose hash is the Zobrist hash and whose equality compares the positions.
+        """
+        return PositionKey(self.zobrist_hash, self.tobytes())
+
+    def packed_key(self) -> int:
+        """
+        Return the position, including the turn, packed into one integer, to deduplicate and compare positions.
+
+        Every square takes 4 bits (its value plus `PieceHelper.queen`), the turn being the last one, so the key is the
+        little-endian integer of the record written by `checkers.records.pack_positions`. Unlike the Zobrist hash it is
+        exact: two states have the same key exactly when they hold the same position.
+        """
+        nibbles = np.asarray(self).view(np.uint8) + np.uint8(PieceHelper.queen)
+        packed = nibbles[0::2].copy()
+        packed[:len(nibbles) // 2] |= nibbles[1::2] << 4
+        return int.from_bytes(packed.tobytes(), 'little')
+
+    def same_position(self, other: 'StateVector') -> bool:
+        """Return True if both states hold the same position and turn."""
+        return self.zobrist_hash == other.zobrist_hash and self.tobytes() == other.tobytes()
+
+    def __reduce__(self):
+        # keep the size of the board when the state is pickled, e.g., to send it between processes.
+        reconstruct, arguments, state = super().__reduce__()
+        return reconstruct, arguments, (state, self.size_of_the_board)
+
+    def __setstate__(self, state):
+        array_state, self.size_of_the_board = state
+        super().__setstate__(array_state)
 
     @property
     def turn(self):
@@ -57,13 +125,80 @@ class StateVector(np.ndarray):
     def turn(self, value):
         self[-1] = value
 
+    @property
+    def tables(self) -> BoardTables:
+        """Precomputed geometry of the board."""
+        return get_tables(self.size_of_the_board)
+
     def toggle_turn(self):
         self.turn ^= PieceHelper._toggle_turn
 
+    @staticmethod
+    def from_fen(fen: str, size_of_the_board: int = 8) -> 'StateVector':
+        """
+        Build a state from a FEN-like string.
+
+        The format follows the PDN convention `<turn>:W<squares>:B<squares>`, where `W` stands for the light pieces,
+        `B` for the dark pieces, squares are numbered from 1 (index 0 of the StateVector), a `K` before a square
+        marks a queen and ranges such as `1-12` are allowed. For example, the initial position is
+        `W:W1-12:B21-32`.
+
+        Parameters
+        ----------
+        fen: str
+            The FEN-like description of the position.
+        size_of_the_board: int
+            Size of the board.
+
+        Returns
+        -------
+        StateVector:
+            The state described by fen.
+        """
+        state = StateVector(size_of_the_board)
+        state[:-1] = PieceHelper.empty_square
+
+        colors = {'W': PieceHelper.light, 'B': PieceHelper.dark}
+        turn, *sections = fen.strip().rstrip('.').split(':')
+        if turn not in colors:
+            raise Exception(f'Invalid turn {turn} in FEN {fen}. It must be either W or B.')
+
+        for section in sections:
+            color = colors[section[0]]
+            for square in filter(None, section[1:].split(',')):
+                kind = PieceHelper.queen if square.startswith('K') else PieceHelper.piece
+                first, _, last = square.lstrip('K').partition('-')
+                for number in range(int(first), int(last or first) + 1):
+                    if not 1 <= number < len(state):
+                        raise Exception(f'Square {number} in FEN {fen} does not lie within the board.')
+                    state[number - 1] = color * kind
+
+        state.turn = colors[turn]
+        return state
+
+    def to_fen(self) -> str:
+        """
+        Return the FEN-like description of the state (see `StateVector.from_fen`).
+
+        Returns
+        -------
+        str:
+            The FEN-like description of the state.
+        """
+        sections = []
+        for name, color in (('W', PieceHelper.light), ('B', PieceHelper.dark)):
+            squares = [('K' if abs(value) == PieceHelper.queen else '') + str(k + 1)
+                       for k, value in enumerate(self[:-1].tolist()) if value * color > 0]
+            sections.append(name + ','.join(squares))
+
+        return ':'.join(['W' if self.turn == PieceHelper.light else 'B'] + sections)
+
     def visualize(self) -> None:
-        """Visualize the state."""
+        """Visualize the state. It needs the optional GUI dependencies, which are only imported here."""
+        from gui import Visualizer
+
         Visualizer.visualize_state(self)
-        plt.show()
+        Visualizer.show()
 
     def get_pieces_in_turn(self) -> List[int]:
         """
@@ -74,7 +209,7 @@ class StateVector(np.ndarray):
             Return all the positions in which the player of color has pieces.
         """
 
-        return list(*np.where(PieceHelper.piece_color(self[:-1]) == self.turn))
+        return np.flatnonzero(PieceHelper.piece_colors(self.view(np.ndarray)[:-1]) == self.turn).tolist()
 
     def from_index_to_coordinate(self, index_: int) -> Tuple[int, int]:
         """
@@ -155,7 +290,7 @@ class StateVector(np.ndarray):
         if abs(piece_value) == PieceHelper.queen:
             return False
         else:
-            i, j = self.from_index_to_coordinate(piece_index)
+            i = self.tables.rows[piece_index]
 
             if PieceHelper.piece_color(piece_value) == PieceHelper.light:
                 return True if i == self.size_of_the_board - 1 else False
@@ -165,9 +300,43 @@ class StateVector(np.ndarray):
 
 # Todo: Should we merge these two classes together??
 class StateTransitions:
+    # Name of the move generator used by `feasible_next_moves` and the registry with the available ones.
+    backend = 'numpy'
+    backends = {}
+    # Active `Instrumentation`, if any. It is installed by `Instrumentation.__enter__`.
+    instrumentation = None
+
     def __init__(self):
         pass
 
+    @staticmethod
+    def register_backend(name: str, feasible_next_moves) -> None:
+        """
+        Register a move generator that can be selected with `StateTransitions.set_backend`.
+
+        Parameters
+        ----------
+        name: str
+            Name of the backend.
+        feasible_next_moves: Callable[[StateVector], List[StateVector]]
+            Function returning the same successors as `StateTransitions.feasible_next_moves`.
+        """
+        StateTransitions.backends[name] = feasible_next_moves
+
+    @staticmethod
+    def set_backend(name: str) -> None:
+        """
+        Select the move generator used by `StateTransitions.feasible_next_moves`.
+
+        Parameters
+        ----------
+        name: str
+            Name of a registered backend, e.g., 'numpy' or 'bitboard'.
+        """
+        if name not in StateTransitions.backends:
+            raise Exception(f'Unknown backend {name}. The available backends are {list(StateTransitions.backends)}')
+        StateTransitions.backend = name
+
     @staticmethod
     def is_valid(source_state: StateVector, target_state: StateVector) -> bool:
         """
@@ -185,7 +354,9 @@ class StateTransitions:
         bool:
             True if it is possible to transition from source_state into target_state given the game roules.
         """
-        pass
+        if len(source_state) != len(target_state):
+            return False
+        return StateTransitions.find_move(source_state, target_state) is not None
 
     @staticmethod
     def feasible_moves_piece(state: StateVector, piece_index: int) -> List[StateVector]:
@@ -207,11 +378,11 @@ class StateTransitions:
         List[StateVector]:
             List of StateVector with the feasible states resulting from moving the given piece.
         """
-        i, j = state.from_index_to_coordinate(piece_index)
+        neighbours = state.tables.neighbour_list[piece_index]
         states = flatten_list([
             StateTransitions._feasible_state_diagonal(state, piece_index, d, from_jump=False)
             for d in PieceHelper.get_diagonals(piece_value=state[piece_index])
-            if state.coordinate_in_board((i + d[0], j + d[1]))
+            if neighbours[BoardTables.direction_index(d)] != -1
         ])
 
         if states:
@@ -232,12 +403,12 @@ class StateTransitions:
                             'Either moving a dark piece in lights turn or light piece in dark turn.')
             return []
 
-        i, j = state.from_index_to_coordinate(piece_index)
-        d_i, d_j = diagonal
+        tables = state.tables
+        direction = BoardTables.direction_index(diagonal)
 
-        diag_index = state.from_coordinate_to_index((i + d_i, j + d_j))
-        diag2_index = state.from_coordinate_to_index((i + 2 * d_i, j + 2 * d_j))
-        if state.coordinate_in_board(coordinate=(i + 2 * d_i, j + 2 * d_j)):
+        diag_index = tables.neighbour_list[piece_index][direction]
+        diag2_index = tables.jump_list[piece_index][direction]
+        if diag2_index != -1:
             # boolean variable that indicates if the current piece can jump.
             # A piece can jump in a given diagonal if the immediate next square is of
             # the other color and the next square is available.
@@ -250,7 +421,7 @@ class StateTransitions:
         if _can_jump:
             # If the piece can jump, then jump, eat next piece and evaluate that state to see if it can keep jumping.
             # i.e., check if you can keep jumping or not.
-            new_state = deepcopy(state)
+            new_state = StateTransitions._copy(state)
             piece_value = state[piece_index]
 
             # remove piece from initial square
@@ -268,18 +439,18 @@ class StateTransitions:
                 # add piece to target square
                 new_state[diag2_index] += piece_value
 
-            i, j = new_state.from_index_to_coordinate(diag2_index)
+            neighbours = tables.neighbour_list[diag2_index]
 
             states = flatten_list(
                 [StateTransitions._feasible_state_diagonal(new_state, diag2_index, d, from_jump=True)
                  for d in PieceHelper.get_diagonals(piece_value=new_state[diag2_index])
-                 if state.coordinate_in_board((i + d[0], j + d[1]))])
+                 if neighbours[BoardTables.direction_index(d)] != -1])
             return states
 
         elif state[diag_index] == PieceHelper.empty_square and from_jump is False:
             # diagonal square is empty and the piece does not come from a jump
             # Your only choice in this diagonal is to move one square in that direction.
-            new_state = deepcopy(state)
+            new_state = StateTransitions._copy(state)
             piece_value = state[piece_index]
             new_state[piece_index] -= piece_value
 
@@ -297,7 +468,7 @@ class StateTransitions:
         elif state[diag_index] == PieceHelper.empty_square and from_jump is True:
             # If the piece can't neither jump nor move to the adjacent diagonal square then it cannot do anything.
 
-            new_state = deepcopy(state)
+            new_state = StateTransitions._copy(state)
             # Change turn
             new_state.toggle_turn()
 
@@ -305,11 +476,21 @@ class StateTransitions:
         else:
             return []
 
+    @staticmethod
+    def _copy(state: StateVector) -> StateVector:
+        """Deep copy of a state, counted by the active instrumentation."""
+        if StateTransitions.instrumentation is not None:
+            StateTransitions.instrumentation.counters['deepcopies'] += 1
+        return deepcopy(state)
+
     @staticmethod
     def feasible_next_moves(state: StateVector) -> List[StateVector]:
         """
         Return all the possible next moves.
 
+        The successors are computed by the backend selected with `StateTransitions.set_backend`. Every state appears
+        once, even if several sequences of jumps reach it.
+
         Parameters
         ----------
         state: StateVector:
@@ -320,10 +501,215 @@ class StateTransitions:
         List[StateVector]:
             List of StateVector with the feasible states that the game can reach in one step.
         """
+        instrumentation = StateTransitions.instrumentation
+        if instrumentation is not None:
+            return instrumentation.time_movegen(StateTransitions.backends[StateTransitions.backend], state)
+        return StateTransitions.backends[StateTransitions.backend](state)
 
+    @staticmethod
+    def _feasible_next_moves_numpy(state: StateVector) -> List[StateVector]:
+        """Reference move generator working directly on the StateVector."""
         pieces_to_move = state.get_pieces_in_turn()
-        states = flatten_list([StateTransitions.feasible_moves_piece(state, piece) for piece in pieces_to_move])
+        # a piece that ends a sequence of jumps with several empty diagonals around reaches the same state once per
+        # diagonal, so the repeated states are removed.
+        states = flatten_list([StateTransitions.feasible_moves_piece(state, piece) for piece in pieces_to_move],
+                              remove_duplicates=True, key=StateVector.packed_key)
         return states
 
+    @staticmethod
+    def feasible_next_move_list(state: StateVector) -> List[Move]:
+        """
+        Return all the possible next moves as Move objects, without copying the state.
+
+        Applying the moves with `StateTransitions.make_move` gives the states returned by
+        `StateTransitions.feasible_next_moves`, in the same order.
+
+        Parameters
+        ----------
+        state: StateVector:
+            The state in which the move will be made.
+
+        Returns
+        -------
+        List[Move]:
+            List of the feasible moves.
+        """
+        instrumentation = StateTransitions.instrumentation
+        if instrumentation is not None:
+            return instrumentation.time_movegen(StateTransitions._feasible_next_move_list, state)
+        return StateTransitions._feasible_next_move_list(state)
+
+    @staticmethod
+    def _feasible_next_move_list(state: StateVector) -> List[Move]:
+        """Depth-first move generator of `StateTransitions.feasible_next_move_list`."""
+        tables = state.tables
+        neighbours, jumps, rows = tables.neighbour_list, tables.jump_list, tables.rows
+        board = state[:-1].tolist()
+        turn = int(state.turn)
+        promotion_row = tables.promotion_rows[turn]
+
+        def explore(origin, square, value, directions, path, captured, captured_pieces, moves):
+            # same rules as StateTransitions._feasible_state_diagonal
+            for d in directions:
+                neighbour = neighbours[square][d]
+                if neighbour == -1:
+                    continue
+
+                landing = jumps[square][d]
+                if landing != -1 and board[neighbour] * value < 0 and board[landing] == PieceHelper.empty_square:
+                    captured_piece = board[neighbour]
+                    board[square] = board[neighbour] = PieceHelper.empty_square
+                    board[landing] = value
+                    explore(origin, landing, value, directions, path + (landing,), captured + (neighbour,),
+                            captured_pieces + (captured_piece,), moves)
+                    board[landing] = PieceHelper.empty_square
+                    board[neighbour] = captured_piece
+                    board[square] = value
+                elif board[neighbour] == PieceHelper.empty_square:
+                    if captured:
+                        moves.append(Move(origin, path, captured, captured_pieces))
+                    else:
+                        promotion = abs(value) == PieceHelper.piece and rows[neighbour] == promotion_row
+                        moves.append(Move(origin, (neighbour,), promotion=promotion))
+
+        move_list = []
+        for origin, value in enumerate(board):
+            if value * turn <= 0:
+                continue
+
+            moves = []
+            explore(origin, origin, value, tables.piece_directions[value], (), (), (), moves)
+            if moves:
+                # force taking opponents pieces if possible
+                most_captures = max(len(m.captured) for m in moves)
+                moves = [m for m in moves if len(m.captured) == most_captures]
+                if most_captures:
+                    # keep one move per resulting state, as StateTransitions.feasible_next_moves.
+                    moves = rm_duplicates(moves, key=lambda m: (m.path[-1], frozenset(m.captured)))
+                move_list.extend(moves)
+
+        return move_list
+
+    @staticmethod
+    def find_move(source_state: StateVector, target_state: StateVector) -> Optional[Move]:
+        """
+        Return the move that transforms source_state into target_state.
+
+        Parameters
+        ----------
+        source_state: StateVector
+            Source state.
+        target_state: StateVector
+            Tentative next state.
+
+        Returns
+        -------
+        Optional[Move]:
+            The first feasible move leading to target_state, or None if there is none.
+        """
+        target = target_state.tobytes()
+        state = source_state.copy()
+        for move in StateTransitions.feasible_next_move_list(state):
+            StateTransitions.make_move(state, move)
+            found = state.tobytes() == target
+            StateTransitions.unmake_move(state, move)
+            if found:
+                return move
+        return None
+
+    @staticmethod
+    def make_move(state: StateVector, move: Move) -> None:
+        """
+        Apply a move to the state in place.
+
+        Parameters
+        ----------
+        state: StateVector
+            The state in which the move is made. It must be the state for which the move was generated.
+        move: Move
+            The move.
+        """
+        value = state[move.origin]
+        new_value = value * PieceHelper.queen if move.promotion else value
+        zobrist = StateTransitions._move_hash(state, move, value, new_value)
+
+        state[move.origin] = PieceHelper.empty_square
+        for square in move.captured:
+            state[square] = PieceHelper.empty_square
+        state[move.path[-1]] = new_value
+        state.toggle_turn()
+        state._zobrist = None if zobrist is None else (state.tobytes(), zobrist)
+
+    @staticmethod
+    def successor_array(state: StateVector, moves: List[Move]) -> np.ndarray:
+        """
+        Apply every move to a copy of the state, all at once.
+
+        Parameters
+        ----------
+        state: StateVector
+            The state for which the moves were generated.
+        moves: List[Move]
+            The moves.
+
+        Returns
+        -------
+        np.ndarray:
+            int8 array of shape (len(moves), n) with the state after every move, e.g., to evaluate them in a batch.
+        """
+        base = np.asarray(state)
+        successors = np.repeat(base[None], len(moves), axis=0)
+        rows = np.arange(len(moves))
+        origins = [m.origin for m in moves]
+        values = base[origins] * np.where([m.promotion for m in moves], PieceHelper.queen, 1).astype(base.dtype)
+
+        successors[rows, origins] = PieceHelper.empty_square
+        captured = [len(m.captured) for m in moves]
+        if any(captured):
+            successors[np.repeat(rows, captured), [k for m in moves for k in m.captured]] = PieceHelper.empty_square
+        successors[rows, [m.path[-1] for m in moves]] = values
+        successors[:, -1] = -base[-1]
+        return successors
+
+    @staticmethod
+    def unmake_move(state: StateVector, move: Move) -> None:
+        """
+        Take back in place a move applied with `StateTransitions.make_move`.
+
+        Parameters
+        ----------
+        state: StateVector
+            The state after the move.
+        move: Move
+            The move to take back.
+        """
+        value = state[move.path[-1]]
+        old_value = value // PieceHelper.queen if move.promotion else value
+        zobrist = StateTransitions._move_hash(state, move, old_value, value)
+
+        state[move.path[-1]] = PieceHelper.empty_square
+        for square, piece in zip(move.captured, move.captured_pieces):
+            state[square] = piece
+        state[move.origin] = old_value
+        state.toggle_turn()
+        state._zobrist = None if zobrist is None else (state.tobytes(), zobrist)
+
+    @staticmethod
+    def _move_hash(state: StateVector, move: Move, value: int, new_value: int):
+        """
+        Update incrementally the cached hash of state for a move (in either direction).
+
+        Returns None if the state does not have a cached hash.
+        """
+        zobrist = state._cached_hash()
+        if zobrist is None:
+            return None
+
+        keys = get_zobrist_keys(state.size_of_the_board)
+        zobrist ^= keys.square(move.origin, value) ^ keys.square(move.path[-1], new_value) ^ keys.turn
+        for square, piece in zip(move.captured, move.captured_pieces):
+            zobrist ^= keys.square(square, piece)
+        return zobrist
 
 
+StateTransitions.register_backend('numpy', StateTransitions._feasible_next_moves_numpy)
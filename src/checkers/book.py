@@ -0,0 +1,211 @@
+"""
+Opening books built from the statistics of many simulated games.
+
+A book stores, for every position reached in the first plies of the games, the number of games won by the dark
+pieces, drawn and won by the light pieces, keyed by the Zobrist hash of the position (see `ZobristKeys`). The keys are
+kept sorted, so a position is found with a binary search. Positions are stored in their canonical form (see
+`checkers.symmetry`), so a position and its color-swapped equivalent share their entry, with the results swapped.
+
+File layout (little-endian): a header of 32 bytes with the magic `CKOB`, the format version (uint16), the size of the
+board (uint16), the number of plies (uint16) and the number of positions (uint64), followed by the sorted keys
+(uint64) and the counts (three uint32 per position).
+"""
+import logging
+import os
+import struct
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from checkers.batched import BatchedSimulator
+from checkers.board import StateVector, StateTransitions
+from checkers.symmetry import canonicalize, canonicalize_states, color_swap
+from checkers.zobrist import get_zobrist_keys
+
+
+MAGIC = b'CKOB'
+VERSION = 2
+HEADER = struct.Struct('<4sHHHQ')
+HEADER_SIZE = 32
+
+
+class OpeningBook:
+    """
+    Results of simulated games for the positions of their first plies.
+
+    Use `OpeningBook.build` to simulate the games, `save` to write the book and `OpeningBook.load` to map a file into
+    memory. Players consult the book with `OpeningBook.best_move` before searching.
+
+    Attributes:
+    __________
+    size_of_the_board: int
+        Size of the board.
+    plies: int
+        Number of plies of every game included in the book.
+    keys: np.ndarray
+        Sorted uint64 array with the Zobrist hash of every canonical position.
+    counts: np.ndarray
+        uint32 array of shape (number of positions, 3) with the games won by the dark pieces, drawn and won by the
+        light pieces from every canonical position, i.e., indexed by result + 1.
+    """
+
+    def __init__(self, keys: np.ndarray, counts: np.ndarray, size_of_the_board: int = 8, plies: int = 10):
+        self.keys = keys
+        self.counts = counts
+        self.size_of_the_board = size_of_the_board
+        self.plies = plies
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def build(
+            number_of_games: int,
+            plies: int = 10,
+            number_of_moves: int = 200,
+            game: Optional['CheckersGame'] = None,
+            n_workers: Optional[int] = None,
+            seed: Optional[int] = None,
+            size_of_the_board: int = 8,
+            chunk_size: int = 1000
+    ) -> 'OpeningBook':
+        """
+        Simulate games from `StateVector()` and count the results of every position of their first plies.
+
+        Parameters
+        ----------
+        number_of_games: int
+            Number of games that will be played.
+        plies: int
+            Number of plies of every game included in the book.
+        number_of_moves: int
+            The maximum number of turns of every game, as in `CheckersGame.simulate_game`.
+        game: Optional[CheckersGame]
+            The game whose players play the games, with `CheckersGame.simulate_games`. By default, uniform random
+            players play the games in lockstep with `BatchedSimulator`.
+        n_workers: Optional[int]
+            Number of worker processes, if a game is given.
+        seed: Optional[int]
+            Seed of the players.
+        size_of_the_board: int
+            Size of the board.
+        chunk_size: int
+            Number of games simulated at once by `BatchedSimulator`.
+
+        Returns
+        -------
+        OpeningBook:
+            The book, held in memory.
+        """
+        start = time.perf_counter()
+        zobrist = get_zobrist_keys(size_of_the_board)
+        keys, results = [], []
+
+        def add(states, result):
+            opening, transforms = canonicalize_states(states[:plies + 1])
+            keys.append(zobrist.hashes(opening))
+            # the colors of the canonical positions of the dark pieces are swapped, so the winner is too.
+            results.append((int(result) * (1 - 2 * transforms)).astype(np.int8))
+
+        if game is None:
+            simulator = BatchedSimulator(size_of_the_board, seed)
+            for chunk in range(0, number_of_games, chunk_size):
+                histories, winners = simulator.simulate_games(min(chunk_size, number_of_games - chunk), number_of_moves)
+                for history, winner in zip(histories, winners):
+                    add(np.array(history[:plies + 1]), winner)
+        else:
+            for _, history, winner in game.iter_simulate_games(number_of_games, number_of_moves, n_workers, seed,
+                                                                compact='states'):
+                add(history.array, winner)
+
+        keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        counts = np.bincount(3 * inverse.ravel() + np.concatenate(results) + 1, minlength=3 * len(keys))
+        counts = counts.reshape(-1, 3).astype(np.uint32)
+
+        logging.info(f'OpeningBook: {len(keys)} positions from {number_of_games} games in '
+                     f'{time.perf_counter() - start:.1f} s')
+        return OpeningBook(keys, counts, size_of_the_board, plies)
+
+    def lookup(self, state: StateVector) -> Optional[Tuple[int, int, int]]:
+        """
+        Look up the results of the games that went through a position.
+
+        Parameters
+        ----------
+        state: StateVector
+            The position.
+
+        Returns
+        -------
+        Optional[Tuple[int, int, int]]:
+            The number of games won by the dark pieces, drawn and won by the light pieces, or None if the position is
+            not in the book.
+        """
+        canonical, transform = canonicalize(state)
+        key = np.uint64(canonical.zobrist_hash)
+        i = int(np.searchsorted(self.keys, key))
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        dark, draws, light = self.counts[i].tolist()
+        return (light, draws, dark) if transform == color_swap else (dark, draws, light)
+
+    def best_move(self, state: StateVector, min_games: int = 10) -> Optional[StateVector]:
+        """
+        Choose the move whose resulting position scored best for the player in turn.
+
+        The score of a position is the fraction of the games won by the player in turn plus half of the draws.
+
+        Parameters
+        ----------
+        state: StateVector
+            The state in which the player needs to take the move.
+        min_games: int
+            Minimum number of games of a position for it to be considered.
+
+        Returns
+        -------
+        Optional[StateVector]:
+            The state in which the game will be after the move, or None if no move leads to a position of the book
+            with at least min_games games.
+        """
+        best_state, best_score = None, -1.
+        for next_state in StateTransitions.feasible_next_moves(state):
+            counts = self.lookup(next_state)
+            if counts is None or sum(counts) < min_games:
+                continue
+
+            score = (counts[int(state.turn) + 1] + 0.5 * counts[1]) / sum(counts)
+            if score > best_score:
+                best_state, best_score = next_state, score
+
+        return best_state
+
+    def save(self, path: str) -> None:
+        """Write the book to a file."""
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, self.size_of_the_board, self.plies, len(self)))
+            file.write(bytes(HEADER_SIZE - HEADER.size))
+            file.write(np.asarray(self.keys, dtype='<u8').tobytes())
+            file.write(np.asarray(self.counts, dtype='<u4').tobytes())
+
+    @staticmethod
+    def load(path: str) -> 'OpeningBook':
+        """Map a book file into memory."""
+        with open(path, 'rb') as file:
+            magic, version, size_of_the_board, plies, number_of_positions = HEADER.unpack(file.read(HEADER.size))
+
+        if magic != MAGIC:
+            raise Exception(f'{path} is not an opening book file.')
+        if version != VERSION:
+            raise Exception(f'Unsupported version {version} of the opening book format.')
+        if os.path.getsize(path) != HEADER_SIZE + 20 * number_of_positions:
+            raise Exception(f'{path} is truncated.')
+
+        if number_of_positions == 0:
+            return OpeningBook(np.zeros(0, dtype=np.uint64), np.zeros((0, 3), dtype=np.uint32), size_of_the_board,
+                               plies)
+        keys = np.memmap(path, dtype='<u8', mode='r', offset=HEADER_SIZE, shape=(number_of_positions,))
+        counts = np.memmap(path, dtype='<u4', mode='r', offset=HEADER_SIZE + 8 * number_of_positions,
+                           shape=(number_of_positions, 3))
+        return OpeningBook(keys, counts, size_of_the_board, plies)
@@ -0,0 +1,132 @@
+"""
+Static evaluation of many positions at once.
+
+The score of a position is the sum, for the light pieces minus the dark pieces, of:
+
+- material: `man` for every man and `king` for every queen.
+- piece-square tables: `man_table[k]` for a man and `king_table[k]` for a queen on square k, from the point of view
+  of the light pieces. The squares of the dark pieces are mirrored (k -> n - 1 - k, see `checkers.symmetry`).
+- back-rank guard: `back_rank` for every man on the row in which the men of the opponent are promoted.
+- mobility: `mobility` for every step to an empty adjacent square, which approximates the number of moves.
+
+Material, tables and back rank are folded into one table indexed by (square, piece value), so they cost one gather and
+one sum per batch. The scores are given from the point of view of the player in turn, as `AlphaBetaPlayer.evaluate`.
+
+The weights are stored in JSON files with the keys above, the tables being lists with one value per square.
+"""
+import json
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+from checkers.board import StateVector
+from checkers.piece import PieceHelper
+from checkers.tables import BoardTables, get_tables
+
+
+class BatchEvaluator:
+    """
+    Evaluates stacks of positions with vectorized material, piece-square, back-rank and mobility terms.
+
+    Attributes:
+    __________
+    size_of_the_board: int
+        Size of the board.
+    weights: Dict[str, Union[float, np.ndarray]]
+        The weights (see the module documentation).
+    """
+
+    def __init__(self, size_of_the_board: int = 8, weights: Optional[Dict[str, Union[float, list]]] = None):
+        self.size_of_the_board = size_of_the_board
+        tables = get_tables(size_of_the_board)
+        self._n = n = tables.number_of_squares
+
+        self.weights = self.default_weights(size_of_the_board)
+        for name, value in (weights or {}).items():
+            if name not in self.weights:
+                raise Exception(f'Unknown weight {name}. The weights are {", ".join(self.weights)}.')
+            self.weights[name] = np.asarray(value, dtype=float) if np.ndim(value) else float(value)
+        for name in ('man_table', 'king_table'):
+            if self.weights[name].shape != (n,):
+                raise Exception(f'{name} must have one value per square ({n}).')
+
+        # weight of every (square, piece value + PieceHelper.queen) pair, from the point of view of the light pieces,
+        # flattened so that a whole batch is scored with a single take.
+        w = self.weights
+        rows = np.array(tables.rows)
+        light_men = w['man'] + w['man_table'] + w['back_rank'] * (rows == 0)
+        light_kings = w['king'] + w['king_table']
+        table = np.zeros((n, 2 * PieceHelper.queen + 1))
+        table[:, PieceHelper.queen + PieceHelper.piece] = light_men
+        table[:, PieceHelper.queen + PieceHelper.queen] = light_kings
+        table[:, PieceHelper.queen - PieceHelper.piece] = -light_men[::-1]
+        table[:, PieceHelper.queen - PieceHelper.queen] = -light_kings[::-1]
+        self._table = table.ravel()
+        self._offsets = np.arange(n) * table.shape[1] + PieceHelper.queen
+
+        # for the mobility: the neighbours of every square, with the squares outside the board pointing to an extra
+        # column that is never empty, and +1 (-1) for the directions in which every light (dark) piece value moves.
+        self._neighbours = np.where(tables.neighbours < 0, n, tables.neighbours)
+        self._directions = np.zeros((2 * PieceHelper.queen + 1, len(BoardTables.diagonals)), dtype=np.int8)
+        for value, directions in tables.piece_directions.items():
+            self._directions[value + PieceHelper.queen, list(directions)] = PieceHelper.piece_color(value)
+
+    @staticmethod
+    def default_weights(size_of_the_board: int = 8) -> Dict[str, Union[float, np.ndarray]]:
+        """Return the default weights: men advancing and queens in the center are worth a bit more."""
+        tables = get_tables(size_of_the_board)
+        i, j = tables.coordinates[:, 0], tables.coordinates[:, 1]
+        last = size_of_the_board - 1
+        centrality = np.minimum(i, last - i) + np.minimum(j, last - j)
+        return {'man': 100., 'king': 150., 'man_table': 2. * i, 'king_table': 3. * centrality, 'back_rank': 10.,
+                'mobility': 2.}
+
+    def evaluate_batch(self, states: np.ndarray) -> np.ndarray:
+        """
+        Score many positions.
+
+        Parameters
+        ----------
+        states: np.ndarray
+            Array of shape (K, n) with K states, including the turn in the last column, e.g., a stack of StateVector.
+
+        Returns
+        -------
+        np.ndarray:
+            float array with the score of every position from the point of view of the player in turn.
+        """
+        states = np.asarray(states)
+        values = states[:, :-1]
+        scores = self._table.take(values + self._offsets).sum(axis=1)
+
+        if self.weights['mobility']:
+            empty = np.zeros((len(values), self._n + 1), dtype=bool)
+            np.equal(values, PieceHelper.empty_square, out=empty[:, :-1])
+            steps = empty[:, self._neighbours] * self._directions.take(values + PieceHelper.queen, axis=0)
+            scores += self.weights['mobility'] * steps.sum(axis=(1, 2))
+
+        return scores * states[:, -1]
+
+    def evaluate(self, state: StateVector) -> float:
+        """Score one position from the point of view of the player in turn."""
+        return float(self.evaluate_batch(np.asarray(state)[None])[0])
+
+    def __call__(self, state: StateVector) -> float:
+        return self.evaluate(state)
+
+    def light_win_probabilities(self, states: np.ndarray, scale: float = 200.) -> np.ndarray:
+        """Map the scores to the probability that the light pieces win with a logistic curve of the given scale."""
+        states = np.asarray(states)
+        return 1 / (1 + np.exp(-self.evaluate_batch(states) * states[:, -1] / scale))
+
+    def save(self, path: str) -> None:
+        """Write the weights to a JSON file."""
+        with open(path, 'w') as file:
+            json.dump({name: value.tolist() if isinstance(value, np.ndarray) else value
+                       for name, value in self.weights.items()}, file, indent=2)
+
+    @staticmethod
+    def load(path: str, size_of_the_board: int = 8) -> 'BatchEvaluator':
+        """Build an evaluator with the weights of a JSON file. The weights missing from the file keep their default."""
+        with open(path) as file:
+            return BatchEvaluator(size_of_the_board, json.load(file))
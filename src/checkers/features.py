@@ -0,0 +1,179 @@
+"""
+Feature planes of positions for training models.
+
+Every position becomes C = 5 planes of size x size: one per kind of piece (light men, light queens, dark men, dark
+queens) with ones on the squares that hold such a piece, and one plane filled with ones when the light pieces are to
+move. The label of every position is the result of its game (see `CheckersGame.decide_winner`).
+
+The squares of a chunk of positions are placed on the cells of the board with a precomputed scatter from the indices of
+`StateVector`, and every plane is then a single comparison of the whole chunk, written into a buffer that is reused by
+all the chunks.
+"""
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+from checkers.piece import PieceHelper
+from checkers.records import GameRecordReader, _history_array
+from checkers.symmetry import canonicalize_states
+from checkers.tables import get_tables
+
+
+# piece value of every plane of pieces.
+PLANE_VALUES = (PieceHelper.piece, PieceHelper.queen, -PieceHelper.piece, -PieceHelper.queen)
+
+
+class FeatureExtractor:
+    """
+    Converts positions into stacked feature planes of shape (N, C, size, size).
+
+    Attributes:
+    __________
+    size_of_the_board: int
+        Size of the board.
+    dtype: np.dtype
+        Type of the planes, e.g., np.float32 or np.uint8.
+    canonical: bool
+        If True, the positions are first replaced by their canonical representatives (see `checkers.symmetry`), so
+        the player in turn always has the light pieces, and the labels are the results from its point of view.
+    channels: int
+        Number of planes of every position.
+    """
+    channels = len(PLANE_VALUES) + 1
+
+    def __init__(self, size_of_the_board: int = 8, dtype: type = np.float32, canonical: bool = False):
+        self.size_of_the_board = size_of_the_board
+        self.dtype = np.dtype(dtype)
+        self.canonical = canonical
+
+        coordinates = get_tables(size_of_the_board).coordinates
+        # cell of every square in the flattened board.
+        self._scatter = coordinates[:, 0] * size_of_the_board + coordinates[:, 1]
+        self._plane_values = np.array(PLANE_VALUES, dtype=PieceHelper.dtype)[None, :, None]
+
+    def empty(self, number_of_positions: int) -> np.ndarray:
+        """Allocate planes for number_of_positions positions."""
+        n = self.size_of_the_board
+        return np.zeros((number_of_positions, self.channels, n, n), dtype=self.dtype)
+
+    def planes(self, states: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Compute the planes of many positions.
+
+        Parameters
+        ----------
+        states: np.ndarray
+            Array of shape (N, n) with N states, including the turn in the last column.
+        out: Optional[np.ndarray]
+            Contiguous planes, e.g., allocated with `FeatureExtractor.empty`, in which the result is written.
+
+        Returns
+        -------
+        np.ndarray:
+            Array of shape (N, C, size, size).
+        """
+        states = np.asarray(states)
+        if self.canonical:
+            states = canonicalize_states(states)[0]
+        if out is None:
+            out = self.empty(len(states))
+
+        board = np.zeros((len(states), self.size_of_the_board ** 2), dtype=PieceHelper.dtype)
+        board[:, self._scatter] = states[:, :-1]
+
+        cells = out.reshape(len(states), self.channels, -1)
+        cells[:, :-1] = board[:, None, :] == self._plane_values
+        cells[:, -1] = (states[:, -1] == PieceHelper.light)[:, None]
+        return out
+
+    def labels(self, states: np.ndarray, results: np.ndarray) -> np.ndarray:
+        """Return the label (int8) of every position given the result of its game."""
+        results = np.asarray(results, dtype=np.int8)
+        if self.canonical:
+            # the canonical positions of the dark pieces have the colors swapped.
+            return np.where(np.asarray(states)[:, -1] == PieceHelper.dark, -results, results).astype(np.int8)
+        return results
+
+    def iter_batches(
+            self,
+            source: Union[GameRecordReader, Iterable],
+            results: Optional[Iterable[int]] = None,
+            batch_size: int = 4096,
+            reuse_buffer: bool = True
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Stream the planes and labels of all the positions of many games, batch_size positions at a time.
+
+        Parameters
+        ----------
+        source: Union[GameRecordReader, Iterable]
+            A game record file, or the histories of the games (lists of StateVector, `StateHistory` or `MoveHistory`,
+            as returned by `CheckersGame.simulate_games`).
+        results: Optional[Iterable[int]]
+            The results of the games, if source is an iterable of histories.
+        batch_size: int
+            Number of positions of every batch. The last one can be shorter.
+        reuse_buffer: bool
+            If True, every batch is written in the same buffer, so the planes of a batch are overwritten by the next
+            one and must be consumed (or copied) before asking for it.
+
+        Returns
+        -------
+        Iterator[Tuple[np.ndarray, np.ndarray]]:
+            The planes, of shape (K, C, size, size), and the labels, of shape (K,), of every batch.
+        """
+        buffer = self.empty(batch_size) if reuse_buffer else None
+
+        def batch(states, labels):
+            out = buffer[:len(states)] if reuse_buffer else None
+            return self.planes(states, out), self.labels(states, labels)
+
+        if isinstance(source, GameRecordReader):
+            for start in range(0, source.number_of_positions, batch_size):
+                stop = min(start + batch_size, source.number_of_positions)
+                states = source.positions(start, stop)
+                yield batch(states, source.results[source.game_of_position(np.arange(start, stop))])
+            return
+
+        if results is None:
+            raise Exception('The results of the games are needed to label their positions.')
+
+        # the states of the games are gathered until they fill a batch. A game longer than a batch is split.
+        pending, pending_labels, length = [], [], 0
+        for history, result in zip(source, results):
+            states = _history_array(history)
+            while len(states):
+                take = states[:batch_size - length]
+                pending.append(take)
+                pending_labels.append(np.full(len(take), result, dtype=np.int8))
+                length += len(take)
+                states = states[len(take):]
+                if length == batch_size:
+                    yield batch(np.concatenate(pending), np.concatenate(pending_labels))
+                    pending, pending_labels, length = [], [], 0
+
+        if length:
+            yield batch(np.concatenate(pending), np.concatenate(pending_labels))
+
+    def dataset(self, source: Union[GameRecordReader, Iterable], results: Optional[Iterable[int]] = None,
+                batch_size: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the planes and labels of all the positions of many games at once (see `FeatureExtractor.iter_batches`).
+
+        The planes are allocated once and filled batch_size positions at a time.
+        """
+        if isinstance(source, GameRecordReader):
+            states = source.positions(0)
+            results = source.results[source.game_of_position(np.arange(source.number_of_positions))]
+        else:
+            if results is None:
+                raise Exception('The results of the games are needed to label their positions.')
+            histories = [_history_array(history) for history in source]
+            states = np.concatenate(histories) if histories else np.zeros((0, self.size_of_the_board ** 2 // 2 + 1),
+                                                                          dtype=PieceHelper.dtype)
+            results = np.repeat(np.asarray(list(results), dtype=np.int8), [len(h) for h in histories])
+
+        planes = self.empty(len(states))
+        for start in range(0, len(states), batch_size):
+            self.planes(states[start: start + batch_size], planes[start: start + batch_size])
+        return planes, self.labels(states, results)
@@ -1,11 +1,20 @@
+import copy
+import time
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
 
-from checkers.board import StateVector
+from checkers.adjudication import Adjudicator
+from checkers.board import StateVector, StateTransitions
+from checkers.history import StateHistory, MoveHistory
+from checkers.instrumentation import Instrumentation
+from checkers.move import Move
 from checkers.players import UniformPlayer, CheckersPlayer
+from checkers.tablebase import EndgameTablebase
 
 from checkers.piece import PieceHelper
 
-from typing import Optional, List, Union, Tuple
+from typing import Optional, List, Union, Tuple, Iterator
 
 
 class CheckersGame:
@@ -18,16 +27,33 @@ class CheckersGame:
 		The red player.
 	blue_player: CheckersPlayer
 		The blue player.
+	tablebase: Optional[EndgameTablebase]
+		If given, the games stop as soon as they reach a position of the tablebase, with its result under perfect play.
+	adjudicator: Optional[Adjudicator]
+		If given, the games stop when it adjudicates them, e.g., on repetitions (see `Adjudicator`).
+	end_reason: Optional[str]
+		Why the last game played by this instance ended: 'no_moves' (the player in turn has no moves), 'move_limit',
+		'tablebase' or one of `Adjudicator.reasons`.
 	"""
-	def __init__(self, light_player: CheckersPlayer, dark_player: CheckersPlayer):
+	def __init__(
+			self,
+			light_player: CheckersPlayer,
+			dark_player: CheckersPlayer,
+			tablebase: Optional[EndgameTablebase] = None,
+			adjudicator: Optional[Adjudicator] = None):
 		self.light_player = light_player
 		self.dark_player = dark_player
+		self.tablebase = tablebase
+		self.adjudicator = adjudicator
+		self.end_reason = None
 
 	def simulate_game(
 			self,
 			number_of_moves: Optional[int] = np.inf,
-			initial_state: Optional[StateVector] = None
-	) -> Tuple[List[StateVector], int]:
+			initial_state: Optional[StateVector] = None,
+			compact: Optional[str] = None,
+			instrumentation: Optional[Instrumentation] = None
+	) -> Tuple[Union[List[StateVector], StateHistory, MoveHistory], int]:
 		"""
 		Simulate one game of checkers starting in initial_state and with maximum number of moves of number_of_moves.
 
@@ -37,6 +63,11 @@ class CheckersGame:
 			The maximum number of turns that want to be simulated.
 		initial_state: Optional[StateVector]
 			The initial state in which the simulation of the game will start.
+		compact: Optional[str]
+			How the history is stored: None for a list of StateVector, 'states' for a `StateHistory` (one int8
+			array per game) or 'moves' for a `MoveHistory` (the initial state and the moves played).
+		instrumentation: Optional[Instrumentation]
+			If given, the counters and timers of the game are added to it (see `Instrumentation`).
 
 		Returns
 		-------
@@ -48,30 +79,121 @@ class CheckersGame:
 		if initial_state is None:
 			initial_state = StateVector()
 
-		history = []
-		winner = None
+		if compact is None:
+			history = []
+		elif compact == 'states':
+			history = StateHistory(initial_state.size_of_the_board)
+		elif compact == 'moves':
+			history = MoveHistory(initial_state)
+		else:
+			raise Exception(f'Unknown history format {compact}. It must be None, "states" or "moves".')
+
+		with instrumentation if instrumentation is not None else nullcontext():
+			generator = self.iter_game(number_of_moves, initial_state, yield_moves=compact == 'moves')
+			while True:
+				try:
+					_, item = next(generator)
+				except StopIteration as stop:
+					winner = stop.value
+					break
+				history.append(item)
+
+		return history, winner
+
+	def iter_game(
+			self,
+			number_of_moves: Optional[int] = np.inf,
+			initial_state: Optional[StateVector] = None,
+			yield_moves: bool = False
+	) -> Iterator[Tuple[int, Union[StateVector, Move]]]:
+		"""
+		Play one game of checkers, yielding every ply as it is played.
+
+		The game is played exactly as in `CheckersGame.simulate_game`, but nothing is kept in memory. The winner is the
+		return value of the generator, i.e., the `value` of its `StopIteration`. If the game has a tablebase, it stops
+		at the first position found in it and the winner is the one of the tablebase. If it has an adjudicator, it stops
+		when the adjudicator says so. The reason why the game ended is stored in `CheckersGame.end_reason`.
+
+		Parameters
+		----------
+		number_of_moves: Optional[int]
+			The maximum number of turns that want to be simulated.
+		initial_state: Optional[StateVector]
+			The initial state in which the simulation of the game will start.
+		yield_moves: bool
+			If True, the Move played on every ply is yielded instead of the state in which it is played.
+
+		Returns
+		-------
+		Iterator[Tuple[int, Union[StateVector, Move]]]
+			Pairs (ply, state) with every state of the game, or (ply, move) with every move if yield_moves is True.
+		"""
+		if initial_state is None:
+			initial_state = StateVector()
+
+		instrumentation = StateTransitions.instrumentation
+		if instrumentation is not None:
+			game_start = time.perf_counter()
+			next_move_time = 0.
+
+		if self.adjudicator is not None:
+			self.adjudicator.reset()
 
 		current_state = initial_state
 		turn = 0
+		winner = None
+		reason = None
 		while True:
-			history.append(current_state)
+			if not yield_moves:
+				yield turn, current_state
+			if self.tablebase is not None:
+				entry = self.tablebase.probe(current_state)
+				if entry is not None:
+					winner = entry[0]
+					reason = 'tablebase'
+					break
+			if self.adjudicator is not None:
+				reason = self.adjudicator.update(current_state)
+				if reason is not None:
+					break
 			player = self.dark_player if current_state.turn == PieceHelper.dark else self.light_player
-			next_state = player.next_move(current_state)
+			if instrumentation is None:
+				next_state = player.next_move(current_state)
+			else:
+				start = time.perf_counter()
+				next_state = player.next_move(current_state)
+				next_move_time += time.perf_counter() - start
 
 			# if the game is over (i.e., current player has no moves)
 			# or the turn exceeds the maximum number of turns allowed the iteration is stoped.
 			if next_state is None or turn > number_of_moves:
+				reason = 'no_moves' if next_state is None else 'move_limit'
 				break
-			else:
-				current_state = next_state
+
+			if yield_moves:
+				move = StateTransitions.find_move(current_state, next_state)
+				if move is None:
+					raise Exception(f'The move of the {type(player).__name__} in ply {turn} is not valid.')
+				yield turn, move
+			if instrumentation is not None:
+				instrumentation.counters['captures'] += \
+					int(np.count_nonzero(current_state[:-1]) - np.count_nonzero(next_state[:-1]))
+			current_state = next_state
 			turn += 1
 
-		winner = CheckersGame.decide_winner(current_state)
+		if instrumentation is not None:
+			total = time.perf_counter() - game_start
+			instrumentation.counters['games'] += 1
+			instrumentation.counters['plies'] += turn
+			instrumentation.timers['next_move'] += next_move_time
+			instrumentation.timers['bookkeeping'] += total - next_move_time
+			instrumentation.timers['total'] += total
 
-		return history, winner
+		self.end_reason = reason
+		return CheckersGame.decide_winner(current_state, reason) if winner is None else winner
 
 	@staticmethod
-	def decide_winner(state):
+	def decide_winner(state, reason: Optional[str] = None):
 		"""
 		Return the winning color.
 
@@ -79,6 +201,9 @@ class CheckersGame:
 		----------
 		state: StateVector
 			Final state of a game.
+		reason: Optional[str]
+			Why the game ended (see `CheckersGame.end_reason`). If it is 'material', the color with more material (men
+			count 1 and queens 2) wins.
 
 		Returns
 		-------
@@ -88,6 +213,9 @@ class CheckersGame:
 			`PieceHelper.empty_square` if the game ends in a tie
 		"""
 
+		if reason == 'material':
+			return PieceHelper.piece_color(state[:-1].sum())
+
 		min_ = state[:-1].min()
 		max_ = state[:-1].max()
 
@@ -98,7 +226,16 @@ class CheckersGame:
 		else:
 			return PieceHelper.empty_square
 
-	def simulate_games(self, number_of_games: int) -> Tuple[List[List[StateVector]], List[int]]:
+	def simulate_games(
+			self,
+			number_of_games: int,
+			number_of_moves: Optional[int] = np.inf,
+			n_workers: Optional[int] = None,
+			seed: Optional[int] = None,
+			compact: Optional[str] = None,
+			writer: Optional['GameRecordWriter'] = None,
+			instrumentation: Optional[Instrumentation] = None
+	) -> Tuple[List[List[StateVector]], List[int]]:
 		"""
 		Simulate number_of_games checkers games until someone wins.
 
@@ -106,18 +243,174 @@ class CheckersGame:
 		----------
 		number_of_games: int
 			Number of games that will be played.
+		number_of_moves: Optional[int]
+			The maximum number of turns of every game.
+		n_workers: Optional[int]
+			Number of worker processes. The games are played in the current process if it is None.
+		seed: Optional[int]
+			Master seed. If it is given, the players of every game are seeded with a stream derived from it and from
+			the index of the game, so the results are identical for any number of workers.
+		compact: Optional[str]
+			Format of the histories (see `CheckersGame.simulate_game`).
+		writer: Optional[GameRecordWriter]
+			If given, every game is appended to it, in order, as soon as it and the previous ones have finished, and
+			the histories are not kept in memory.
+		instrumentation: Optional[Instrumentation]
+			If given, the counters and timers of the games are added to it, including the ones of the games played by
+			the workers (see `Instrumentation`).
 
 		Returns
 		-------
 		Tuple[List[List[StateVector]], List[int]]
-			The list of histories and the list of results for the simulated games.
+			The list of histories and the list of results for the simulated games. The list of histories is empty if
+			a writer is given.
 		"""
-		histories = []
-		results = []
+		histories = [None] * number_of_games if writer is None else []
+		results = [None] * number_of_games
 
-		for i in range(number_of_games):
-			history, result = self.simulate_game()
-			histories.append(history)
-			results.append(result)
+		# games that finished before some of the previous ones, waiting to be written.
+		pending = {}
+		next_to_write = 0
+
+		with instrumentation if instrumentation is not None else nullcontext():
+			games = self.iter_simulate_games(number_of_games, number_of_moves, n_workers, seed, compact=compact)
+			for i, history, result in games:
+				results[i] = result
+				if writer is None:
+					histories[i] = history
+					continue
+
+				pending[i] = history
+				while next_to_write in pending:
+					writer.write_game(pending.pop(next_to_write), results[next_to_write])
+					next_to_write += 1
 
 		return histories, results
+
+	def iter_simulate_games(
+			self,
+			number_of_games: int,
+			number_of_moves: Optional[int] = np.inf,
+			n_workers: Optional[int] = None,
+			seed: Optional[int] = None,
+			shard_size: Optional[int] = None,
+			compact: Optional[str] = None
+	) -> Iterator[Tuple[int, List[StateVector], int]]:
+		"""
+		Simulate number_of_games checkers games, yielding every game as soon as it finishes.
+
+		With workers, the games are split in shards that are played in a `ProcessPoolExecutor`, so they are not
+		necessarily yielded in order.
+
+		Parameters
+		----------
+		number_of_games: int
+			Number of games that will be played.
+		number_of_moves: Optional[int]
+			The maximum number of turns of every game.
+		n_workers: Optional[int]
+			Number of worker processes. The games are played in the current process if it is None.
+		seed: Optional[int]
+			Master seed (see `CheckersGame.simulate_games`).
+		shard_size: Optional[int]
+			Number of games sent to a worker at once. By default, every worker receives about four shards.
+		compact: Optional[str]
+			Format of the histories (see `CheckersGame.simulate_game`).
+
+		Returns
+		-------
+		Iterator[Tuple[int, List[StateVector], int]]
+			The index, history and result of every game.
+		"""
+		seeds = CheckersGame.game_seeds(seed, number_of_games) if seed is not None else [None] * number_of_games
+		jobs = list(enumerate(seeds))
+
+		if n_workers is None:
+			# every game is yielded as soon as it finishes, so a writer never holds more than one history.
+			yield from _iter_shard(self, jobs, number_of_moves, compact)
+			return
+
+		# the workers instrument their games if the instrumentation is active here, and send it back.
+		instrumentation = StateTransitions.instrumentation
+		profile = None if instrumentation is None else instrumentation.profile
+
+		if shard_size is None:
+			shard_size = max(1, -(-number_of_games // (4 * n_workers)))
+
+		with ProcessPoolExecutor(max_workers=n_workers) as executor:
+			futures = [
+				executor.submit(
+					_simulate_shard, self, jobs[i: i + shard_size], number_of_moves, StateTransitions.backend, compact,
+					profile)
+				for i in range(0, number_of_games, shard_size)
+			]
+			for future in as_completed(futures):
+				results, shard_instrumentation = future.result()
+				if shard_instrumentation is not None:
+					instrumentation.merge(shard_instrumentation)
+				yield from results
+
+	@staticmethod
+	def game_seeds(seed: int, number_of_games: int) -> List[Tuple[int, int]]:
+		"""
+		Derive the seeds of the light and dark players of every game from a master seed.
+
+		Parameters
+		----------
+		seed: int
+			Master seed.
+		number_of_games: int
+			Number of games.
+
+		Returns
+		-------
+		List[Tuple[int, int]]
+			The seed of the light player and the seed of the dark player of every game.
+		"""
+		return [tuple(int(s) for s in child.generate_state(2, np.uint64))
+		        for child in np.random.SeedSequence(seed).spawn(number_of_games)]
+
+
+def _simulate_shard(
+		game: CheckersGame,
+		jobs: List[Tuple[int, Optional[Tuple[int, int]]]],
+		number_of_moves: Optional[int],
+		backend: str,
+		compact: Optional[str] = None,
+		profile: Optional[bool] = None
+) -> Tuple[List[Tuple[int, List[StateVector], int]], Optional[Instrumentation]]:
+	"""
+	Play the games of a shard. Defined at module level so it can be sent to worker processes.
+
+	If profile is not None, the games are instrumented (and profiled if it is True) and the instrumentation is returned
+	with the results.
+	"""
+	StateTransitions.set_backend(backend)
+	instrumentation = None if profile is None else Instrumentation(profile)
+
+	with instrumentation if instrumentation is not None else nullcontext():
+		results = list(_iter_shard(game, jobs, number_of_moves, compact))
+
+	return results, instrumentation
+
+
+def _iter_shard(
+		game: CheckersGame,
+		jobs: List[Tuple[int, Optional[Tuple[int, int]]]],
+		number_of_moves: Optional[int],
+		compact: Optional[str] = None
+) -> Iterator[Tuple[int, List[StateVector], int]]:
+	"""Play the games of a shard in the current process, yielding every game as soon as it finishes."""
+	if any(seeds is not None for _, seeds in jobs):
+		# the seeds are given to copies of the players, so the players of the caller keep their own generators.
+		light_player = copy.copy(game.light_player)
+		dark_player = light_player if game.dark_player is game.light_player else copy.copy(game.dark_player)
+		game = copy.copy(game)
+		game.light_player, game.dark_player = light_player, dark_player
+
+	for i, seeds in jobs:
+		if seeds is not None:
+			game.light_player.seed(seeds[0])
+			game.dark_player.seed(seeds[1])
+		history, result = game.simulate_game(number_of_moves, compact=compact)
+		yield i, history, result
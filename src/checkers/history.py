@@ -0,0 +1,124 @@
+import numpy as np
+from typing import Iterator, List, Optional
+
+from checkers.board import StateVector, StateTransitions
+from checkers.move import Move
+from checkers.piece import PieceHelper
+
+
+class StateHistory:
+    """
+    History of a game stored as a single int8 array of shape (plies, n).
+
+    The array is preallocated and doubled when it is full, so appending a state costs a copy of n bytes. The states
+    are rebuilt as StateVector when they are accessed.
+
+    Attributes:
+    __________
+    size_of_the_board: int
+        Size of the board.
+    """
+
+    def __init__(self, size_of_the_board: int = 8, capacity: int = 128):
+        self.size_of_the_board = size_of_the_board
+        self._states = np.empty((capacity, size_of_the_board ** 2 // 2 + 1), dtype=PieceHelper.dtype)
+        self._length = 0
+
+    @staticmethod
+    def from_states(states: List[StateVector]) -> 'StateHistory':
+        """Build the history of a list of states."""
+        history = StateHistory(states[0].size_of_the_board if len(states) else 8, max(len(states), 1))
+        for state in states:
+            history.append(state)
+        return history
+
+    def append(self, state: StateVector) -> None:
+        if self._length == len(self._states):
+            # an empty history may have no capacity at all, e.g., after being pickled.
+            states = np.empty((max(1, 2 * len(self._states)), self._states.shape[1]), dtype=PieceHelper.dtype)
+            states[:self._length] = self._states
+            self._states = states
+
+        self._states[self._length] = state
+        self._length += 1
+
+    @property
+    def array(self) -> np.ndarray:
+        """View of shape (plies, n) with the states played so far."""
+        return self._states[:self._length]
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, item: int) -> StateVector:
+        state = self.array[item].copy().view(StateVector)
+        state.size_of_the_board = self.size_of_the_board
+        return state
+
+    def __iter__(self) -> Iterator[StateVector]:
+        for i in range(self._length):
+            yield self[i]
+
+    def __getstate__(self):
+        # do not pickle the unused capacity.
+        return {'size_of_the_board': self.size_of_the_board, '_states': self.array.copy(), '_length': self._length}
+
+    def to_list(self) -> List[StateVector]:
+        """Return the history as a list of StateVector, as returned by `CheckersGame.simulate_game`."""
+        return list(self)
+
+
+class MoveHistory:
+    """
+    History of a game stored as its initial state and the list of moves played.
+
+    The states are rebuilt on demand by replaying the moves, which takes a time proportional to the ply. Iterating
+    over the history replays every move once.
+
+    Attributes:
+    __________
+    initial_state: StateVector
+        The state in which the game started.
+    moves: List[Move]
+        The moves played.
+    """
+
+    def __init__(self, initial_state: Optional[StateVector] = None):
+        self.initial_state = StateVector() if initial_state is None else initial_state.copy()
+        self.moves = []
+
+    def append(self, move: Move) -> None:
+        self.moves.append(move)
+
+    def __len__(self):
+        # number of states, as in the history returned by `CheckersGame.simulate_game`.
+        return len(self.moves) + 1
+
+    def __getitem__(self, item: int) -> StateVector:
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('history index out of range')
+
+        state = self.initial_state.copy()
+        for move in self.moves[:item]:
+            StateTransitions.make_move(state, move)
+        return state
+
+    def __iter__(self) -> Iterator[StateVector]:
+        state = self.initial_state.copy()
+        yield state.copy()
+        for move in self.moves:
+            StateTransitions.make_move(state, move)
+            yield state.copy()
+
+    def to_list(self) -> List[StateVector]:
+        """Return the history as a list of StateVector, as returned by `CheckersGame.simulate_game`."""
+        return list(self)
+
+    def to_state_history(self) -> StateHistory:
+        """Return the same history stored as states."""
+        history = StateHistory(self.initial_state.size_of_the_board, len(self))
+        for state in self:
+            history.append(state)
+        return history
@@ -0,0 +1,166 @@
+import cProfile
+import json
+import pstats
+import time
+from typing import Dict, Optional
+
+from checkers.board import StateTransitions
+
+
+class _ProfileData:
+    """Raw statistics of a profiler, in the form that `pstats.Stats` loads."""
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+class Instrumentation:
+    """
+    Counters and per-phase timers of the move generation and the games.
+
+    Instrumentation is opt-in: it is active inside a `with` block, which installs it in
+    `StateTransitions.instrumentation`, or when it is passed to `CheckersGame.simulate_game` or
+    `CheckersGame.simulate_games`. When it is not active the hot paths only check that attribute. The games played by
+    worker processes are instrumented by the workers and merged into the active instance.
+
+    Counters:
+
+    - games, plies: games played and moves made in them.
+    - captures: pieces captured in the moves made.
+    - movegen_calls, nodes_generated: calls to the move generators and successors returned by them.
+    - deepcopies: states copied by the numpy move generator.
+
+    Timers, in seconds:
+
+    - movegen: time spent in `StateTransitions.feasible_next_moves` and `StateTransitions.feasible_next_move_list`.
+      The players generate their moves, so most of it is also counted in next_move.
+    - next_move: time spent in the `next_move` method of the players.
+    - bookkeeping: rest of the time of the games, e.g., storing the histories and probing the tablebases.
+    - total: total time of the games.
+
+    Attributes:
+    __________
+    counters: Dict[str, int]
+        The counters.
+    timers: Dict[str, float]
+        The timers.
+    profile: bool
+        If True, the code run while the instrumentation is active is also profiled with cProfile.
+    """
+    counter_names = ('games', 'plies', 'captures', 'movegen_calls', 'nodes_generated', 'deepcopies')
+    timer_names = ('movegen', 'next_move', 'bookkeeping', 'total')
+
+    def __init__(self, profile: bool = False):
+        self.profile = profile
+        self.counters = dict.fromkeys(self.counter_names, 0)
+        self.timers = dict.fromkeys(self.timer_names, 0.)
+        self._profile_stats = None
+        self._profiler = None
+        self._previous = []
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] += value
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.timers[name] += seconds
+
+    def time_movegen(self, generator, state):
+        """Call a move generator, counting the call, the successors and the time."""
+        start = time.perf_counter()
+        successors = generator(state)
+        self.timers['movegen'] += time.perf_counter() - start
+        self.counters['movegen_calls'] += 1
+        self.counters['nodes_generated'] += len(successors)
+        return successors
+
+    def __enter__(self):
+        self._previous.append(StateTransitions.instrumentation)
+        StateTransitions.instrumentation = self
+        if self.profile and len(self._previous) == 1:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, *args):
+        if self._profiler is not None and len(self._previous) == 1:
+            self._profiler.disable()
+            self._profiler.create_stats()
+            self._add_profile_stats(self._profiler.stats)
+            self._profiler = None
+        StateTransitions.instrumentation = self._previous.pop()
+
+    def _add_profile_stats(self, stats: dict) -> None:
+        if self._profile_stats is None:
+            self._profile_stats = pstats.Stats(_ProfileData(stats))
+        else:
+            self._profile_stats.add(_ProfileData(stats))
+
+    def merge(self, other: 'Instrumentation') -> None:
+        """Add the counters, timers and profile of another instance, e.g., the one of a worker process."""
+        for name, value in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        for name, value in other.timers.items():
+            self.timers[name] = self.timers.get(name, 0.) + value
+        if other._profile_stats is not None:
+            self._add_profile_stats(other._profile_stats.stats)
+
+    def __getstate__(self):
+        # the profiler cannot be pickled, so only its statistics are sent.
+        return {'profile': self.profile, 'counters': self.counters, 'timers': self.timers,
+                'profile_stats': None if self._profile_stats is None else self._profile_stats.stats}
+
+    def __setstate__(self, state):
+        self.__init__(state['profile'])
+        self.counters, self.timers = state['counters'], state['timers']
+        if state['profile_stats'] is not None:
+            self._add_profile_stats(state['profile_stats'])
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        """
+        Export the results.
+
+        Returns
+        -------
+        Dict[str, Dict[str, float]]:
+            The counters, the timers and some rates derived from them.
+        """
+        counters, timers = self.counters, self.timers
+        rates = {
+            'plies_per_second': counters['plies'] / timers['total'] if timers['total'] else 0.,
+            'nodes_per_second': counters['nodes_generated'] / timers['movegen'] if timers['movegen'] else 0.,
+            'nodes_per_call': counters['nodes_generated'] / counters['movegen_calls'] if counters['movegen_calls']
+            else 0.,
+        }
+        return {'counters': dict(counters), 'timers': dict(timers), 'rates': rates}
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        """Export the results (see `Instrumentation.to_dict`) as JSON, and write them to path if it is given."""
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(text)
+        return text
+
+    def stats(self) -> Optional[pstats.Stats]:
+        """Return the profile of the instrumented code, or None if it was not profiled."""
+        return self._profile_stats
+
+    def dump_stats(self, path: str) -> None:
+        """Write the profile in the pstats format, which can be read with `pstats.Stats(path)` or snakeviz."""
+        if self._profile_stats is None:
+            raise Exception('Nothing was profiled. Create the instrumentation with profile=True.')
+        self._profile_stats.dump_stats(path)
+
+    def reset(self) -> None:
+        """Set the counters and timers to zero and discard the profile."""
+        self.counters = dict.fromkeys(self.counter_names, 0)
+        self.timers = dict.fromkeys(self.timer_names, 0.)
+        self._profile_stats = None
+
+    def __repr__(self):
+        counters = ', '.join(f'{k}={v}' for k, v in self.counters.items())
+        return f'Instrumentation({counters})'
+
@@ -0,0 +1,76 @@
+from typing import Tuple
+
+
+class Move:
+    """
+    A move of a single piece, which can be applied to and taken back from a `StateVector` in place.
+
+    Attributes:
+    __________
+    origin: int
+        Index of the square in which the piece starts.
+    path: Tuple[int, ...]
+        Indices of the squares in which the piece lands, in order. The last one is the final square of the piece.
+    captured: Tuple[int, ...]
+        Indices of the squares of the captured pieces, in the order in which they are captured.
+    captured_pieces: Tuple[int, ...]
+        Values of the captured pieces, needed to take the move back.
+    promotion: bool
+        True if the piece is promoted by the move.
+    """
+    __slots__ = ('origin', 'path', 'captured', 'captured_pieces', 'promotion')
+
+    def __init__(
+            self,
+            origin: int,
+            path: Tuple[int, ...],
+            captured: Tuple[int, ...] = (),
+            captured_pieces: Tuple[int, ...] = (),
+            promotion: bool = False):
+        self.origin = origin
+        self.path = path
+        self.captured = captured
+        self.captured_pieces = captured_pieces
+        self.promotion = promotion
+
+    @property
+    def target(self) -> int:
+        """Index of the square in which the piece finishes the move."""
+        return self.path[-1]
+
+    @property
+    def is_capture(self) -> bool:
+        return bool(self.captured)
+
+    def encode(self) -> int:
+        """
+        Pack the move into a positive integer that fits in 63 bits, e.g., to store it in an array.
+
+        The origin and the first eight squares of the path take 7 bits each, so the code identifies the move exactly
+        on boards of up to 14x14 with paths of up to eight jumps. Longer paths share the code of their beginning.
+
+        Returns
+        -------
+        int:
+            The code of the move.
+        """
+        code = 0
+        for i, square in enumerate(((self.origin,) + self.path)[:9]):
+            code |= (square + 1) << (7 * i)
+        return code
+
+    def __eq__(self, other):
+        return (isinstance(other, Move)
+                and (self.origin, self.path, self.captured) == (other.origin, other.path, other.captured))
+
+    def __hash__(self):
+        return hash((self.origin, self.path, self.captured))
+
+    @property
+    def notation(self) -> str:
+        """Standard notation of the move, with the squares numbered from 1 as in `StateVector.to_fen`, e.g., '9-13'."""
+        separator = 'x' if self.captured else '-'
+        return separator.join(str(k + 1) for k in (self.origin,) + self.path)
+
+    def __repr__(self):
+        return f'Move({self.notation}{", promotion" if self.promotion else ""})'
@@ -0,0 +1,176 @@
+"""
+Perft (performance test) for the move generators of `StateTransitions`.
+
+Perft counts the leaf positions of the game tree up to a given depth. Comparing the counts against the reference
+table shows that a move generator follows the rules of the game, and timing them gives its speed in nodes per second.
+
+Usage::
+
+    python -m checkers.perft --depth 6 --backend bitboard
+    python -m checkers.perft --depth 4 --fen "B:W18,K30:B3,7,22"
+"""
+import argparse
+import time
+from typing import List, Optional, Tuple
+
+from checkers.board import StateVector, StateTransitions
+
+
+# Leaf counts from the initial 8x8 position (`StateVector()`, light to move) for each depth. Every successor returned
+# by `StateTransitions.feasible_next_moves` is counted once, even if several jump sequences reach it.
+REFERENCE_NODE_COUNTS = {
+    1: 7,
+    2: 49,
+    3: 368,
+    4: 2622,
+    5: 20162,
+    6: 148466,
+    7: 1133811,
+    8: 8362181,
+}
+
+
+class PerftResult:
+    """
+    The outcome of a perft run.
+
+    Attributes:
+    __________
+    depth: int
+        Depth of the run.
+    nodes: int
+        Number of leaf positions at that depth.
+    seconds: float
+        Wall-clock time of the run.
+    backend: str
+        Name of the `StateTransitions` backend used.
+    """
+    def __init__(self, depth: int, nodes: int, seconds: float, backend: str):
+        self.depth = depth
+        self.nodes = nodes
+        self.seconds = seconds
+        self.backend = backend
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.seconds if self.seconds > 0 else float('inf')
+
+    def __repr__(self):
+        return (f'PerftResult(depth={self.depth}, nodes={self.nodes}, seconds={self.seconds:.3f}, '
+                f'nodes_per_second={self.nodes_per_second:.0f}, backend={self.backend!r})')
+
+
+def perft(state: StateVector, depth: int) -> int:
+    """
+    Count the leaf positions reachable from state in exactly depth plies.
+
+    Parameters
+    ----------
+    state: StateVector
+        The root of the tree.
+    depth: int
+        Number of plies to explore.
+
+    Returns
+    -------
+    int:
+        Number of leaf positions.
+    """
+    if depth == 0:
+        return 1
+
+    next_states = StateTransitions.feasible_next_moves(state)
+    if depth == 1:
+        return len(next_states)
+
+    return sum(perft(s, depth - 1) for s in next_states)
+
+
+def divide(state: StateVector, depth: int) -> List[Tuple[StateVector, int]]:
+    """
+    Return the perft count below each successor of state, which helps to find the move in which two generators differ.
+
+    Parameters
+    ----------
+    state: StateVector
+        The root of the tree.
+    depth: int
+        Number of plies to explore, counting the move from the root.
+
+    Returns
+    -------
+    List[Tuple[StateVector, int]]:
+        Pairs of successor and number of leaf positions below it.
+    """
+    return [(s, perft(s, depth - 1)) for s in StateTransitions.feasible_next_moves(state)]
+
+
+def run_perft(depth: int, state: Optional[StateVector] = None, backend: Optional[str] = None) -> PerftResult:
+    """
+    Time a perft run.
+
+    Parameters
+    ----------
+    depth: int
+        Number of plies to explore.
+    state: Optional[StateVector]
+        The root of the tree. The initial position by default.
+    backend: Optional[str]
+        Backend of `StateTransitions` to use. The selected one by default.
+
+    Returns
+    -------
+    PerftResult:
+        The number of leaf positions and the time it took to count them.
+    """
+    if state is None:
+        state = StateVector()
+
+    previous_backend = StateTransitions.backend
+    if backend is not None:
+        StateTransitions.set_backend(backend)
+
+    try:
+        start = time.perf_counter()
+        nodes = perft(state, depth)
+        seconds = time.perf_counter() - start
+        return PerftResult(depth, nodes, seconds, StateTransitions.backend)
+    finally:
+        StateTransitions.set_backend(previous_backend)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Count the leaf positions of the game tree.')
+    parser.add_argument('--depth', type=int, default=5, help='maximum depth, every depth up to it is reported')
+    parser.add_argument('--fen', default=None, help='FEN-like start position, e.g., "W:W1-12:B21-32"')
+    parser.add_argument('--size', type=int, default=8, help='size of the board')
+    parser.add_argument('--backend', default=None, choices=sorted(StateTransitions.backends))
+    parser.add_argument('--divide', action='store_true', help='report the count below every root move')
+    args = parser.parse_args(argv)
+
+    state = StateVector(args.size) if args.fen is None else StateVector.from_fen(args.fen, args.size)
+    check_reference = args.fen is None and args.size == 8
+
+    if args.divide:
+        previous_backend = StateTransitions.backend
+        if args.backend is not None:
+            StateTransitions.set_backend(args.backend)
+        try:
+            for s, nodes in divide(state, args.depth):
+                print(f'{s.to_fen()}  {nodes}')
+        finally:
+            StateTransitions.set_backend(previous_backend)
+        return
+
+    for depth in range(1, args.depth + 1):
+        result = run_perft(depth, state, args.backend)
+        line = (f'depth {depth:2d}  nodes {result.nodes:12d}  {result.seconds:9.3f}s  '
+                f'{result.nodes_per_second:12.0f} nodes/s')
+        if check_reference and depth in REFERENCE_NODE_COUNTS:
+            line += '  ok' if result.nodes == REFERENCE_NODE_COUNTS[depth] else \
+                f'  MISMATCH (expected {REFERENCE_NODE_COUNTS[depth]})'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 import numpy as np
-from typing import List, Tuple
+from typing import Tuple
 
 
 class PieceHelper:
@@ -17,12 +17,21 @@ class PieceHelper:
     light = 1
     _toggle_turn = dark ^ light
 
+    # diagonals in which every piece value can move, built once.
+    _diagonals = {
+        queen: ((1, 1), (1, -1), (-1, 1), (-1, -1)),
+        piece: ((1, 1), (1, -1)),
+        -piece: ((-1, 1), (-1, -1)),
+        -queen: ((1, 1), (1, -1), (-1, 1), (-1, -1)),
+    }
+
     @staticmethod
-    @np.vectorize
     def piece_color(piece: int) -> int:
         """
         Return the color of the piece.
 
+        Branch-free version for a single square. Use `PieceHelper.piece_colors` for arrays.
+
         Parameters
         ----------
         piece: int
@@ -30,15 +39,30 @@ class PieceHelper:
 
         Returns
         -------
-            PieceHelper.light or PieceHelper.dark
+            PieceHelper.light, PieceHelper.dark or PieceHelper.empty_square for an empty square.
+        """
+        piece = int(piece)
+        return (piece > 0) - (piece < 0)
+
+    @staticmethod
+    def piece_colors(pieces: np.ndarray) -> np.ndarray:
+        """
+        Return the color of every piece of an array, i.e., `PieceHelper.piece_color` as a ufunc.
+
+        Parameters
+        ----------
+        pieces: np.ndarray
+            The piece values.
+
+        Returns
+        -------
+        np.ndarray:
+            PieceHelper.light, PieceHelper.dark or PieceHelper.empty_square for every square.
         """
-        if piece == PieceHelper.empty_square:
-            return 0
-        else:
-            return PieceHelper.dark if piece < PieceHelper.empty_square else PieceHelper.light
+        return np.sign(pieces)
 
     @staticmethod
-    def get_diagonals(piece_value: int) -> List[Tuple[int, int]]:
+    def get_diagonals(piece_value: int) -> Tuple[Tuple[int, int], ...]:
         """
         Return the possible diagonals in which a piece can move.
 
@@ -49,11 +73,7 @@ class PieceHelper:
 
         Returns
         -------
-        List[Tuple[int, int]]:
-            The list with the possible diagonals in which a piece can go.
+        Tuple[Tuple[int, int], ...]:
+            The possible diagonals in which a piece can go, or an empty tuple for an empty square.
         """
-        if abs(piece_value) == PieceHelper.queen:
-            return [(1, 1), (1, -1), (-1, 1), (-1, -1)]
-        if abs(piece_value) == PieceHelper.piece:
-            color = PieceHelper.piece_color(piece_value)
-            return [(1 * color, 1), (1 * color, -1)]
\ No newline at end of file
+        return PieceHelper._diagonals.get(int(piece_value), ())
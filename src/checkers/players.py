@@ -1,6 +1,18 @@
 from abc import ABC, abstractmethod
 from checkers.board import StateVector, StateTransitions
+from checkers.book import OpeningBook
+from checkers.evaluation import BatchEvaluator
+from checkers.move import Move
+from checkers.piece import PieceHelper
+from checkers.tablebase import EndgameTablebase
+from checkers.transposition import TranspositionTable
 import random as rnd
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
 
 
 class CheckersPlayer(ABC):
@@ -12,6 +24,22 @@ class CheckersPlayer(ABC):
 	def __init__(self):
 		pass
 
+	@property
+	def random(self):
+		"""Source of randomness of the player: the global `random` module unless the player has been seeded."""
+		return getattr(self, '_random', None) or rnd
+
+	def seed(self, seed: int) -> None:
+		"""
+		Give the player its own random number generator.
+
+		Parameters
+		----------
+		seed: int
+			Seed of the generator.
+		"""
+		self._random = rnd.Random(seed)
+
 	@abstractmethod
 	def next_move(self, state: StateVector) -> StateVector:
 		"""
@@ -48,4 +76,558 @@ class UniformPlayer(CheckersPlayer):
 		"""
 		next_moves = StateTransitions.feasible_next_moves(state)
 		if next_moves:
-			return rnd.choice(next_moves)
+			return self.random.choice(next_moves)
+
+
+class _SearchLimitReached(Exception):
+	"""Raised inside the search when the time or node budget of a move is exhausted."""
+
+
+class AlphaBetaPlayer(CheckersPlayer):
+	"""
+	Represents a player that chooses its move with an alpha-beta search.
+
+	The search deepens iteratively until the time or node budget of the move is exhausted, and the move of the last
+	completed depth is played. Captures and the best move found by the previous iteration are searched first, and the
+	leaves are extended with a quiescence search over the captures. Final positions are scored with
+	`CheckersGame.decide_winner`.
+
+	After every call to `next_move` the attributes `nodes_searched`, `depth_reached`, `elapsed` and
+	`nodes_per_second` describe the search.
+
+	Attributes:
+	__________
+	max_depth: int
+		Maximum depth of the search.
+	time_limit_ms: Optional[float]
+		Time budget of every move in milliseconds.
+	node_limit: Optional[int]
+		Node budget of every move.
+	evaluate: Callable[[StateVector], float]
+		Evaluation of a position from the point of view of the player in turn.
+	evaluator: Optional[BatchEvaluator]
+		If given, the positions are evaluated with it, and the children of the nodes next to the leaves are evaluated
+		together with `BatchEvaluator.evaluate_batch` instead of one at a time. It cannot be given with evaluate.
+	transposition_table: Optional[TranspositionTable]
+		Table with the results of previous searches. It can be shared with other players and is kept across moves
+		and games.
+	tablebase: Optional[EndgameTablebase]
+		If given, the positions found in it are scored with their exact result instead of being searched.
+	opening_book: Optional[OpeningBook]
+		If given, the moves found in it (see `OpeningBook.best_move`) are played without searching.
+	"""
+	win_score = 100000
+	piece_values = np.array([-150, -100, 0, 100, 150])
+
+	def __init__(
+			self,
+			max_depth: int = 64,
+			time_limit_ms: Optional[float] = 1000,
+			node_limit: Optional[int] = None,
+			evaluate: Optional[Callable[[StateVector], float]] = None,
+			transposition_table: Optional[TranspositionTable] = None,
+			tablebase: Optional[EndgameTablebase] = None,
+			opening_book: Optional[OpeningBook] = None,
+			evaluator: Optional[BatchEvaluator] = None):
+		super().__init__()
+		if time_limit_ms is None and node_limit is None and max_depth >= 64:
+			raise Exception('The search needs a time limit, a node limit or a maximum depth.')
+
+		self.max_depth = max_depth
+		self.time_limit_ms = time_limit_ms
+		self.node_limit = node_limit
+		if evaluate is not None and evaluator is not None:
+			# the stand-pat values of the children next to the leaves would come from another scale.
+			raise Exception('Give either evaluate or evaluator, not both: the evaluator is also used one position at a '
+			                'time.')
+		self.evaluator = evaluator
+		if evaluate is None:
+			evaluate = evaluator.evaluate if evaluator is not None else AlphaBetaPlayer.material
+		self.evaluate = evaluate
+		self.transposition_table = transposition_table
+		self.tablebase = tablebase
+		self.opening_book = opening_book
+
+		self.nodes_searched = 0
+		self.depth_reached = 0
+		self.elapsed = 0.
+		self.score = 0
+		self._best_moves = {}
+		self._deadline = None
+
+	@property
+	def nodes_per_second(self) -> float:
+		return self.nodes_searched / self.elapsed if self.elapsed > 0 else 0.
+
+	@staticmethod
+	def material(state: StateVector) -> float:
+		"""Material balance from the point of view of the player in turn. Queens are worth 1.5 men."""
+		return int(AlphaBetaPlayer.piece_values[state[:-1] + PieceHelper.queen].sum()) * int(state.turn)
+
+	def next_move(self, state: StateVector) -> Optional[StateVector]:
+		"""
+		Search for the best move within the budget.
+
+		Parameters
+		----------
+		state: StateVector
+			The state in which the player needs to take the move.
+
+		Returns
+		-------
+		StateVector:
+			The state in which the game will be after the move of the player, or None if there are no moves.
+		"""
+		if self.opening_book is not None:
+			next_state = self.opening_book.best_move(state)
+			if next_state is not None:
+				self.nodes_searched = self.depth_reached = 0
+				self.elapsed = 0.
+				return next_state
+
+		board = state.copy()
+		moves = StateTransitions.feasible_next_move_list(board)
+		if not moves:
+			return None
+
+		start = time.perf_counter()
+		self._deadline = None if self.time_limit_ms is None else start + self.time_limit_ms / 1000
+		self._best_moves = {}
+		self.nodes_searched = 0
+		self.depth_reached = 0
+
+		best_move = moves[0]
+		try:
+			for depth in range(1, self.max_depth + 1):
+				self.score, best_move = self._search_root(board, moves, depth, best_move)
+				self.depth_reached = depth
+				if abs(self.score) >= self.win_score - self.max_depth or len(moves) == 1:
+					break
+		except _SearchLimitReached:
+			pass
+
+		self.elapsed = time.perf_counter() - start
+		logging.info(f'{type(self).__name__}: depth {self.depth_reached}, {self.nodes_searched} nodes, '
+		             f'{self.nodes_per_second:.0f} nodes/s, score {self.score}')
+
+		next_state = state.copy()
+		StateTransitions.make_move(next_state, best_move)
+		return next_state
+
+	def _order_moves(self, moves: List[Move], best_move: Optional[Move]) -> List[Move]:
+		"""Put the best move first and then the captures, the ones capturing more pieces first."""
+		ordered = sorted(moves, key=lambda m: -len(m.captured))
+		if best_move is not None and best_move in ordered:
+			ordered.remove(best_move)
+			ordered.insert(0, best_move)
+		return ordered
+
+	def _count_node(self) -> None:
+		self.nodes_searched += 1
+		if self.node_limit is not None and self.nodes_searched >= self.node_limit:
+			raise _SearchLimitReached
+		if self._deadline is not None and time.perf_counter() >= self._deadline:
+			raise _SearchLimitReached
+
+	def _terminal_score(self, state: StateVector, ply: int) -> int:
+		"""Score of a position without moves, preferring the quickest wins and the slowest losses."""
+		from checkers.game import CheckersGame
+
+		winner = CheckersGame.decide_winner(state)
+		if winner == PieceHelper.empty_square:
+			return 0
+		return self.win_score - ply if winner == state.turn else ply - self.win_score
+
+	def _tablebase_score(self, state: StateVector, entry: Tuple[int, int], ply: int) -> int:
+		"""Score of a position of the tablebase, consistent with the scores of the final positions."""
+		winner, distance = entry
+		if winner == PieceHelper.empty_square:
+			return 0
+		return self.win_score - ply - distance if winner == state.turn else ply + distance - self.win_score
+
+	def _children(self, state: StateVector, moves: List[Move], best_move: Optional[Move], depth: int) \
+			-> List[Tuple[Move, Optional[float]]]:
+		"""
+		Order the moves (see `AlphaBetaPlayer._order_moves`) and pair them with the evaluation of the next position.
+
+		Next to the leaves, if the player has a `BatchEvaluator`, the next positions are evaluated at once and the
+		moves that are neither the best move nor captures are ordered by their evaluation, which is the one of the
+		opponent. Otherwise the positions are evaluated when they are reached.
+		"""
+		moves = self._order_moves(moves, best_move)
+		if depth != 1:
+			return [(move, None) for move in moves]
+		return self._evaluate_children(state, moves, best_move)
+
+	def _evaluate_children(self, state: StateVector, moves: List[Move], best_move: Optional[Move] = None) \
+			-> List[Tuple[Move, Optional[float]]]:
+		"""Pair every move with the evaluation of the next position, computed at once if there is a `BatchEvaluator`."""
+		if self.evaluator is None or len(moves) < 2:
+			return [(move, None) for move in moves]
+		stand_pats = self.evaluator.evaluate_batch(StateTransitions.successor_array(state, moves)).tolist()
+		return sorted(zip(moves, stand_pats), key=lambda c: (c[0] != best_move, -len(c[0].captured), c[1]))
+
+	def _search_root(self, state: StateVector, moves: List[Move], depth: int, best_move: Move) -> Tuple[int, Move]:
+		alpha, beta = -np.inf, np.inf
+		best_score = -np.inf
+		for move, stand_pat in self._children(state, moves, best_move, depth):
+			StateTransitions.make_move(state, move)
+			score = -self._negamax(state, depth - 1, -beta, -alpha, 1, stand_pat)
+			StateTransitions.unmake_move(state, move)
+
+			if score > best_score:
+				best_score, best_move = score, move
+			alpha = max(alpha, score)
+
+		return best_score, best_move
+
+	def _negamax(self, state: StateVector, depth: int, alpha: float, beta: float, ply: int,
+	             stand_pat: Optional[float] = None) -> float:
+		self._count_node()
+
+		moves = StateTransitions.feasible_next_move_list(state)
+		if not moves:
+			return self._terminal_score(state, ply)
+		if self.tablebase is not None:
+			entry = self.tablebase.probe(state)
+			if entry is not None:
+				return self._tablebase_score(state, entry, ply)
+		if depth <= 0:
+			return self._quiescence(state, moves, alpha, beta, ply, stand_pat)
+
+		key = state.zobrist_hash
+		hint = self._best_moves.get(key)
+
+		table = self.transposition_table
+		if table is not None:
+			entry = table.probe(key)
+			if entry is not None:
+				entry_depth, bound, score, code = entry
+				score = self._score_from_table(score, ply)
+				if entry_depth >= depth and (bound == TranspositionTable.exact
+				                             or (bound == TranspositionTable.lower_bound and score >= beta)
+				                             or (bound == TranspositionTable.upper_bound and score <= alpha)):
+					return score
+				if hint is None and code:
+					hint = next((m for m in moves if m.encode() == code), None)
+
+		original_alpha = alpha
+		best_score, best_move = -np.inf, None
+		for move, stand_pat in self._children(state, moves, hint, depth):
+			StateTransitions.make_move(state, move)
+			score = -self._negamax(state, depth - 1, -beta, -alpha, ply + 1, stand_pat)
+			StateTransitions.unmake_move(state, move)
+
+			if score > best_score:
+				best_score, best_move = score, move
+			alpha = max(alpha, score)
+			if alpha >= beta:
+				break
+
+		self._best_moves[key] = best_move
+		if table is not None:
+			if best_score <= original_alpha:
+				bound = TranspositionTable.upper_bound
+			elif best_score >= beta:
+				bound = TranspositionTable.lower_bound
+			else:
+				bound = TranspositionTable.exact
+			table.store(key, depth, bound, self._score_to_table(best_score, ply), best_move.encode())
+
+		return best_score
+
+	def _score_to_table(self, score: float, ply: int) -> float:
+		"""Store the wins and losses as a distance from the position instead of from the root."""
+		if score >= self.win_score - 1000:
+			return score + ply
+		if score <= 1000 - self.win_score:
+			return score - ply
+		return score
+
+	def _score_from_table(self, score: float, ply: int) -> float:
+		if score >= self.win_score - 1000:
+			return score - ply
+		if score <= 1000 - self.win_score:
+			return score + ply
+		return score
+
+	def _quiescence(self, state: StateVector, moves: List[Move], alpha: float, beta: float, ply: int,
+	                stand_pat: Optional[float] = None) -> float:
+		"""Search only the captures until the position is quiet. stand_pat is the evaluation of state, if known."""
+		best_score = self.evaluate(state) if stand_pat is None else stand_pat
+		if best_score >= beta:
+			return best_score
+		alpha = max(alpha, best_score)
+
+		captures = sorted((m for m in moves if m.captured), key=lambda m: -len(m.captured))
+		for move, stand_pat in self._evaluate_children(state, captures):
+			StateTransitions.make_move(state, move)
+			self._count_node()
+			next_moves = StateTransitions.feasible_next_move_list(state)
+			if next_moves:
+				score = -self._quiescence(state, next_moves, -beta, -alpha, ply + 1, stand_pat)
+			else:
+				score = -self._terminal_score(state, ply + 1)
+			StateTransitions.unmake_move(state, move)
+
+			if score > best_score:
+				best_score = score
+			alpha = max(alpha, score)
+			if alpha >= beta:
+				break
+
+		return best_score
+
+
+class _MCTSNode:
+	"""Node of the search tree of `MCTSPlayer`. The value is counted from the point of view of the player who moved."""
+	__slots__ = ('move', 'parent', 'children', 'untried', 'mover', 'visits', 'value', 'winner')
+
+	def __init__(self, move: Optional[Move], parent: Optional['_MCTSNode'], mover: int, moves: List[Move]):
+		self.move = move
+		self.parent = parent
+		self.children = []
+		self.untried = moves
+		self.mover = mover
+		self.visits = 0
+		self.value = 0.
+		# result of the game if the node is a final position
+		self.winner = None
+
+
+def _play_out_chunk(size_of_the_board: int, seed: int, states: np.ndarray, number_of_moves: int) -> np.ndarray:
+	"""Play random games from states. Defined at module level so it can be sent to worker processes."""
+	from checkers.batched import BatchedSimulator
+
+	return BatchedSimulator(size_of_the_board, seed).play_out(states, number_of_moves)
+
+
+class MCTSPlayer(CheckersPlayer):
+	"""
+	Represents a player that chooses its move with Monte Carlo Tree Search (UCT).
+
+	Every iteration selects a batch of leaves with the UCT rule, applying a virtual loss so that the leaves of a batch
+	differ, and plays them out with uniform random players in lockstep with `BatchedSimulator`. The final positions
+	are backed up as soon as they are selected, since their value is known. The batches can be split across a pool of
+	worker processes. The subtree of the move played is kept between calls to `next_move`, so
+	the work done on the reply of the opponent is not lost.
+
+	Attributes:
+	__________
+	playouts: Optional[int]
+		Number of playouts of every move.
+	time_limit_ms: Optional[float]
+		Time budget of every move in milliseconds.
+	exploration: float
+		Exploration constant of UCT.
+	batch_size: int
+		Maximum number of leaves played out at once. With a number of playouts, a batch takes at most half of the
+		remaining ones, so that even a budget of a single batch is backed up a few times and the later leaves are
+		selected with the values of the earlier ones.
+	rollout_moves: int
+		Maximum number of turns of every playout. The result of longer playouts is decided with
+		`CheckersGame.decide_winner` on the last state.
+	n_workers: Optional[int]
+		Number of worker processes for the playouts. They are played in the current process if it is None.
+	opening_book: Optional[OpeningBook]
+		If given, the moves found in it (see `OpeningBook.best_move`) are played without searching.
+	evaluator: Optional[BatchEvaluator]
+		If given, the leaves of every batch are scored at once with `BatchEvaluator.light_win_probabilities` instead of
+		being played out.
+	"""
+
+	def __init__(
+			self,
+			playouts: Optional[int] = 1000,
+			time_limit_ms: Optional[float] = None,
+			exploration: float = 1.4,
+			batch_size: int = 32,
+			rollout_moves: int = 200,
+			n_workers: Optional[int] = None,
+			seed: Optional[int] = None,
+			opening_book: Optional[OpeningBook] = None,
+			evaluator: Optional[BatchEvaluator] = None):
+		super().__init__()
+		if playouts is None and time_limit_ms is None:
+			raise Exception('The search needs a number of playouts or a time limit.')
+
+		self.playouts = playouts
+		self.time_limit_ms = time_limit_ms
+		self.exploration = exploration
+		self.batch_size = batch_size
+		self.rollout_moves = rollout_moves
+		self.n_workers = n_workers
+		self.opening_book = opening_book
+		self.evaluator = evaluator
+
+		self.playouts_done = 0
+		self.elapsed = 0.
+		self._executor = None
+		self._root = None
+		self._root_state = None
+		self.seed(seed)
+
+	def seed(self, seed: Optional[int]) -> None:
+		super().seed(seed)
+		self._rng = np.random.default_rng(seed)
+		self._root = self._root_state = None
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state['_executor'] = None
+		return state
+
+	def close(self) -> None:
+		"""Shut down the pool of worker processes, if any."""
+		if self._executor is not None:
+			self._executor.shutdown()
+			self._executor = None
+
+	@property
+	def playouts_per_second(self) -> float:
+		return self.playouts_done / self.elapsed if self.elapsed > 0 else 0.
+
+	def next_move(self, state: StateVector) -> Optional[StateVector]:
+		"""
+		Search for the best move within the budget.
+
+		Parameters
+		----------
+		state: StateVector
+			The state in which the player needs to take the move.
+
+		Returns
+		-------
+		StateVector:
+			The state in which the game will be after the move of the player, or None if there are no moves.
+		"""
+		if self.opening_book is not None:
+			next_state = self.opening_book.best_move(state)
+			if next_state is not None:
+				self.playouts_done = 0
+				self._root = self._root_state = None
+				return next_state
+
+		root = self._reuse_tree(state)
+		if root is None:
+			moves = StateTransitions.feasible_next_move_list(state)
+			if not moves:
+				return None
+			root = _MCTSNode(None, None, -int(state.turn), moves)
+		elif not root.children and not root.untried:
+			return None
+
+		start = time.perf_counter()
+		deadline = None if self.time_limit_ms is None else start + self.time_limit_ms / 1000
+		self.playouts_done = 0
+		while (self.playouts is None or self.playouts_done < self.playouts) \
+				and (deadline is None or time.perf_counter() < deadline):
+			# at most half of the remaining playouts (see `MCTSPlayer.batch_size`).
+			batch_size = self.batch_size if self.playouts is None \
+				else min(self.batch_size, max(1, (self.playouts - self.playouts_done) // 2))
+			self._iterate(root, state, batch_size)
+		self.elapsed = time.perf_counter() - start
+
+		best = max(root.children, key=lambda c: c.visits)
+		next_state = state.copy()
+		StateTransitions.make_move(next_state, best.move)
+
+		# keep the subtree of the move played
+		best.parent = None
+		self._root, self._root_state = best, next_state.copy()
+		return next_state
+
+	def _reuse_tree(self, state: StateVector) -> Optional[_MCTSNode]:
+		"""Return the node of the previous tree holding state, if any."""
+		if self._root is None or self._root_state.size_of_the_board != state.size_of_the_board:
+			return None
+
+		if self._root_state.same_position(state):
+			return self._root
+
+		board = self._root_state.copy()
+		for child in self._root.children:
+			StateTransitions.make_move(board, child.move)
+			found = board.same_position(state)
+			StateTransitions.unmake_move(board, child.move)
+			if found:
+				child.parent = None
+				return child
+		return None
+
+	def _iterate(self, root: _MCTSNode, state: StateVector, batch_size: int) -> None:
+		"""Select, expand, play out and back up a batch of leaves."""
+		leaves, leaf_states = [], []
+		for _ in range(batch_size):
+			node = root
+			board = state.copy()
+
+			# selection, with a virtual visit on every node of the path
+			while not node.untried and node.children:
+				node = self._select_child(node)
+				StateTransitions.make_move(board, node.move)
+				node.visits += 1
+
+			# expansion
+			if node.untried:
+				move = node.untried.pop(self.random.randrange(len(node.untried)))
+				StateTransitions.make_move(board, move)
+				child = _MCTSNode(move, node, -int(board.turn), StateTransitions.feasible_next_move_list(board))
+				node.children.append(child)
+				node = child
+				node.visits += 1
+
+			if node.winner is None and not node.untried and not node.children:
+				from checkers.game import CheckersGame
+				node.winner = int(CheckersGame.decide_winner(board))
+			root.visits += 1
+
+			if node.winner is not None:
+				# the value of a final position is exact, so it is backed up at once for the rest of the batch.
+				self._back_up(node, self._light_value(node.winner))
+			else:
+				leaves.append(node)
+				leaf_states.append(board)
+
+		if self.evaluator is not None:
+			values = self.evaluator.light_win_probabilities(np.array(leaf_states)).tolist() if leaf_states else []
+		else:
+			values = [self._light_value(winner) for winner in self._play_out(leaf_states)]
+		for node, value in zip(leaves, values):
+			self._back_up(node, value)
+		self.playouts_done += batch_size
+
+	def _select_child(self, node: _MCTSNode) -> _MCTSNode:
+		log_visits = np.log(max(node.visits, 1))
+		return max(node.children, key=lambda c: c.value / c.visits
+		           + self.exploration * np.sqrt(log_visits / c.visits))
+
+	@staticmethod
+	def _light_value(winner: int) -> float:
+		"""Value of a result for the light pieces: 1 if they win, 0 if they lose and 0.5 for a tie."""
+		return (1 + winner) / 2
+
+	@staticmethod
+	def _back_up(node: _MCTSNode, light_value: float) -> None:
+		while node is not None:
+			node.value += light_value if node.mover == PieceHelper.light else 1 - light_value
+			node = node.parent
+
+	def _play_out(self, states: List[StateVector]) -> List[int]:
+		"""Return the result of a random game from every state."""
+		if not states:
+			return []
+
+		size_of_the_board = states[0].size_of_the_board
+		states = np.array(states)
+		if self.n_workers is None or len(states) < 2 * self.n_workers:
+			seed = int(self._rng.integers(2 ** 63))
+			return _play_out_chunk(size_of_the_board, seed, states, self.rollout_moves).tolist()
+
+		if self._executor is None:
+			self._executor = ProcessPoolExecutor(max_workers=self.n_workers)
+		chunks = np.array_split(states, self.n_workers)
+		seeds = [int(s) for s in self._rng.integers(2 ** 63, size=len(chunks))]
+		futures = [self._executor.submit(_play_out_chunk, size_of_the_board, seed, chunk, self.rollout_moves)
+		           for seed, chunk in zip(seeds, chunks)]
+		return [int(w) for future in futures for w in future.result()]
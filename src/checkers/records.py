@@ -0,0 +1,249 @@
+"""
+Binary file format for game records.
+
+Layout of a file (all integers are little-endian):
+
+- Header of 64 bytes: magic `CKRD`, format version (uint16), size of the board (uint16), bytes per position (uint16),
+  a reserved uint16, number of games (uint64), number of positions (uint64) and offset of the index (uint64).
+- Positions: every position of every game, one after the other, in fixed-width records. Every square and the turn
+  take 4 bits (the value plus `PieceHelper.queen`), two per byte, so a position of the 8x8 board takes 17 bytes.
+- Index: number of games + 1 uint64 offsets, in positions, of the first position of every game (the last one is the
+  total number of positions), followed by the result of every game (int8).
+
+The index is written at the end of the file when the writer is closed, so a file can be reopened to append more
+games. The reader maps the file with `numpy.memmap` and decodes only the positions that are requested.
+"""
+import os
+import struct
+import numpy as np
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from checkers.board import StateVector
+from checkers.piece import PieceHelper
+
+
+MAGIC = b'CKRD'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHHQQQ')
+HEADER_SIZE = 64
+
+
+def position_size(size_of_the_board: int) -> int:
+    """Number of bytes of a packed position."""
+    return (size_of_the_board ** 2 // 2 + 2) // 2
+
+
+def pack_positions(states: np.ndarray) -> np.ndarray:
+    """
+    Pack states into fixed-width records of 4 bits per square.
+
+    Parameters
+    ----------
+    states: np.ndarray
+        Array of shape (K, n) with K states, including the turn in the last column.
+
+    Returns
+    -------
+    np.ndarray:
+        uint8 array of shape (K, ceil(n / 2)).
+    """
+    states = np.asarray(states, dtype=PieceHelper.dtype)
+    nibbles = (states + PieceHelper.queen).astype(np.uint8)
+    if nibbles.shape[1] % 2:
+        nibbles = np.concatenate([nibbles, np.zeros((len(nibbles), 1), dtype=np.uint8)], axis=1)
+    return nibbles[:, 0::2] | (nibbles[:, 1::2] << 4)
+
+
+def unpack_positions(packed: np.ndarray, size_of_the_board: int = 8) -> np.ndarray:
+    """
+    Inverse of `pack_positions`.
+
+    Parameters
+    ----------
+    packed: np.ndarray
+        uint8 array of shape (K, bytes per position).
+    size_of_the_board: int
+        Size of the board.
+
+    Returns
+    -------
+    np.ndarray:
+        int8 array of shape (K, n) with the states.
+    """
+    n = size_of_the_board ** 2 // 2 + 1
+    packed = np.asarray(packed)
+    nibbles = np.empty((len(packed), 2 * packed.shape[1]), dtype=PieceHelper.dtype)
+    nibbles[:, 0::2] = packed & 0x0F
+    nibbles[:, 1::2] = packed >> 4
+    return nibbles[:, :n] - PieceHelper.queen
+
+
+def _history_array(history) -> np.ndarray:
+    """Return the states of a history (list of StateVector, StateHistory or MoveHistory) as a (plies, n) array."""
+    array = getattr(history, 'array', None)
+    if array is not None:
+        return array
+    return np.array([np.asarray(s) for s in history], dtype=PieceHelper.dtype)
+
+
+class GameRecordWriter:
+    """
+    Writes games to a binary record file (see the module documentation for the format).
+
+    It can be used as a context manager, and must be closed to write the index.
+
+    Attributes:
+    __________
+    path: str
+        Path of the file.
+    size_of_the_board: int
+        Size of the board.
+    """
+
+    def __init__(self, path: str, size_of_the_board: int = 8, append: bool = False):
+        self.path = path
+        self.size_of_the_board = size_of_the_board
+        self._offsets = [0]
+        self._results = []
+
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            reader = GameRecordReader(path)
+            if reader.size_of_the_board != size_of_the_board:
+                raise Exception(f'The file {path} stores games of size {reader.size_of_the_board}, '
+                                f'not {size_of_the_board}.')
+            self._offsets = reader.offsets.tolist()
+            self._results = reader.results.tolist()
+            index_offset = reader.index_offset
+            del reader
+
+            self._file = open(path, 'r+b')
+            self._file.truncate(index_offset)
+            self._file.seek(index_offset)
+        else:
+            self._file = open(path, 'wb')
+            self._file.write(bytes(HEADER_SIZE))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self._results)
+
+    def write_game(self, history, result: int) -> None:
+        """
+        Append a game.
+
+        Parameters
+        ----------
+        history: Union[List[StateVector], StateHistory, MoveHistory]
+            The states of the game.
+        result: int
+            The winner of the game, as returned by `CheckersGame.decide_winner`.
+        """
+        states = _history_array(history)
+        self._file.write(pack_positions(states).tobytes())
+        self._offsets.append(self._offsets[-1] + len(states))
+        self._results.append(int(result))
+
+    def write_games(self, histories: Iterable, results: Iterable[int]) -> None:
+        """Append several games."""
+        for history, result in zip(histories, results):
+            self.write_game(history, result)
+
+    def close(self) -> None:
+        """Write the index and the header and close the file."""
+        if self._file is None:
+            return
+
+        index_offset = HEADER_SIZE + self._offsets[-1] * position_size(self.size_of_the_board)
+        self._file.seek(index_offset)
+        self._file.write(np.array(self._offsets, dtype='<u8').tobytes())
+        self._file.write(np.array(self._results, dtype=np.int8).tobytes())
+
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, self.size_of_the_board, position_size(self.size_of_the_board), 0,
+                                     len(self._results), self._offsets[-1], index_offset))
+        self._file.close()
+        self._file = None
+
+
+class GameRecordReader:
+    """
+    Random-access reader of a binary record file, backed by `numpy.memmap`.
+
+    Only the header and the index are read when the file is opened. Games and positions are decoded when they are
+    requested, so files larger than the memory can be sliced.
+
+    Attributes:
+    __________
+    path: str
+        Path of the file.
+    size_of_the_board: int
+        Size of the board.
+    number_of_positions: int
+        Total number of positions of the file.
+    offsets: np.ndarray
+        Position of the first state of every game, followed by the total number of positions.
+    results: np.ndarray
+        The winner of every game.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            header = file.read(HEADER.size)
+        magic, version, size, bytes_per_position, _, number_of_games, number_of_positions, index_offset = \
+            HEADER.unpack(header)
+
+        if magic != MAGIC:
+            raise Exception(f'{path} is not a game record file.')
+        if version != VERSION:
+            raise Exception(f'Unsupported version {version} of the game record format.')
+        if index_offset == 0:
+            raise Exception(f'{path} was not closed properly and has no index.')
+
+        self.size_of_the_board = size
+        self.number_of_positions = number_of_positions
+        self.index_offset = index_offset
+
+        self._positions = np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER_SIZE,
+                                    shape=(number_of_positions, bytes_per_position)) \
+            if number_of_positions else np.zeros((0, bytes_per_position), dtype=np.uint8)
+        self.offsets = np.fromfile(path, dtype='<u8', count=number_of_games + 1, offset=index_offset).astype(np.int64)
+        self.results = np.fromfile(path, dtype=np.int8, count=number_of_games,
+                                   offset=index_offset + 8 * (number_of_games + 1))
+
+    def __len__(self):
+        return len(self.results)
+
+    def game(self, i: int) -> np.ndarray:
+        """Return the states of game i as an int8 array of shape (plies, n)."""
+        return unpack_positions(self._positions[self.offsets[i]: self.offsets[i + 1]], self.size_of_the_board)
+
+    def game_states(self, i: int) -> List[StateVector]:
+        """Return the history of game i as a list of StateVector, as returned by `CheckersGame.simulate_game`."""
+        states = self.game(i).view(StateVector)
+        states.size_of_the_board = self.size_of_the_board
+        return list(states)
+
+    def positions(self, start: int, stop: Optional[int] = None) -> np.ndarray:
+        """Return the positions start to stop of the file (across games) as an int8 array of shape (K, n)."""
+        return unpack_positions(self._positions[start: stop], self.size_of_the_board)
+
+    def position(self, j: int) -> StateVector:
+        """Return position j of the file (across games)."""
+        state = self.positions(j, j + 1)[0].view(StateVector)
+        state.size_of_the_board = self.size_of_the_board
+        return state
+
+    def game_of_position(self, j: Union[int, np.ndarray]) -> Union[int, np.ndarray]:
+        """Return the game to which position j belongs."""
+        return np.searchsorted(self.offsets, j, side='right') - 1
+
+    def iter_games(self) -> Iterator[Tuple[np.ndarray, int]]:
+        """Yield the states and the result of every game."""
+        for i in range(len(self)):
+            yield self.game(i), int(self.results[i])
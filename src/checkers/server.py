@@ -0,0 +1,514 @@
+"""
+Asyncio server that hosts many concurrent games for remote players over TCP or a Unix socket.
+
+Every game is a coroutine and every connection has a task that reads its lines, so a single event loop serves
+thousands of slow clients. The protocol is line-based text. Squares are numbered from 1 as in `StateVector.to_fen`.
+
+Client to server:
+
+- `PLAY [light|dark|any] [random|remote]`: join a game, as the given color, against a uniform random player run by
+  the server or against the next remote player that asks for one (the first of them plays light).
+- `MOVE <move>`: play a move, given either in notation (e.g., `9-13` or `9x18x27`, see `Move.notation`) or as the
+  FEN of the resulting state, which is checked with `StateTransitions.is_valid`.
+- `RESIGN`: resign the current game.
+- `QUIT`: close the connection.
+
+Server to client:
+
+- `QUEUED`: the server is running its maximum number of games, or no remote opponent is available yet.
+- `GAME <id> <light|dark> <size of the board> <ms per move>`: a game starts.
+- `STATE <fen> <ms left for the move>`: the position after every move. The player in turn must answer with a move
+  before the clock of the move runs out.
+- `ERROR <message>`: the last line was rejected. Illegal moves can be retried while the clock runs.
+- `END <light|dark|draw> <reason>`: the game is over. The reasons are `no_moves` (see `CheckersGame.decide_winner`),
+  `move_limit`, `time`, `resign` and `disconnect`.
+
+Backpressure: every connection forwards at most `inbox_size` unread lines to its game, after which the server stops
+reading its socket, and writes wait for the socket buffer to drain, dropping clients that do not read within
+`write_timeout_s`.
+
+Run `python -m checkers.server --port 8765` to serve, or `python -m checkers.server --load-test 1000` to serve and
+play 1000 local stand-in clients against it.
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from checkers.board import StateVector, StateTransitions
+from checkers.game import CheckersGame
+from checkers.piece import PieceHelper
+from checkers.players import CheckersPlayer, UniformPlayer
+
+
+COLORS = {PieceHelper.light: 'light', PieceHelper.dark: 'dark', PieceHelper.empty_square: 'draw'}
+
+
+class _Connection:
+    """A connected client."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.match = None
+        self.closed = False
+
+
+class _Match:
+    """A game in progress. Seats hold a `_Connection` for remote players and a `CheckersPlayer` for local ones."""
+
+    def __init__(self, identifier: int, light, dark, inbox_size: int):
+        self.identifier = identifier
+        self.seats = {PieceHelper.light: light, PieceHelper.dark: dark}
+        self.inbox = asyncio.Queue(maxsize=inbox_size)
+        # set when the game is over, so the lines that nobody will read are dropped.
+        self.finished = asyncio.Event()
+
+    def connections(self) -> List[_Connection]:
+        return [seat for seat in self.seats.values() if isinstance(seat, _Connection)]
+
+
+class MatchServer:
+    """
+    Hosts concurrent games between remote players and local players (see the module documentation for the protocol).
+
+    Attributes:
+    __________
+    move_time_ms: float
+        Time that a remote player has to answer every move.
+    number_of_moves: int
+        The maximum number of turns of every game, as in `CheckersGame.simulate_game`.
+    max_games: int
+        Maximum number of games played at once. The requests for more games wait.
+    size_of_the_board: int
+        Size of the board.
+    statistics: Dict[str, int]
+        Number of connections, games started and finished, moves, rejected lines, losses on time and dropped clients.
+    """
+
+    def __init__(
+            self,
+            move_time_ms: float = 10000,
+            number_of_moves: int = 400,
+            max_games: int = 10000,
+            size_of_the_board: int = 8,
+            local_player: type = UniformPlayer,
+            inbox_size: int = 4,
+            write_timeout_s: float = 30):
+        self.move_time_ms = move_time_ms
+        self.number_of_moves = number_of_moves
+        self.max_games = max_games
+        self.size_of_the_board = size_of_the_board
+        self.local_player = local_player
+        self.inbox_size = inbox_size
+        self.write_timeout_s = write_timeout_s
+
+        self.statistics = dict.fromkeys(
+            ('connections', 'games_started', 'games_finished', 'moves', 'errors', 'timeouts', 'dropped'), 0)
+        self.matches: Dict[int, _Match] = {}
+        self._identifiers = itertools.count()
+        self._waiting: Optional[_Connection] = None
+        self._slots = None
+        self._server = None
+        self._tasks = set()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0, path: Optional[str] = None):
+        """
+        Start listening on a TCP port, or on a Unix socket if path is given.
+
+        Returns
+        -------
+        The address of the socket: (host, port) or the path.
+        """
+        self._slots = asyncio.Semaphore(self.max_games)
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._serve_client, path=path)
+        else:
+            self._server = await asyncio.start_server(self._serve_client, host, port)
+        return self._server.sockets[0].getsockname()
+
+    async def close(self) -> None:
+        """Stop listening and cancel the games in progress."""
+        self._server.close()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    def _spawn(self, coroutine) -> asyncio.Task:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _send(self, connection: _Connection, line: str) -> None:
+        """Write a line, waiting while the buffer of the socket is full. Clients that do not read are dropped."""
+        if connection.closed:
+            return
+        try:
+            connection.writer.write(line.encode() + b'\n')
+            await asyncio.wait_for(connection.writer.drain(), self.write_timeout_s)
+        except (asyncio.TimeoutError, ConnectionError):
+            self.statistics['dropped'] += 1
+            self._drop(connection)
+
+    def _drop(self, connection: _Connection) -> None:
+        connection.closed = True
+        connection.writer.close()
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Read the lines of a client, handling the commands outside games and forwarding the rest to its game."""
+        connection = _Connection(reader, writer)
+        self.statistics['connections'] += 1
+        self._tasks.add(asyncio.current_task())
+        try:
+            while not connection.closed:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+
+                words = line.decode(errors='replace').split()
+                if not words:
+                    continue
+                command = words[0].upper()
+
+                if command == 'QUIT':
+                    # the game, if any, is lost by disconnection below.
+                    break
+                elif connection.match is not None:
+                    await self._forward(connection.match, (connection, command, words[1:]))
+                elif command == 'PLAY':
+                    await self._play(connection, words[1:])
+                else:
+                    self.statistics['errors'] += 1
+                    await self._send(connection, f'ERROR unknown command {command} outside a game')
+        except asyncio.CancelledError:
+            # the server is closing. asyncio logs the connections cancelled by an exception as errors.
+            pass
+        finally:
+            if self._waiting is connection:
+                self._waiting = None
+            if connection.match is not None:
+                try:
+                    connection.match.inbox.put_nowait((connection, 'DISCONNECT', []))
+                except asyncio.QueueFull:
+                    pass
+            connection.closed = True
+            writer.close()
+            self._tasks.discard(asyncio.current_task())
+
+    @staticmethod
+    async def _forward(match: _Match, item: tuple) -> None:
+        """Put a line in the inbox of a game, or drop it if the game finishes before there is room for it."""
+        if match.finished.is_set():
+            return
+        try:
+            match.inbox.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        # waits while the game has not read the previous lines, so the socket is not read either.
+        put = asyncio.ensure_future(match.inbox.put(item))
+        finished = asyncio.ensure_future(match.finished.wait())
+        try:
+            await asyncio.wait((put, finished), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            put.cancel()
+            finished.cancel()
+
+    async def _play(self, connection: _Connection, arguments: List[str]) -> None:
+        """Handle a PLAY command."""
+        color = arguments[0].lower() if arguments else 'any'
+        opponent = arguments[1].lower() if len(arguments) > 1 else 'random'
+        if color not in ('light', 'dark', 'any') or opponent not in ('random', 'remote'):
+            self.statistics['errors'] += 1
+            await self._send(connection, 'ERROR usage: PLAY [light|dark|any] [random|remote]')
+            return
+
+        if opponent == 'remote':
+            if self._waiting is None or self._waiting.closed:
+                self._waiting = connection
+                await self._send(connection, 'QUEUED')
+                return
+            light, dark = self._waiting, connection
+            self._waiting = None
+        else:
+            if color == 'any':
+                color = random.choice(('light', 'dark'))
+            player = self.local_player()
+            light, dark = (connection, player) if color == 'light' else (player, connection)
+
+        match = _Match(next(self._identifiers), light, dark, self.inbox_size)
+        for seat in match.connections():
+            seat.match = match
+        self._spawn(self._run_match(match))
+
+    async def _run_match(self, match: _Match) -> None:
+        """Play a game, from the wait for a free slot to its end."""
+        if self._slots.locked():
+            for connection in match.connections():
+                await self._send(connection, 'QUEUED')
+
+        async with self._slots:
+            self.matches[match.identifier] = match
+            self.statistics['games_started'] += 1
+            try:
+                winner, reason = await self._play_match(match)
+                for connection in match.connections():
+                    await self._send(connection, f'END {COLORS[winner]} {reason}')
+            finally:
+                match.finished.set()
+                del self.matches[match.identifier]
+                self.statistics['games_finished'] += 1
+                for connection in match.connections():
+                    connection.match = None
+
+    async def _play_match(self, match: _Match) -> Tuple[int, str]:
+        """Play the moves of a game and return its winner and the reason why it ended."""
+        for color, seat in match.seats.items():
+            if isinstance(seat, _Connection):
+                await self._send(seat, f'GAME {match.identifier} {COLORS[color]} {self.size_of_the_board} '
+                                       f'{self.move_time_ms:g}')
+
+        state = StateVector(self.size_of_the_board)
+        turn = 0
+        while True:
+            moves = StateTransitions.feasible_next_move_list(state)
+            if not moves:
+                return CheckersGame.decide_winner(state), 'no_moves'
+            if turn > self.number_of_moves:
+                return CheckersGame.decide_winner(state), 'move_limit'
+
+            seat = match.seats[int(state.turn)]
+            fen = state.to_fen()
+            for connection in match.connections():
+                await self._send(connection, f'STATE {fen} {self.move_time_ms:g}')
+
+            if isinstance(seat, CheckersPlayer):
+                # searching players take long, so they move in a thread while the other games go on.
+                next_state = await asyncio.get_running_loop().run_in_executor(None, seat.next_move, state)
+            else:
+                next_state = await self._remote_move(match, state, moves)
+                if isinstance(next_state, tuple):
+                    return next_state
+
+            state = next_state
+            self.statistics['moves'] += 1
+            turn += 1
+
+    async def _remote_move(self, match: _Match, state: StateVector, moves):
+        """
+        Wait for the move of the remote player in turn.
+
+        Returns the next state, or the (winner, reason) pair if the game ends while waiting.
+        """
+        turn = int(state.turn)
+        deadline = time.monotonic() + self.move_time_ms / 1000
+        while True:
+            try:
+                connection, command, arguments = await asyncio.wait_for(
+                    match.inbox.get(), max(0., deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                self.statistics['timeouts'] += 1
+                return -turn, 'time'
+
+            color = next(c for c, seat in match.seats.items() if seat is connection)
+            if command == 'DISCONNECT':
+                return -color, 'disconnect'
+            if command == 'RESIGN':
+                return -color, 'resign'
+
+            error = None
+            if command != 'MOVE' or len(arguments) != 1:
+                error = 'usage: MOVE <move>'
+            elif color != turn:
+                error = 'not your turn'
+            else:
+                next_state = self._parse_move(state, moves, arguments[0])
+                if next_state is not None:
+                    return next_state
+                error = f'illegal move {arguments[0]}'
+
+            self.statistics['errors'] += 1
+            await self._send(connection, f'ERROR {error}')
+
+    def _parse_move(self, state: StateVector, moves, text: str) -> Optional[StateVector]:
+        """Return the state after a move given in notation or as the FEN of the next state, or None if it is illegal."""
+        if ':' in text:
+            try:
+                next_state = StateVector.from_fen(text, self.size_of_the_board)
+            except Exception:
+                return None
+            return next_state if StateTransitions.is_valid(state, next_state) else None
+
+        move = next((m for m in moves if m.notation == text), None)
+        if move is None:
+            return None
+        next_state = state.copy()
+        StateTransitions.make_move(next_state, move)
+        return next_state
+
+
+class StandInClient:
+    """
+    Local client that plays uniformly random moves, to test the server under load.
+
+    Attributes:
+    __________
+    think_ms: float
+        Time that the client waits before every move, to simulate slow players.
+    results: List[Tuple[str, str]]
+        The winner and the reason of every game played.
+    latencies: List[float]
+        Seconds between every state received in turn and the move sent, plus the time to the next state.
+    """
+
+    def __init__(self, think_ms: float = 0, seed: Optional[int] = None):
+        self.think_ms = think_ms
+        self.results = []
+        self.latencies = []
+        self._random = random.Random(seed)
+
+    async def play(
+            self,
+            number_of_games: int = 1,
+            host: str = '127.0.0.1',
+            port: int = 8765,
+            path: Optional[str] = None,
+            color: str = 'any',
+            opponent: str = 'random') -> List[Tuple[str, str]]:
+        """Connect to a server and play number_of_games games, one after the other."""
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+
+        try:
+            for _ in range(number_of_games):
+                writer.write(f'PLAY {color} {opponent}\n'.encode())
+                await writer.drain()
+                if not await self._play_game(reader, writer):
+                    break
+            writer.write(b'QUIT\n')
+            await writer.drain()
+        finally:
+            writer.close()
+        return self.results
+
+    async def _play_game(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        my_color, size_of_the_board, sent = None, 8, None
+        while True:
+            line = await reader.readline()
+            if not line:
+                return False
+            words = line.decode().split()
+
+            if words[0] == 'GAME':
+                my_color = PieceHelper.light if words[2] == 'light' else PieceHelper.dark
+                size_of_the_board = int(words[3])
+            elif words[0] == 'STATE':
+                if sent is not None:
+                    self.latencies.append(time.perf_counter() - sent)
+                    sent = None
+                state = StateVector.from_fen(words[1], size_of_the_board)
+                if state.turn != my_color:
+                    continue
+                if self.think_ms:
+                    await asyncio.sleep(self.think_ms / 1000)
+                move = self._random.choice(StateTransitions.feasible_next_move_list(state))
+                sent = time.perf_counter()
+                writer.write(f'MOVE {move.notation}\n'.encode())
+                await writer.drain()
+            elif words[0] == 'END':
+                self.results.append((words[1], words[2]))
+                return True
+            elif words[0] == 'ERROR':
+                logging.warning(f'StandInClient: {line.decode().strip()}')
+
+
+async def load_test(
+        number_of_clients: int,
+        games_per_client: int = 1,
+        think_ms: float = 0,
+        server: Optional[MatchServer] = None,
+        host: str = '127.0.0.1',
+        port: Optional[int] = None,
+        path: Optional[str] = None,
+        opponent: str = 'random') -> dict:
+    """
+    Play many stand-in clients at once against a server.
+
+    If no port or path is given, a `MatchServer` (the given one or a new one) is started in the same event loop.
+
+    Returns
+    -------
+    dict:
+        The number of games and moves, the elapsed time, the games and moves per second, the mean and maximum latency
+        of the moves and the statistics of the server, if it runs in this loop.
+    """
+    own_server = port is None and path is None
+    if own_server:
+        server = server or MatchServer()
+        _, port = await server.start(host, 0)
+
+    start = time.perf_counter()
+    clients = [StandInClient(think_ms, seed=i) for i in range(number_of_clients)]
+    await asyncio.gather(*(client.play(games_per_client, host, port, path, opponent=opponent)
+                           for client in clients))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for client in clients for latency in client.latencies]
+    games = sum(len(client.results) for client in clients)
+    report = {
+        'clients': number_of_clients, 'games': games, 'moves': len(latencies), 'elapsed': elapsed,
+        'games_per_second': games / elapsed, 'moves_per_second': len(latencies) / elapsed,
+        'mean_latency_ms': 1000 * sum(latencies) / len(latencies) if latencies else 0.,
+        'max_latency_ms': 1000 * max(latencies) if latencies else 0.,
+    }
+    if own_server:
+        report['server'] = dict(server.statistics)
+        await server.close()
+    return report
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Serve checkers games over TCP or a Unix socket.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help='path of a Unix socket to listen on instead of TCP')
+    parser.add_argument('--move-time-ms', type=float, default=10000)
+    parser.add_argument('--max-games', type=int, default=10000)
+    parser.add_argument('--load-test', type=int, default=None, metavar='CLIENTS',
+                        help='play this many local stand-in clients against a server started in the same process')
+    parser.add_argument('--games', type=int, default=1, help='games per stand-in client')
+    parser.add_argument('--think-ms', type=float, default=0, help='delay of the stand-in clients before every move')
+    arguments = parser.parse_args(arguments)
+
+    server = MatchServer(move_time_ms=arguments.move_time_ms, max_games=arguments.max_games)
+    if arguments.load_test is not None:
+        report = asyncio.run(load_test(arguments.load_test, arguments.games, arguments.think_ms, server,
+                                       host=arguments.host))
+        for name, value in report.items():
+            print(f'{name}: {value:.1f}' if isinstance(value, float) else f'{name}: {value}')
+        return
+
+    async def serve():
+        address = await server.start(arguments.host, arguments.port, arguments.unix)
+        print(f'Serving on {address}')
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Color symmetry of the positions.
+
+Rotating the board 180 degrees and swapping the colors of the pieces and the turn gives an equivalent position: the
+same moves are available, mirrored, and the result of the game is the same with the colors swapped. With the index
+layout of `StateVector` the rotation maps square k to square n - 1 - k, so the transform reverses the squares and
+negates every value, including the turn.
+
+Every position has one canonical representative, the one with the light pieces to move, so tables keyed on canonical
+positions store half of the positions. The transforms are their own inverses: `transform_state`, `transform_move` and
+`transform_result` map canonical positions, moves and results back to the original ones.
+"""
+from typing import Tuple
+
+import numpy as np
+
+from checkers.board import StateVector
+from checkers.move import Move
+from checkers.piece import PieceHelper
+
+
+identity = 0
+color_swap = 1
+
+
+def transform_states(states: np.ndarray, transforms) -> np.ndarray:
+    """
+    Apply a transform to many positions.
+
+    Parameters
+    ----------
+    states: np.ndarray
+        Array of shape (K, n) with K states, including the turn in the last column.
+    transforms: Union[int, np.ndarray]
+        The transform of every state (`identity` or `color_swap`), or one for all of them.
+
+    Returns
+    -------
+    np.ndarray:
+        A new array with the transformed states.
+    """
+    states = np.asarray(states)
+    swapped = np.empty_like(states)
+    swapped[:, :-1] = -states[:, -2::-1]
+    swapped[:, -1] = -states[:, -1]
+    return np.where(np.asarray(transforms, dtype=bool).reshape(-1, 1), swapped, states)
+
+
+def transform_state(state: StateVector, transform: int) -> StateVector:
+    """Return a copy of a state with a transform (`identity` or `color_swap`) applied."""
+    if transform == identity:
+        return state.copy()
+    transformed = state.copy()
+    transformed[:-1] = -np.asarray(state)[-2::-1]
+    transformed.turn = -state.turn
+    return transformed
+
+
+def canonicalize(state: StateVector) -> Tuple[StateVector, int]:
+    """
+    Return the canonical representative of a position.
+
+    Parameters
+    ----------
+    state: StateVector
+        The position.
+
+    Returns
+    -------
+    Tuple[StateVector, int]:
+        The equivalent position with the light pieces to move and the transform that maps the position to it and
+        back.
+    """
+    transform = identity if state.turn == PieceHelper.light else color_swap
+    return transform_state(state, transform), transform
+
+
+def canonicalize_states(states: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized version of `canonicalize`.
+
+    Parameters
+    ----------
+    states: np.ndarray
+        Array of shape (K, n) with K states, including the turn in the last column.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]:
+        The canonical states and the transform of every state.
+    """
+    states = np.asarray(states)
+    transforms = (states[:, -1] == PieceHelper.dark).astype(np.int8)
+    return transform_states(states, transforms), transforms
+
+
+def transform_square(square: int, transform: int, size_of_the_board: int = 8) -> int:
+    """Return the index of a square after a transform."""
+    return size_of_the_board ** 2 // 2 - 1 - square if transform == color_swap else square
+
+
+def transform_move(move: Move, transform: int, size_of_the_board: int = 8) -> Move:
+    """
+    Map a move through a transform, e.g., a move found for the canonical position back to the original position.
+
+    Parameters
+    ----------
+    move: Move
+        A move of the position before the transform.
+    transform: int
+        The transform.
+    size_of_the_board: int
+        Size of the board.
+
+    Returns
+    -------
+    Move:
+        The same move in the transformed position.
+    """
+    if transform == identity:
+        return move
+    last = size_of_the_board ** 2 // 2 - 1
+    return Move(last - move.origin, tuple(last - k for k in move.path), tuple(last - k for k in move.captured),
+                tuple(-v for v in move.captured_pieces), move.promotion)
+
+
+def transform_result(winner: int, transform: int) -> int:
+    """Map a winning color (see `CheckersGame.decide_winner`) through a transform."""
+    return -winner if transform == color_swap else winner
@@ -0,0 +1,328 @@
+"""
+Endgame tablebases built by retrograde analysis.
+
+A tablebase stores the result under perfect play of every position with at most `max_pieces` pieces. The positions
+are numbered with a perfect index: the positions with k pieces come after the ones with fewer pieces, and inside
+every block the index combines the rank of the set of occupied squares (combinatorial number system) and the kind of
+every piece (two bits each, in the order of the squares). Only the canonical positions, with the light pieces to move,
+are stored: the others are looked up through their color-swapped equivalent (see `checkers.symmetry`).
+
+Every entry is a uint16 with the result from the point of view of the player in turn in the two highest bits
+(`EndgameTablebase.win`, `EndgameTablebase.loss` or `EndgameTablebase.draw`) and the number of plies until the end of
+the game in the others. The winner plays the quickest win and the loser the slowest loss. Games that never end are
+draws, as are the final positions that `CheckersGame.decide_winner` scores as a tie.
+
+File layout (little-endian): a header of 32 bytes with the magic `CKTB`, the format version (uint16), the size of the
+board (uint16), the maximum number of pieces (uint16) and the number of positions (uint64), followed by the entries.
+"""
+import itertools
+import logging
+import os
+import struct
+import time
+from math import comb
+from typing import Optional, Tuple
+
+import numpy as np
+
+from checkers.batched import BatchedSimulator
+from checkers.board import StateVector
+from checkers.piece import PieceHelper
+from checkers.symmetry import canonicalize_states
+
+
+MAGIC = b'CKTB'
+VERSION = 2
+HEADER = struct.Struct('<4sHHHQ')
+HEADER_SIZE = 32
+
+# piece values in the order of their codes, and code of every piece value + PieceHelper.queen.
+PIECE_VALUES = np.array([-PieceHelper.queen, -PieceHelper.piece, PieceHelper.piece, PieceHelper.queen],
+                        dtype=PieceHelper.dtype)
+PIECE_CODES = np.array([0, 1, -1, 2, 3])
+
+_distance_bits = 14
+_distance_mask = (1 << _distance_bits) - 1
+
+
+class EndgameTablebase:
+    """
+    Result under perfect play of every position with at most max_pieces pieces.
+
+    Use `EndgameTablebase.generate` to build a tablebase, `save` to write it and `EndgameTablebase.load` to map a
+    file into memory. Only the pages of the file that are probed are read.
+
+    Attributes:
+    __________
+    size_of_the_board: int
+        Size of the board.
+    max_pieces: int
+        Maximum number of pieces of the positions in the tablebase.
+    entries: np.ndarray
+        uint16 array with the entry of every position.
+    path: Optional[str]
+        File from which the tablebase was loaded.
+    """
+    win = 1
+    loss = 2
+    draw = 3
+
+    def __init__(self, entries: np.ndarray, size_of_the_board: int = 8, max_pieces: int = 3,
+                 path: Optional[str] = None):
+        self.size_of_the_board = size_of_the_board
+        self.max_pieces = max_pieces
+        self.entries = entries
+        self.path = path
+
+        n = size_of_the_board ** 2 // 2
+        self._number_of_squares = n
+        self._binomials = np.array([[comb(s, i) for i in range(max_pieces + 2)] for s in range(n + 1)],
+                                   dtype=np.int64)
+        self._binomial_list = self._binomials.tolist()
+        self._code_list = PIECE_CODES.tolist()
+
+        # first index of the positions with k pieces.
+        sizes = [comb(n, k) * 4 ** k if k else 0 for k in range(max_pieces + 1)]
+        self._offsets = np.cumsum([0] + sizes)
+        self._offset_list = self._offsets.tolist()
+
+        if len(entries) != self._offsets[-1]:
+            raise Exception(f'The tablebase has {len(entries)} entries, but {self._offsets[-1]} were expected.')
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def generate(max_pieces: int = 3, size_of_the_board: int = 8, chunk_size: int = 2 ** 16) -> 'EndgameTablebase':
+        """
+        Build the tablebase by retrograde analysis.
+
+        All the positions with up to max_pieces pieces are enumerated, their successors are generated in chunks with
+        `BatchedSimulator.successors` and the results are propagated backwards from the final positions, one ply at
+        a time. The number of canonical positions grows as C(n, k) * 4^k, so 3 pieces on the 8x8 board (325504
+        positions) take a few seconds and 4 pieces (about 10 million) need a few GB of memory.
+
+        Parameters
+        ----------
+        max_pieces: int
+            Maximum number of pieces of the positions.
+        size_of_the_board: int
+            Size of the board.
+        chunk_size: int
+            Number of positions whose successors are generated at once.
+
+        Returns
+        -------
+        EndgameTablebase:
+            The tablebase, held in memory.
+        """
+        start = time.perf_counter()
+        n = size_of_the_board ** 2 // 2
+        number_of_positions = int(sum(comb(n, k) * 4 ** k for k in range(1, max_pieces + 1)))
+        tablebase = EndgameTablebase(np.zeros(number_of_positions, dtype=np.uint16), size_of_the_board, max_pieces)
+
+        states = tablebase._enumerate_positions()
+        sources, targets = tablebase._successor_graph(states, chunk_size)
+        results, distances = tablebase._retrograde(states, sources, targets)
+
+        tablebase.entries = (results.astype(np.uint16) << _distance_bits) | np.minimum(
+            distances, _distance_mask).astype(np.uint16)
+        logging.info(f'EndgameTablebase: {number_of_positions} positions and {len(sources)} moves with up to '
+                     f'{max_pieces} pieces in {time.perf_counter() - start:.1f} s')
+        return tablebase
+
+    def _enumerate_positions(self) -> np.ndarray:
+        """Return an array of shape (number of positions, n + 1) with every canonical position in index order."""
+        n = self._number_of_squares
+        states = np.zeros((len(self), n + 1), dtype=PieceHelper.dtype)
+        for k in range(1, self.max_pieces + 1):
+            squares = np.array(list(itertools.combinations(range(n), k)))
+            kinds = PIECE_VALUES[np.array(list(itertools.product(range(len(PIECE_VALUES)), repeat=k)))]
+
+            # one row for every set of squares and kinds of the pieces, in this order.
+            rows = len(squares) * len(kinds)
+            block = np.zeros((rows, n + 1), dtype=PieceHelper.dtype)
+            block[np.arange(rows)[:, None], np.repeat(squares, len(kinds), axis=0)] = np.tile(kinds, (len(squares), 1))
+            block[:, n] = PieceHelper.light
+            states[self.indices(block)] = block
+
+        return states
+
+    def _successor_graph(self, states: np.ndarray, chunk_size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the distinct moves between the positions as two arrays with their source and target indices."""
+        simulator = BatchedSimulator(self.size_of_the_board)
+        sources, targets = [], []
+        for start in range(0, len(states), chunk_size):
+            games, successors = simulator.successors(states[start: start + chunk_size])
+            sources.append(games + start)
+            targets.append(self.indices(successors))
+
+        edges = np.unique(np.concatenate(sources) * len(states) + np.concatenate(targets))
+        return edges // len(states), edges % len(states)
+
+    def _retrograde(self, states: np.ndarray, sources: np.ndarray, targets: np.ndarray) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """Propagate the results of the final positions backwards and return the result and distance of all."""
+        number_of_positions = len(states)
+        unresolved = np.bincount(sources, minlength=number_of_positions)
+
+        # predecessors of every position, in compressed sparse row format.
+        order = np.argsort(targets, kind='stable')
+        predecessors = sources[order]
+        pointers = np.concatenate([[0], np.cumsum(np.bincount(targets, minlength=number_of_positions))])
+
+        def predecessors_of(positions):
+            lengths = pointers[positions + 1] - pointers[positions]
+            starts = np.repeat(pointers[positions] - np.cumsum(lengths) + lengths, lengths)
+            return predecessors[starts + np.arange(lengths.sum())]
+
+        results = np.zeros(number_of_positions, dtype=np.int8)
+        distances = np.zeros(number_of_positions, dtype=np.int64)
+
+        final = np.flatnonzero(unresolved == 0)
+        winners = BatchedSimulator.decide_winners(states[final, :-1])
+        turns = states[final, -1]
+        results[final] = np.where(winners == turns, self.win, np.where(winners == -turns, self.loss, self.draw))
+
+        frontier = final[results[final] != self.draw]
+        distance = 0
+        while len(frontier):
+            distance += 1
+
+            # a position wins if one of its moves reaches a lost position.
+            won = np.unique(predecessors_of(frontier[results[frontier] == self.loss]))
+            won = won[results[won] == 0]
+            results[won] = self.win
+            distances[won] = distance
+
+            # and it loses once all of its moves reach won positions.
+            parents = predecessors_of(frontier[results[frontier] == self.win])
+            unresolved -= np.bincount(parents, minlength=number_of_positions)
+            lost = np.unique(parents)
+            lost = lost[(unresolved[lost] == 0) & (results[lost] == 0)]
+            results[lost] = self.loss
+            distances[lost] = distance
+
+            frontier = np.concatenate([won, lost])
+
+        results[results == 0] = self.draw
+        return results, distances
+
+    def indices(self, states: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of `EndgameTablebase.index`.
+
+        Parameters
+        ----------
+        states: np.ndarray
+            Array of shape (K, n) with K states, including the turn in the last column.
+
+        Returns
+        -------
+        np.ndarray:
+            The index of every state, or -1 for the states with too many pieces.
+        """
+        states = canonicalize_states(states)[0]
+        n = self._number_of_squares
+        values = states[:, :n]
+        occupied = values != PieceHelper.empty_square
+        pieces = occupied.sum(axis=1)
+        covered = (pieces > 0) & (pieces <= self.max_pieces)
+
+        # position of every piece among the occupied squares.
+        ordinal = np.clip(np.cumsum(occupied, axis=1) - 1, 0, self.max_pieces)
+        squares = np.arange(n)
+        rank = np.where(occupied, self._binomials[squares, ordinal + 1], 0).sum(axis=1)
+        kinds = np.where(occupied, PIECE_CODES[values + PieceHelper.queen] << (2 * ordinal), 0).sum(axis=1)
+
+        index = self._offsets[np.minimum(pieces, self.max_pieces)] + rank * 4 ** pieces + kinds
+        return np.where(covered, index, -1)
+
+    def index(self, state: StateVector) -> Optional[int]:
+        """
+        Index of a position in the tablebase, which is the one of its canonical representative.
+
+        Parameters
+        ----------
+        state: StateVector
+            The position.
+
+        Returns
+        -------
+        Optional[int]:
+            The index of the position, or None if it has more than max_pieces pieces.
+        """
+        values = np.asarray(state[:-1]) if state[-1] == PieceHelper.light else -np.asarray(state)[-2::-1]
+        squares = np.flatnonzero(values).tolist()
+        pieces = len(squares)
+        if pieces == 0 or pieces > self.max_pieces:
+            return None
+
+        rank = kinds = 0
+        for i, square in enumerate(squares):
+            rank += self._binomial_list[square][i + 1]
+            kinds |= self._code_list[values[square] + PieceHelper.queen] << (2 * i)
+
+        return self._offset_list[pieces] + (rank << (2 * pieces)) + kinds
+
+    def probe(self, state: StateVector) -> Optional[Tuple[int, int]]:
+        """
+        Look up the result of a position under perfect play.
+
+        Parameters
+        ----------
+        state: StateVector
+            The position.
+
+        Returns
+        -------
+        Optional[Tuple[int, int]]:
+            The winning color (`PieceHelper.empty_square` for a draw) and the number of plies until the end of the
+            game, or None if the position has more than max_pieces pieces.
+        """
+        index = self.index(state)
+        if index is None:
+            return None
+
+        entry = int(self.entries[index])
+        result = entry >> _distance_bits
+        if result == self.draw:
+            return PieceHelper.empty_square, 0
+        turn = int(state[-1])
+        return (turn if result == self.win else -turn), entry & _distance_mask
+
+    def save(self, path: str) -> None:
+        """Write the tablebase to a file."""
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, self.size_of_the_board, self.max_pieces, len(self)))
+            file.write(bytes(HEADER_SIZE - HEADER.size))
+            file.write(np.asarray(self.entries, dtype='<u2').tobytes())
+
+    @staticmethod
+    def load(path: str) -> 'EndgameTablebase':
+        """Map a tablebase file into memory."""
+        with open(path, 'rb') as file:
+            magic, version, size_of_the_board, max_pieces, number_of_positions = HEADER.unpack(file.read(HEADER.size))
+
+        if magic != MAGIC:
+            raise Exception(f'{path} is not a tablebase file.')
+        if version != VERSION:
+            raise Exception(f'Unsupported version {version} of the tablebase format.')
+        if os.path.getsize(path) != HEADER_SIZE + 2 * number_of_positions:
+            raise Exception(f'{path} is truncated.')
+
+        entries = np.memmap(path, dtype='<u2', mode='r', offset=HEADER_SIZE, shape=(number_of_positions,))
+        return EndgameTablebase(entries, size_of_the_board, max_pieces, path)
+
+    def __getstate__(self):
+        # a tablebase loaded from a file is mapped again by the process that unpickles it.
+        if self.path is not None:
+            return {'path': self.path}
+        return {'entries': np.asarray(self.entries), 'size_of_the_board': self.size_of_the_board,
+                'max_pieces': self.max_pieces}
+
+    def __setstate__(self, state):
+        if 'path' in state:
+            self.__dict__.update(EndgameTablebase.load(state['path']).__dict__)
+        else:
+            EndgameTablebase.__init__(self, **state)
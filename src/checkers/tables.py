@@ -0,0 +1,94 @@
+import numpy as np
+from functools import lru_cache
+from typing import Tuple
+
+from checkers.piece import PieceHelper
+
+
+class BoardTables:
+    """
+    Precomputed geometry of a board of a given size.
+
+    The squares follow the index convention of `StateVector` and the directions the order of `BoardTables.diagonals`.
+    Squares that would fall outside the board are represented by -1.
+
+    Attributes:
+    __________
+    size_of_the_board: int
+        Size of the board.
+    number_of_squares: int
+        Number of playable squares, i.e., `len(StateVector) - 1`.
+    coordinates: np.ndarray
+        Array of shape (number_of_squares, 2) with the coordinate (row, column) of every square.
+    rows: Tuple[int, ...]
+        Row of every square.
+    neighbours: np.ndarray
+        Array of shape (number_of_squares, 4) with the index of the adjacent square in every direction.
+    jumps: np.ndarray
+        Array of shape (number_of_squares, 4) with the index of the square two steps away in every direction, i.e.,
+        the square in which a piece lands after a jump.
+    neighbour_list: Tuple[Tuple[int, ...], ...]
+        Same as neighbours but stored as tuples, which are faster to index one element at a time.
+    jump_list: Tuple[Tuple[int, ...], ...]
+        Same as jumps but stored as tuples.
+    piece_directions: dict
+        Directions (positions in `BoardTables.diagonals`) in which every piece value moves, in the order of
+        `PieceHelper.get_diagonals`.
+    promotion_rows: dict
+        Row in which the men of every color are promoted.
+    """
+    diagonals = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+    def __init__(self, size_of_the_board: int = 8):
+        n = size_of_the_board
+        self.size_of_the_board = n
+        self.number_of_squares = n * n // 2
+
+        coordinates = []
+        for k in range(self.number_of_squares):
+            i = 2 * k // n
+            coordinates.append((i, 2 * k % n + 1 - i % 2))
+
+        def index_at(i: int, j: int) -> int:
+            return (i * n + j) // 2 if 0 <= i < n and 0 <= j < n else -1
+
+        self.coordinates = np.array(coordinates, dtype=int)
+        self.rows = tuple(i for i, _ in coordinates)
+        self.neighbours = np.array([[index_at(i + d_i, j + d_j) for d_i, d_j in self.diagonals]
+                                    for i, j in coordinates], dtype=int)
+        self.jumps = np.array([[index_at(i + 2 * d_i, j + 2 * d_j) for d_i, d_j in self.diagonals]
+                               for i, j in coordinates], dtype=int)
+
+        self.neighbour_list = tuple(map(tuple, self.neighbours.tolist()))
+        self.jump_list = tuple(map(tuple, self.jumps.tolist()))
+
+        self.piece_directions = {
+            color * kind: tuple(self.direction_index(d) for d in PieceHelper.get_diagonals(piece_value=color * kind))
+            for color in (PieceHelper.light, PieceHelper.dark)
+            for kind in (PieceHelper.piece, PieceHelper.queen)
+        }
+        self.promotion_rows = {PieceHelper.light: n - 1, PieceHelper.dark: 0}
+
+    @staticmethod
+    def direction_index(diagonal: Tuple[int, int]) -> int:
+        """
+        Return the position of a diagonal in `BoardTables.diagonals`.
+
+        Parameters
+        ----------
+        diagonal: Tuple[int, int]
+            One of the diagonals returned by `PieceHelper.get_diagonals`.
+
+        Returns
+        -------
+        int:
+            The column of the diagonal in `BoardTables.neighbours` and `BoardTables.jumps`.
+        """
+        d_i, d_j = diagonal
+        return 2 * int(d_i < 0) + int(d_j < 0)
+
+
+@lru_cache(maxsize=None)
+def get_tables(size_of_the_board: int = 8) -> BoardTables:
+    """Return the (cached) tables for the given board size."""
+    return BoardTables(size_of_the_board)
@@ -0,0 +1,401 @@
+"""
+Tournaments between players, played in parallel and resumable from a checkpoint.
+
+Every pairing plays games in pairs with the colors swapped and the same seeds, so both players get the same openings.
+The results are rated with a Bradley-Terry (Elo) model, and a match between two players can stop as soon as a
+sequential probability ratio test (SPRT) accepts one of its hypotheses.
+
+The checkpoint is a JSON lines file: a header with the settings of the tournament followed by one line per game, which
+is appended and flushed as soon as the game finishes.
+"""
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from checkers.board import StateTransitions
+from checkers.game import CheckersGame
+from checkers.piece import PieceHelper
+from checkers.players import CheckersPlayer
+
+
+def expected_score(elo: float) -> float:
+    """Expected score of a player rated elo points above its opponent."""
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def sprt(
+        wins: int,
+        draws: int,
+        losses: int,
+        elo0: float = 0,
+        elo1: float = 5,
+        alpha: float = 0.05,
+        beta: float = 0.05
+) -> Tuple[float, Optional[str]]:
+    """
+    Sequential probability ratio test of H0: the difference of Elo is elo0, against H1: it is elo1.
+
+    The log-likelihood ratio uses the usual normal approximation of the trinomial distribution of the results.
+
+    Parameters
+    ----------
+    wins, draws, losses: int
+        Results of the first player.
+    elo0, elo1: float
+        Difference of Elo under each hypothesis.
+    alpha, beta: float
+        Probabilities of accepting H1 when H0 holds and H0 when H1 holds.
+
+    Returns
+    -------
+    Tuple[float, Optional[str]]:
+        The log-likelihood ratio and 'H0' or 'H1' if it crossed one of the bounds, or None if more games are needed.
+        The ratio is 0 until there is at least a win, a draw and a loss.
+    """
+    if not (wins and draws and losses):
+        # as in cutechess, the test waits for every result to appear at least once: until then the variance is
+        # underestimated and a few lucky games would cross the bounds.
+        return 0., None
+    n = wins + draws + losses
+    score = (wins + draws / 2) / n
+    variance = (wins + draws / 4) / n - score ** 2
+
+    s0, s1 = expected_score(elo0), expected_score(elo1)
+    llr = (s1 - s0) * (2 * score - s0 - s1) / (2 * variance / n)
+
+    if llr >= math.log((1 - beta) / alpha):
+        return llr, 'H1'
+    if llr <= math.log(beta / (1 - alpha)):
+        return llr, 'H0'
+    return llr, None
+
+
+def elo_ratings(
+        scores: np.ndarray,
+        games: np.ndarray,
+        confidence: float = 0.95,
+        iterations: int = 1000
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fit the Elo ratings of a Bradley-Terry model to the results of a tournament.
+
+    Every draw counts as half a win, and every pairing that played gets one more virtual draw, so that the ratings of
+    players that won or lost all their games stay finite. The ratings have mean zero.
+
+    Parameters
+    ----------
+    scores: np.ndarray
+        Matrix with the points scored by every player against every other one.
+    games: np.ndarray
+        Symmetric matrix with the number of games between every pair of players.
+    confidence: float
+        Confidence level of the intervals.
+    iterations: int
+        Maximum number of iterations of the minorization-maximization algorithm.
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]:
+        The ratings and the half-widths of their confidence intervals (inf for players without games).
+    """
+    played = games > 0
+    scores = scores + 0.5 * played
+    games = games + played
+    won = scores.sum(axis=1)
+
+    gamma = np.ones(len(scores))
+    active = won > 0
+    for _ in range(iterations):
+        denominator = (games / (gamma[:, None] + gamma[None, :])).sum(axis=1)
+        new_gamma = np.where(active, won / np.where(active, denominator, 1), 1.)
+        new_gamma /= np.exp(np.log(new_gamma[active]).mean()) if active.any() else 1.
+        converged = np.allclose(new_gamma, gamma, rtol=1e-10)
+        gamma = new_gamma
+        if converged:
+            break
+
+    p = gamma[:, None] / (gamma[:, None] + gamma[None, :])
+    information = (games * p * (1 - p)).sum(axis=1)
+    z = math.sqrt(2) * _inverse_erf(confidence)
+    with np.errstate(divide='ignore'):
+        width = z * 400 / math.log(10) / np.sqrt(information)
+    return 400 * np.log10(gamma), width
+
+
+def _inverse_erf(y: float) -> float:
+    """Inverse of math.erf, by bisection."""
+    low, high = 0., 10.
+    for _ in range(100):
+        middle = (low + high) / 2
+        low, high = (middle, high) if math.erf(middle) < y else (low, middle)
+    return (low + high) / 2
+
+
+def _play_game(
+        light_factory: Callable[[], CheckersPlayer],
+        dark_factory: Callable[[], CheckersPlayer],
+        seeds: Tuple[int, int],
+        number_of_moves: Optional[int],
+        backend: str
+) -> Tuple[int, int]:
+    """Play a game between new players. Defined at module level so it can be sent to worker processes."""
+    StateTransitions.set_backend(backend)
+    light_player, dark_player = light_factory(), dark_factory()
+    light_player.seed(seeds[0])
+    dark_player.seed(seeds[1])
+
+    generator = CheckersGame(light_player, dark_player).iter_game(number_of_moves)
+    plies = 0
+    while True:
+        try:
+            plies, _ = next(generator)
+        except StopIteration as stop:
+            return int(stop.value), plies
+
+
+class Tournament:
+    """
+    Round-robin or gauntlet tournament between players.
+
+    Players are given as factories, e.g., classes or `functools.partial` objects, that build a new player for every
+    game. They must be picklable to play in worker processes.
+
+    Attributes:
+    __________
+    names: List[str]
+        Names of the players.
+    mode: str
+        'round_robin': every player plays every other one. 'gauntlet': the first player plays every other one.
+    rounds: int
+        Number of pairs of games, with swapped colors, of every pairing.
+    number_of_moves: int
+        The maximum number of turns of every game, as in `CheckersGame.simulate_game`.
+    results: List[dict]
+        The games played: their index, light and dark players, winner (see `CheckersGame.decide_winner`) and plies.
+    checkpoint: Optional[str]
+        Path of the checkpoint file.
+    """
+
+    def __init__(
+            self,
+            players: Sequence[Callable[[], CheckersPlayer]],
+            names: Optional[Sequence[str]] = None,
+            mode: str = 'round_robin',
+            rounds: int = 10,
+            number_of_moves: int = 200,
+            seed: int = 0,
+            checkpoint: Optional[str] = None):
+        if mode not in ('round_robin', 'gauntlet'):
+            raise Exception(f'Unknown mode {mode}. It must be "round_robin" or "gauntlet".')
+        if len(players) < 2:
+            raise Exception('A tournament needs at least two players.')
+
+        self.players = list(players)
+        self.names = list(names) if names is not None else self._default_names(self.players)
+        if len(set(self.names)) != len(self.names):
+            raise Exception(f'The names of the players must be unique: {self.names}.')
+        self.mode = mode
+        self.rounds = rounds
+        self.number_of_moves = number_of_moves
+        self.seed = seed
+        self.checkpoint = checkpoint
+        self.results = []
+
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self._load_checkpoint()
+
+    @staticmethod
+    def _default_names(players: Sequence[Callable[[], CheckersPlayer]]) -> List[str]:
+        names = []
+        for i, factory in enumerate(players):
+            name = getattr(factory, '__name__', None) or getattr(getattr(factory, 'func', None), '__name__', 'player')
+            names.append(name if name not in names else f'{name}_{i}')
+        return names
+
+    @property
+    def settings(self) -> dict:
+        return {'names': self.names, 'mode': self.mode, 'rounds': self.rounds, 'number_of_moves': self.number_of_moves,
+                'seed': self.seed}
+
+    def schedule(self) -> List[Tuple[int, int, int, Tuple[int, int]]]:
+        """
+        Return every game of the tournament: its index, light and dark players and the seeds of the players.
+
+        The games are ordered by round, so stopping early leaves every pairing with about the same number of games.
+        """
+        if self.mode == 'round_robin':
+            pairings = [(i, j) for i in range(len(self.names)) for j in range(i + 1, len(self.names))]
+        else:
+            pairings = [(0, j) for j in range(1, len(self.names))]
+
+        seeds = CheckersGame.game_seeds(self.seed, self.rounds * len(pairings))
+        games = []
+        for r in range(self.rounds):
+            for p, (i, j) in enumerate(pairings):
+                pair_seeds = seeds[r * len(pairings) + p]
+                games.append((len(games), i, j, pair_seeds))
+                games.append((len(games), j, i, pair_seeds[::-1]))
+        return games
+
+    def run(
+            self,
+            n_workers: Optional[int] = None,
+            sprt_elo: Optional[Tuple[float, float]] = None,
+            alpha: float = 0.05,
+            beta: float = 0.05
+    ) -> List[dict]:
+        """
+        Play the games of the schedule that are not in the results yet.
+
+        Parameters
+        ----------
+        n_workers: Optional[int]
+            Number of worker processes. The games are played in the current process if it is None.
+        sprt_elo: Optional[Tuple[float, float]]
+            If given, (elo0, elo1) of a `sprt` on the results of the first player, and the tournament stops when it
+            accepts one of the hypotheses. Only for tournaments between two players.
+        alpha, beta: float
+            Error probabilities of the SPRT.
+
+        Returns
+        -------
+        List[dict]:
+            The standings (see `Tournament.standings`).
+        """
+        if sprt_elo is not None and len(self.names) != 2:
+            raise Exception('The SPRT compares two players, but the tournament has more.')
+
+        done = {result['game'] for result in self.results}
+        pending = [game for game in self.schedule() if game[0] not in done]
+        start, played = time.perf_counter(), 0
+
+        def stop() -> bool:
+            return sprt_elo is not None and self.sprt(*sprt_elo, alpha, beta)[1] is not None
+
+        def record(game, outcome) -> None:
+            nonlocal played
+            index, light, dark, _ = game
+            winner, plies = outcome
+            self._record({'game': index, 'light': self.names[light], 'dark': self.names[dark], 'winner': winner,
+                          'plies': plies})
+            played += 1
+            if played % 100 == 0:
+                logging.info(f'Tournament: {len(self.results)} games, {played / (time.perf_counter() - start):.1f} '
+                             f'games per second')
+
+        def play(game):
+            index, light, dark, seeds = game
+            return partial(_play_game, self.players[light], self.players[dark], seeds, self.number_of_moves,
+                           StateTransitions.backend)
+
+        if n_workers is None:
+            for game in pending:
+                if stop():
+                    break
+                record(game, play(game)())
+            return self.standings()
+
+        # games are submitted a few at a time, so that an early stop does not wait for the whole schedule.
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            queue, running = iter(pending), {}
+            while True:
+                while len(running) < 2 * n_workers and not stop():
+                    game = next(queue, None)
+                    if game is None:
+                        break
+                    running[executor.submit(play(game))] = game
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record(running.pop(future), future.result())
+
+        return self.standings()
+
+    def _record(self, result: dict) -> None:
+        self.results.append(result)
+        if self.checkpoint is None:
+            return
+        new_file = not os.path.exists(self.checkpoint)
+        with open(self.checkpoint, 'a') as file:
+            if new_file:
+                file.write(json.dumps(self.settings) + '\n')
+            file.write(json.dumps(result) + '\n')
+
+    def _load_checkpoint(self) -> None:
+        with open(self.checkpoint) as file:
+            text = file.read()
+        # only the lines ended by a newline are complete: the last one may be cut if the previous run was killed
+        # while writing it.
+        lines = text.split('\n')[:-1]
+
+        if lines:
+            settings = json.loads(lines[0])
+            if settings != self.settings:
+                raise Exception(f'The checkpoint {self.checkpoint} belongs to another tournament: {settings}.')
+        for line in lines[1:]:
+            try:
+                self.results.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+
+        if not lines or len(self.results) < len(lines) - 1 or not text.endswith('\n'):
+            # rewrite the file with the complete records only, so the next ones are not appended to a cut line.
+            temporary = self.checkpoint + '.tmp'
+            with open(temporary, 'w') as file:
+                file.write(json.dumps(self.settings) + '\n')
+                file.writelines(json.dumps(result) + '\n' for result in self.results)
+            os.replace(temporary, self.checkpoint)
+        logging.info(f'Tournament: resumed {len(self.results)} games from {self.checkpoint}')
+
+    def score_matrices(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the points scored by every player against every other one and the number of games between them."""
+        index = {name: i for i, name in enumerate(self.names)}
+        scores = np.zeros((len(self.names), len(self.names)))
+        games = np.zeros_like(scores)
+        for result in self.results:
+            light, dark = index[result['light']], index[result['dark']]
+            light_score = {PieceHelper.light: 1., PieceHelper.dark: 0.}.get(result['winner'], 0.5)
+            scores[light, dark] += light_score
+            scores[dark, light] += 1 - light_score
+            games[light, dark] += 1
+            games[dark, light] += 1
+        return scores, games
+
+    def standings(self, confidence: float = 0.95) -> List[dict]:
+        """
+        Rate the players with `elo_ratings`.
+
+        Returns
+        -------
+        List[dict]:
+            The name, games, points, Elo and confidence interval of the Elo of every player, from best to worst.
+        """
+        scores, games = self.score_matrices()
+        ratings, widths = elo_ratings(scores, games, confidence)
+        table = [{'name': name, 'games': int(games[i].sum()), 'points': float(scores[i].sum()),
+                  'elo': float(ratings[i]), 'elo_interval': (float(ratings[i] - widths[i]),
+                                                             float(ratings[i] + widths[i]))}
+                 for i, name in enumerate(self.names)]
+        return sorted(table, key=lambda row: -row['elo'])
+
+    def sprt(self, elo0: float = 0, elo1: float = 5, alpha: float = 0.05, beta: float = 0.05
+             ) -> Tuple[float, Optional[str]]:
+        """Run `sprt` on the results of the first player against the second one."""
+        first = self.names[0]
+        wins = draws = losses = 0
+        for result in self.results:
+            if result['winner'] == PieceHelper.empty_square:
+                draws += 1
+            elif (result['winner'] == PieceHelper.light) == (result['light'] == first):
+                wins += 1
+            else:
+                losses += 1
+        return sprt(wins, draws, losses, elo0, elo1, alpha, beta)
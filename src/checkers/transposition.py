@@ -0,0 +1,157 @@
+import numpy as np
+from typing import Optional, Tuple
+
+
+class TranspositionTable:
+    """
+    Fixed-size table of search results keyed by the 64-bit hash of the positions (see `StateVector.zobrist_hash`).
+
+    Every entry stores the full key, the depth of the search, the type of bound of the score, the score and the
+    encoded best move (see `Move.encode`). The table is allocated once, with as many entries as fit in the memory cap,
+    and never grows. The replacement policy decides what happens when a new result falls in an occupied slot:
+
+    - 'depth': the entry is replaced only by results of the same position or of a search at least as deep.
+    - 'always': the entry is always replaced.
+    - 'two_tier': every slot has two entries, the first one is depth-preferred and the second one always-replace. The
+      entry replaced in the first tier moves to the second one, and a position is never stored in both.
+
+    The same table can be shared by several players and kept across moves and games.
+
+    Attributes:
+    __________
+    policy: str
+        Replacement policy.
+    number_of_entries: int
+        Number of entries of the table.
+    hits: int
+        Probes that found their position.
+    misses: int
+        Probes that did not find their position.
+    collisions: int
+        Probes whose slot was occupied by another position.
+    stores: int
+        Results stored.
+    rejections: int
+        Results dropped by the replacement policy.
+    """
+    exact = 0
+    lower_bound = 1
+    upper_bound = 2
+    policies = ('depth', 'always', 'two_tier')
+
+    # bytes of every entry: key, depth, bound, score and best move.
+    entry_size = 8 + 2 + 1 + 4 + 8
+
+    def __init__(self, memory_mb: float = 16, policy: str = 'depth'):
+        if policy not in self.policies:
+            raise Exception(f'Unknown replacement policy {policy}. The available ones are {self.policies}')
+
+        self.policy = policy
+        self.ways = 2 if policy == 'two_tier' else 1
+
+        # number of slots, rounded down to a power of two so that a slot is found with a mask.
+        slots = max(1, int(memory_mb * 2 ** 20) // (self.entry_size * self.ways))
+        slots = 1 << (slots.bit_length() - 1)
+        self._mask = slots - 1
+        self.number_of_entries = slots * self.ways
+
+        self._keys = np.zeros(self.number_of_entries, dtype=np.uint64)
+        self._depths = np.full(self.number_of_entries, -1, dtype=np.int16)
+        self._bounds = np.zeros(self.number_of_entries, dtype=np.int8)
+        self._scores = np.zeros(self.number_of_entries, dtype=np.float32)
+        self._moves = np.zeros(self.number_of_entries, dtype=np.int64)
+
+        self.hits = self.misses = self.collisions = self.stores = self.rejections = 0
+
+    @property
+    def memory_mb(self) -> float:
+        return self.number_of_entries * self.entry_size / 2 ** 20
+
+    @property
+    def occupancy(self) -> float:
+        """Fraction of the entries in use."""
+        return float((self._depths >= 0).mean())
+
+    def statistics(self) -> dict:
+        """Return the usage statistics of the table."""
+        probes = self.hits + self.misses
+        return {'entries': self.number_of_entries, 'memory_mb': self.memory_mb, 'policy': self.policy,
+                'hits': self.hits, 'misses': self.misses, 'collisions': self.collisions, 'stores': self.stores,
+                'rejections': self.rejections, 'hit_rate': self.hits / probes if probes else 0.,
+                'occupancy': self.occupancy}
+
+    def clear(self) -> None:
+        """Remove all the entries and reset the statistics."""
+        self._depths[:] = -1
+        self.hits = self.misses = self.collisions = self.stores = self.rejections = 0
+
+    def probe(self, key: int) -> Optional[Tuple[int, int, float, int]]:
+        """
+        Look a position up.
+
+        Parameters
+        ----------
+        key: int
+            64-bit hash of the position.
+
+        Returns
+        -------
+        Optional[Tuple[int, int, float, int]]:
+            The depth, bound, score and encoded best move stored for the position, or None if it is not in the table.
+        """
+        first = (key & self._mask) * self.ways
+        occupied = False
+        for i in range(first, first + self.ways):
+            if self._depths[i] < 0:
+                continue
+            if self._keys[i] == key:
+                self.hits += 1
+                return int(self._depths[i]), int(self._bounds[i]), float(self._scores[i]), int(self._moves[i])
+            occupied = True
+
+        self.misses += 1
+        self.collisions += occupied
+        return None
+
+    def store(self, key: int, depth: int, bound: int, score: float, move: int = 0) -> None:
+        """
+        Store the result of a search, if the replacement policy allows it.
+
+        Parameters
+        ----------
+        key: int
+            64-bit hash of the position.
+        depth: int
+            Remaining depth of the search.
+        bound: int
+            `TranspositionTable.exact`, `TranspositionTable.lower_bound` or `TranspositionTable.upper_bound`.
+        score: float
+            Score of the position.
+        move: int
+            Encoded best move, or 0 if there is none.
+        """
+        first = (key & self._mask) * self.ways
+        i = first
+        same = self._depths[first] < 0 or self._keys[first] == key
+        if self.policy == 'depth' and not same and depth < self._depths[first]:
+            self.rejections += 1
+            return
+        if self.policy == 'two_tier' and not same:
+            if depth < self._depths[first]:
+                # the second entry is always replaced.
+                i = first + 1
+            else:
+                # the entry pushed out of the first tier moves to the second one, where it replaces any older result
+                # of the position being stored.
+                self._copy_entry(first, first + 1)
+
+        self._keys[i] = key
+        self._depths[i] = depth
+        self._bounds[i] = bound
+        self._scores[i] = score
+        self._moves[i] = move
+        self.stores += 1
+
+    def _copy_entry(self, source: int, target: int) -> None:
+        for array in (self._keys, self._depths, self._bounds, self._scores, self._moves):
+            array[target] = array[source]
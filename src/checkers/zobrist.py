@@ -0,0 +1,104 @@
+import numpy as np
+from functools import lru_cache
+
+from checkers.piece import PieceHelper
+
+
+class ZobristKeys:
+    """
+    Random keys of the Zobrist hash of the positions of a board of a given size.
+
+    The hash of a position is the XOR of the key of every (square, piece value) pair on the board, plus the turn key
+    when the dark pieces are to move. The keys are drawn from a fixed seed, so the hash of a position is the same in
+    every process.
+
+    Attributes:
+    __________
+    pieces: np.ndarray
+        Array of shape (number_of_squares, 5) with the key of every square and piece value, indexed by
+        `piece value + PieceHelper.queen`. The keys of the empty squares are zero.
+    piece_list: Tuple[Tuple[int, ...], ...]
+        Same as pieces but with Python integers, which are faster to update one square at a time.
+    turn: int
+        Key XORed when the dark pieces are to move.
+    """
+    seed = 0x5EED
+
+    def __init__(self, size_of_the_board: int = 8):
+        number_of_squares = size_of_the_board ** 2 // 2
+        rng = np.random.default_rng([self.seed, size_of_the_board])
+
+        self.pieces = rng.integers(1, 2 ** 64, size=(number_of_squares, 2 * PieceHelper.queen + 1),
+                                   dtype=np.uint64, endpoint=False)
+        self.pieces[:, PieceHelper.queen + PieceHelper.empty_square] = 0
+        self.piece_list = tuple(map(tuple, self.pieces.tolist()))
+        self.turn = int(rng.integers(1, 2 ** 64, dtype=np.uint64, endpoint=False))
+        self._squares = np.arange(number_of_squares)
+
+    def hash(self, state: np.ndarray) -> int:
+        """
+        Compute from scratch the hash of a position.
+
+        Parameters
+        ----------
+        state: np.ndarray
+            The squares of the position followed by the turn, as in `StateVector`.
+
+        Returns
+        -------
+        int:
+            64-bit hash of the position.
+        """
+        h = int(np.bitwise_xor.reduce(self.pieces[self._squares, np.asarray(state[:-1]) + PieceHelper.queen]))
+        return h ^ self.turn if state[-1] == PieceHelper.dark else h
+
+    def hashes(self, states: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of `ZobristKeys.hash`.
+
+        Parameters
+        ----------
+        states: np.ndarray
+            Array of shape (K, n) with K states, including the turn in the last column.
+
+        Returns
+        -------
+        np.ndarray:
+            uint64 array with the hash of every state.
+        """
+        states = np.asarray(states)
+        h = np.bitwise_xor.reduce(self.pieces[self._squares, states[:, :-1] + PieceHelper.queen], axis=1)
+        return h ^ np.where(states[:, -1] == PieceHelper.dark, np.uint64(self.turn), np.uint64(0))
+
+    def square(self, index: int, value: int) -> int:
+        """Key of a piece value in a square."""
+        return self.piece_list[index][value + PieceHelper.queen]
+
+
+@lru_cache(maxsize=None)
+def get_zobrist_keys(size_of_the_board: int = 8) -> ZobristKeys:
+    """Return the (cached) Zobrist keys for the given board size."""
+    return ZobristKeys(size_of_the_board)
+
+
+class PositionKey:
+    """
+    Hashable snapshot of a position, suited to be the key of a dictionary.
+
+    The hash is the Zobrist hash of the position and the equality compares the raw bytes of the positions, so two
+    keys are equal exactly when their positions are.
+    """
+    __slots__ = ('hash', 'data')
+
+    def __init__(self, hash_: int, data: bytes):
+        self.hash = hash_
+        self.data = data
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        return isinstance(other, PositionKey) and self.hash == other.hash and self.data == other.data
+
+    def __repr__(self):
+        return f'PositionKey({self.hash:#018x})'
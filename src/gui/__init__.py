@@ -1 +1,2 @@
-from .mpl_visualizer import Visualizer
\ No newline at end of file
+from .mpl_visualizer import Visualizer
+from .renderer import BoardRenderer, export_game
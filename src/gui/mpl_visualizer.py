@@ -5,16 +5,21 @@ from matplotlib.animation import FuncAnimation
 
 import numpy as np
 import os
+from functools import lru_cache
 from typing import List
 
 from checkers.piece import PieceHelper
 
 
+# images of the pieces, installed with the package.
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'gui_data')
+
+
 class Visualizer:
-	piece_images = {PieceHelper.dark * PieceHelper.queen: os.path.realpath('data/gui_data/black_queen.png'),
-	                PieceHelper.dark * PieceHelper.piece: os.path.realpath('data/gui_data/black_piece.png'),
-	                PieceHelper.light * PieceHelper.queen: os.path.realpath('data/gui_data/white_queen.png'),
-	                PieceHelper.light * PieceHelper.piece: os.path.realpath('data/gui_data/white_piece.png')}
+	piece_images = {PieceHelper.dark * PieceHelper.queen: os.path.join(DATA_DIRECTORY, 'black_queen.png'),
+	                PieceHelper.dark * PieceHelper.piece: os.path.join(DATA_DIRECTORY, 'black_piece.png'),
+	                PieceHelper.light * PieceHelper.queen: os.path.join(DATA_DIRECTORY, 'white_queen.png'),
+	                PieceHelper.light * PieceHelper.piece: os.path.join(DATA_DIRECTORY, 'white_piece.png')}
 
 	@staticmethod
 	def show():
@@ -40,13 +45,16 @@ class Visualizer:
 		return fig, ax
 
 	@staticmethod
-	def plot_piece(ax, i, j, piece: int):
-		arr_lena = mpimg.imread(Visualizer.piece_images[piece])
+	@lru_cache(maxsize=None)
+	def piece_image(piece: int) -> np.ndarray:
+		"""Return the image of a piece, read from its file only the first time."""
+		return mpimg.imread(Visualizer.piece_images[piece])
 
-		imagebox = OffsetImage(arr_lena, zoom=0.3)
+	@staticmethod
+	def plot_piece(ax, i, j, piece: int):
+		imagebox = OffsetImage(Visualizer.piece_image(int(piece)), zoom=0.3)
 		ab = AnnotationBbox(imagebox, (j, i), frameon=False)
 		ax.add_artist(ab)
-		plt.draw()
 
 	@staticmethod
 	def visualize_state(board: 'StateVector'):
@@ -61,10 +69,23 @@ class Visualizer:
 		return fig, ax
 
 	@staticmethod
-	def visualize_game(states: List['StateVector']):
-		# Todo: check and improve this method.
-		fig, ax = plt.subplots()
+	def visualize_game(states: List['StateVector'], interval: int = 250) -> FuncAnimation:
+		"""
+		Animate a game in a figure of pyplot. The pieces are a single image that is updated and blitted every frame.
+
+		Use `gui.export_game` to write a game to a file without a display.
+		"""
+		from gui.renderer import BoardRenderer
+
+		n = states[0].size_of_the_board
+		renderer = BoardRenderer(n)
+		fig, ax = Visualizer.board(n)
+		extent = (-0.5, n - 0.5, n - 0.5, -0.5)
+		pieces = ax.imshow(renderer.pieces_layer(states[0]), extent=extent, zorder=2, animated=True)
+
+		def update(state):
+			pieces.set_data(renderer.pieces_layer(state))
+			return pieces,
 
-		ani = FuncAnimation(fig, update=Visualizer.visualize_state, frames=states, blit=True)
-		return ani
+		return FuncAnimation(fig, func=update, frames=states, interval=interval, blit=True)
 
@@ -0,0 +1,254 @@
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import matplotlib.image as mpimg
+from PIL import Image
+
+import numpy as np
+import os
+import shutil
+import subprocess
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from checkers.piece import PieceHelper
+from checkers.tables import get_tables
+
+
+@lru_cache(maxsize=None)
+def piece_sprite(piece: int, pixels: int) -> Tuple[np.ndarray, np.ndarray]:
+	"""
+	Load the image of a piece once and scale it to a square of pixels x pixels.
+
+	Parameters
+	----------
+	piece: int
+		The piece value.
+	pixels: int
+		Side of the sprite in pixels.
+
+	Returns
+	-------
+	Tuple[np.ndarray, np.ndarray]:
+		The RGB colors (pixels, pixels, 3) and the opacity (pixels, pixels, 1) of the sprite, as floats in [0, 1].
+	"""
+	from gui.mpl_visualizer import Visualizer
+
+	image = Image.fromarray((mpimg.imread(Visualizer.piece_images[piece]) * 255).astype(np.uint8))
+	image = np.asarray(image.convert('RGBA').resize((pixels, pixels), Image.LANCZOS), dtype=np.float32) / 255
+	return image[..., :3], image[..., 3:]
+
+
+class BoardRenderer:
+	"""
+	Renders states to RGB frames without a display.
+
+	The board is drawn once on a figure of its own with the Agg canvas, and its pixels are cached. Every frame restores
+	them, draws the title (the only animated artist) and blits the cached sprites of the pieces on their squares with
+	numpy. The figure, axes and artists are reused by all the frames.
+
+	Attributes:
+	__________
+	size_of_the_board: int
+		Size of the board.
+	cell_pixels: int
+		Approximate side of every square of the board in pixels.
+	figure: Figure
+		The figure, attached to an Agg canvas.
+	"""
+
+	def __init__(self, size_of_the_board: int = 8, cell_pixels: int = 48, dpi: int = 100, piece_scale: float = 0.8):
+		from gui.mpl_visualizer import Visualizer
+
+		self.size_of_the_board = size_of_the_board
+		self.cell_pixels = cell_pixels
+		self.piece_scale = piece_scale
+		n = size_of_the_board
+		self._coordinates = get_tables(size_of_the_board).coordinates
+
+		side = n * cell_pixels / dpi / 0.8
+		self.figure = Figure(figsize=(side, side), dpi=dpi)
+		self._canvas = FigureCanvasAgg(self.figure)
+		self._axes = self.figure.add_axes((0.1, 0.05, 0.8, 0.8))
+
+		self._axes.imshow(Visualizer.plain_board(n), cmap='gist_ncar', extent=(-0.5, n - 0.5, n - 0.5, -0.5),
+		                  interpolation='nearest')
+		self._axes.set_xticks(range(n), range(1, n + 1))
+		self._axes.set_yticks(range(n), range(1, n + 1))
+		self._axes.xaxis.tick_top()
+		self._title = self.figure.text(0.5, 0.96, '', ha='center', va='top', animated=True)
+
+		self._canvas.draw()
+		self._background = self._canvas.copy_from_bbox(self.figure.bbox)
+		self._frame = np.array(self._canvas.buffer_rgba())[..., :3]
+
+		# pixels of the squares, from the top left corner of the canvas.
+		height = self._frame.shape[0]
+		x0, y0, x1, y1 = self._axes.get_window_extent().extents
+		edges_x = np.round(np.linspace(x0, x1, n + 1)).astype(int)
+		edges_y = np.round(np.linspace(height - y1, height - y0, n + 1)).astype(int)
+		square = min(np.diff(edges_x).min(), np.diff(edges_y).min())
+		self._sprite_pixels = pixels = max(1, int(square * piece_scale))
+		self._corners = [(edges_y[i] + (edges_y[i + 1] - edges_y[i] - pixels) // 2,
+		                  edges_x[j] + (edges_x[j + 1] - edges_x[j] - pixels) // 2)
+		                 for i, j in self._coordinates.tolist()]
+
+		# sprites premultiplied by their opacity, so that blending is out = out * transparency + color.
+		self._sprites = {}
+		for piece in Visualizer.piece_images:
+			colors, alpha = piece_sprite(piece, pixels)
+			self._sprites[piece] = (colors * alpha * 255, 1 - alpha)
+
+	@property
+	def frame_shape(self) -> Tuple[int, int, int]:
+		return self._frame.shape
+
+	def pieces_layer(self, state: 'StateVector', cell_pixels: Optional[int] = None) -> np.ndarray:
+		"""
+		Return an RGBA image with the pieces of a state, to be drawn over the board, e.g., with `imshow`.
+
+		Parameters
+		----------
+		state: StateVector
+			The state.
+		cell_pixels: Optional[int]
+			Side of every square in pixels. By default, the one of the frames.
+
+		Returns
+		-------
+		np.ndarray:
+			float array of shape (n * cell_pixels, n * cell_pixels, 4).
+		"""
+		cell = self.cell_pixels if cell_pixels is None else cell_pixels
+		pixels = max(1, int(cell * self.piece_scale))
+		margin = (cell - pixels) // 2
+		n = self.size_of_the_board
+		layer = np.zeros((n * cell, n * cell, 4), dtype=np.float32)
+
+		values = np.asarray(state)[:-1]
+		for k in np.flatnonzero(values).tolist():
+			i, j = self._coordinates[k]
+			colors, alpha = piece_sprite(int(values[k]), pixels)
+			y, x = i * cell + margin, j * cell + margin
+			layer[y: y + pixels, x: x + pixels, :3] = colors
+			layer[y: y + pixels, x: x + pixels, 3:] = alpha
+
+		return layer
+
+	def render(self, state: 'StateVector', title: Optional[str] = None) -> np.ndarray:
+		"""
+		Render a state.
+
+		Parameters
+		----------
+		state: StateVector
+			The state.
+		title: Optional[str]
+			Title of the frame.
+
+		Returns
+		-------
+		np.ndarray:
+			uint8 array of shape `BoardRenderer.frame_shape` with the RGB frame. It is overwritten by the next call.
+		"""
+		self._canvas.restore_region(self._background)
+		self._title.set_text(title or '')
+		self.figure.draw_artist(self._title)
+		frame = self._frame
+		frame[:] = np.asarray(self._canvas.buffer_rgba())[..., :3]
+
+		pixels = self._sprite_pixels
+		values = np.asarray(state)[:-1]
+		for k in np.flatnonzero(values).tolist():
+			colors, transparency = self._sprites[int(values[k])]
+			y, x = self._corners[k]
+			region = frame[y: y + pixels, x: x + pixels]
+			region[:] = region * transparency + colors
+
+		return frame
+
+	def render_game(self, history: Iterable['StateVector']) -> Iterator[np.ndarray]:
+		"""Render every state of a history, titled with its ply and the player in turn."""
+		for ply, state in enumerate(history):
+			turn = 'light' if state[-1] == PieceHelper.light else 'dark'
+			yield self.render(state, f'ply {ply}, {turn} to move')
+
+
+def export_game(
+		history: Iterable['StateVector'],
+		path: str,
+		fps: float = 4,
+		size_of_the_board: Optional[int] = None,
+		cell_pixels: int = 48,
+		renderer: Optional[BoardRenderer] = None
+) -> List[str]:
+	"""
+	Render a whole game to a file.
+
+	The format is given by the extension of path:
+
+	- '.gif': an animated GIF.
+	- '.mp4': an H.264 video. It needs ffmpeg in the PATH.
+	- '.png': a sequence of PNG files. If path contains '{}', it is formatted with the ply, otherwise the ply is added
+	  before the extension, e.g., 'game.png' gives 'game_0000.png', 'game_0001.png', ...
+
+	Parameters
+	----------
+	history: Iterable[StateVector]
+		The states of the game, e.g., the history returned by `CheckersGame.simulate_game`.
+	path: str
+		Path of the file.
+	fps: float
+		Frames per second of the GIF and MP4 files.
+	size_of_the_board: Optional[int]
+		Size of the board. By default, the one of the first state.
+	cell_pixels: int
+		Side of every square of the board in pixels.
+	renderer: Optional[BoardRenderer]
+		Renderer to reuse, e.g., when exporting many games.
+
+	Returns
+	-------
+	List[str]:
+		The paths of the files written.
+	"""
+	history = list(history)
+	if renderer is None:
+		if size_of_the_board is None:
+			size_of_the_board = getattr(history[0], 'size_of_the_board', 8)
+		renderer = BoardRenderer(size_of_the_board, cell_pixels)
+
+	extension = os.path.splitext(path)[1].lower()
+	frames = renderer.render_game(history)
+
+	if extension == '.gif':
+		# all the frames share the palette of the first one, which is computed once.
+		first = Image.fromarray(next(frames)).quantize(colors=64, method=Image.Quantize.FASTOCTREE)
+		images = [first] + [Image.fromarray(frame).quantize(palette=first, dither=Image.Dither.NONE) for frame in frames]
+		images[0].save(path, save_all=True, append_images=images[1:], duration=int(1000 / fps), loop=0, optimize=False)
+		return [path]
+
+	if extension == '.png':
+		pattern = path if '{}' in path else f'{os.path.splitext(path)[0]}_{{:04d}}.png'
+		paths = []
+		for ply, frame in enumerate(frames):
+			paths.append(pattern.format(ply))
+			Image.fromarray(frame).save(paths[-1], compress_level=1)
+		return paths
+
+	if extension == '.mp4':
+		ffmpeg = shutil.which('ffmpeg')
+		if ffmpeg is None:
+			raise Exception('ffmpeg is needed to export MP4 files, but it is not in the PATH.')
+
+		height, width, _ = renderer.frame_shape
+		command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}',
+		           '-r', str(fps), '-i', '-', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', path]
+		with subprocess.Popen(command, stdin=subprocess.PIPE) as process:
+			for frame in frames:
+				process.stdin.write(np.ascontiguousarray(frame).tobytes())
+			process.stdin.close()
+			if process.wait() != 0:
+				raise Exception(f'ffmpeg failed to write {path}.')
+		return [path]
+
+	raise Exception(f'Unknown format {extension}. The available ones are .gif, .mp4 and .png.')
@@ -1,12 +1,28 @@
-def flatten_list(list_of_lists, remove_duplicates=False):
-	list_ = sum(list_of_lists, [])
-	if remove_duplicates:
-		list_ = rm_duplicates(list_)
-	return list_
+from itertools import chain
 
 
-def rm_duplicates(list_):
-	# Todo: Implement this method
+def flatten_list(list_of_lists, remove_duplicates=False, key=None):
+	"""Concatenate lists in linear time. With remove_duplicates, only the first appearance of every item is kept."""
+	list_ = list(chain.from_iterable(list_of_lists))
+	if remove_duplicates:
+		list_ = rm_duplicates(list_, key)
 	return list_
 
 
+def rm_duplicates(list_, key=None):
+	"""
+	Remove the repeated items of a list in linear time, keeping the first appearance of every item in order.
+
+	The items are compared by key(item), which must be hashable, or by themselves if key is None, e.g., arrays such as
+	StateVector need a key like `StateVector.packed_key`.
+	"""
+	if key is None:
+		return list(dict.fromkeys(list_))
+	seen = set()
+	unique = []
+	for item in list_:
+		k = key(item)
+		if k not in seen:
+			seen.add(k)
+			unique.append(item)
+	return unique
@@ -0,0 +1,778 @@
+import json
+import os
+import pickle
+import pstats
+import random
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from checkers import StateVector, StateTransitions, BitBoard, BatchedSimulator, CheckersGame, UniformPlayer, \
+	AlphaBetaPlayer, MCTSPlayer, StateHistory, MoveHistory, GameRecordWriter, GameRecordReader, EndgameTablebase, \
+	OpeningBook, Instrumentation
+from checkers.records import pack_positions, unpack_positions
+from checkers.piece import PieceHelper
+from checkers.perft import perft, run_perft, REFERENCE_NODE_COUNTS
+from checkers.tables import BoardTables, get_tables
+from checkers.transposition import TranspositionTable
+from checkers.zobrist import get_zobrist_keys
+
+
+@pytest.fixture
+def numpy_backend():
+	yield
+	StateTransitions.set_backend('numpy')
+
+
+def random_states(number_of_games=5, size_of_the_board=8, seed=0):
+	"""Yield the states visited by random games."""
+	rnd = random.Random(seed)
+	for _ in range(number_of_games):
+		state = StateVector(size_of_the_board)
+		while True:
+			yield state
+			next_states = StateTransitions._feasible_next_moves_numpy(state)
+			if not next_states:
+				break
+			state = rnd.choice(next_states)
+
+
+@pytest.mark.parametrize('size_of_the_board', [6, 8, 10])
+def test_bitboard_backend_matches_numpy_backend(numpy_backend, size_of_the_board):
+	for state in random_states(size_of_the_board=size_of_the_board):
+		StateTransitions.set_backend('numpy')
+		expected = [s.tobytes() for s in StateTransitions.feasible_next_moves(state)]
+		StateTransitions.set_backend('bitboard')
+		obtained = [s.tobytes() for s in StateTransitions.feasible_next_moves(state)]
+
+		assert obtained == expected
+
+
+def test_bitboard_round_trip():
+	for state in random_states(number_of_games=1):
+		assert (BitBoard.from_state(state).to_state() == state).all()
+
+
+def test_unknown_backend():
+	with pytest.raises(Exception):
+		StateTransitions.set_backend('does-not-exist')
+
+
+@pytest.mark.parametrize('backend', ['numpy', 'bitboard'])
+def test_perft_reference_counts(backend):
+	for depth in range(1, 4):
+		assert run_perft(depth, backend=backend).nodes == REFERENCE_NODE_COUNTS[depth]
+
+
+def test_perft_from_fen():
+	state = StateVector.from_fen('B:W18,K30:B3,7,22')
+	assert perft(state, 1) == 2
+	assert perft(state, 0) == 1
+
+
+def test_fen_round_trip():
+	assert StateVector.from_fen('W:W1-12:B21-32').to_fen() == StateVector().to_fen()
+	for state in random_states(number_of_games=1):
+		assert (StateVector.from_fen(state.to_fen()) == state).all()
+
+
+@pytest.mark.parametrize('size_of_the_board', [6, 8, 10])
+def test_tables_match_coordinates(size_of_the_board):
+	state = StateVector(size_of_the_board)
+	tables = get_tables(size_of_the_board)
+	for k in range(len(state) - 1):
+		i, j = state.from_index_to_coordinate(k)
+		assert tuple(tables.coordinates[k]) == (i, j)
+		for direction, (d_i, d_j) in enumerate(BoardTables.diagonals):
+			for steps, table in ((1, tables.neighbours), (2, tables.jumps)):
+				coordinate = (i + steps * d_i, j + steps * d_j)
+				expected = state.from_coordinate_to_index(coordinate) if state.coordinate_in_board(coordinate) else -1
+				assert table[k, direction] == expected
+
+
+def test_batched_simulator_follows_the_rules():
+	simulator = BatchedSimulator(seed=0)
+	histories, winners = simulator.simulate_games(20, number_of_moves=300)
+
+	assert len(histories) == len(winners) == 20
+	for history, winner in zip(histories, winners):
+		assert all(isinstance(s, StateVector) for s in history)
+		for state, next_state in zip(history, history[1:]):
+			assert next_state.tobytes() in {s.tobytes() for s in StateTransitions.feasible_next_moves(state)}
+		assert len(history) == 302 or not StateTransitions.feasible_next_moves(history[-1])
+		assert winner == CheckersGame.decide_winner(history[-1])
+
+	states = [s for history in histories[:3] for s in history]
+	expected = [len(StateTransitions.feasible_next_moves(s)) for s in states]
+	assert simulator.count_feasible_moves(np.array(states)).tolist() == expected
+
+
+def test_batched_simulator_is_reproducible():
+	first = BatchedSimulator(seed=3).simulate_games(5, number_of_moves=50)
+	second = BatchedSimulator(seed=3).simulate_games(5, number_of_moves=50)
+
+	assert first[1] == second[1]
+	assert all((np.array(a) == np.array(b)).all() for a, b in zip(first[0], second[0]))
+
+
+def test_state_vector_pickle_keeps_size():
+	state = pickle.loads(pickle.dumps(StateVector(10)))
+	assert state.size_of_the_board == 10
+	assert (state == StateVector(10)).all()
+
+
+def test_parallel_simulation_is_independent_of_workers():
+	game = CheckersGame(light_player=UniformPlayer(), dark_player=UniformPlayer())
+
+	def as_bytes(histories, results):
+		return [[s.tobytes() for s in history] for history in histories], [int(r) for r in results]
+
+	sequential = as_bytes(*game.simulate_games(6, number_of_moves=60, seed=11))
+	parallel = as_bytes(*game.simulate_games(6, number_of_moves=60, n_workers=2, seed=11))
+	assert sequential == parallel
+
+	# the players of the caller are not left seeded.
+	assert getattr(game.light_player, '_random', None) is None and getattr(game.dark_player, '_random', None) is None
+
+
+def test_move_list_matches_successors():
+	for state in random_states(number_of_games=3, seed=2):
+		before = state.tobytes()
+		obtained = []
+		for move in StateTransitions.feasible_next_move_list(state):
+			StateTransitions.make_move(state, move)
+			obtained.append(state.tobytes())
+			StateTransitions.unmake_move(state, move)
+			assert state.tobytes() == before
+
+		assert obtained == [s.tobytes() for s in StateTransitions._feasible_next_moves_numpy(state)]
+
+
+def test_zobrist_hash_is_updated_incrementally():
+	for state in random_states(number_of_games=2, seed=4):
+		state.zobrist_hash
+		for move in StateTransitions.feasible_next_move_list(state):
+			StateTransitions.make_move(state, move)
+			incremental = state.zobrist_hash
+			state.invalidate_hash()
+			assert incremental == state.zobrist_hash
+			StateTransitions.unmake_move(state, move)
+
+	# writes that do not go through the state itself do not leave a stale hash.
+	state = StateVector()
+	state.zobrist_hash
+	state[:-1][12] = PieceHelper.piece
+	assert state.zobrist_hash == StateVector.from_fen(state.to_fen()).zobrist_hash
+	np.copyto(state, StateVector())
+	assert state.zobrist_hash == StateVector().zobrist_hash
+	copy = state.copy()
+	np.asarray(copy)[0] = PieceHelper.empty_square
+	assert copy.zobrist_hash == StateVector.from_fen(copy.to_fen()).zobrist_hash != state.zobrist_hash
+
+
+def test_position_key():
+	state = StateVector()
+	state.zobrist_hash
+	state[12] = 1
+	assert state.zobrist_hash == StateVector.from_fen(state.to_fen()).zobrist_hash
+	assert hash(state) == hash(StateVector.from_fen(state.to_fen()))
+
+	positions = {state.position_key(): 'a', StateVector().position_key(): 'b'}
+	assert positions[StateVector.from_fen(state.to_fen()).position_key()] == 'a'
+	assert StateVector().same_position(StateVector())
+	assert not StateVector().same_position(state)
+
+
+def test_successors_are_not_repeated(numpy_backend):
+	from utils import flatten_list, rm_duplicates
+
+	assert flatten_list([[1, 2], [], [2, 3, 1]]) == [1, 2, 2, 3, 1]
+	assert flatten_list([[1, 2], [], [2, 3, 1]], remove_duplicates=True) == [1, 2, 3]
+	assert rm_duplicates([[1], [2], [1]], key=tuple) == [[1], [2]]
+
+	state = StateVector.from_fen('W:W9:B14')
+	assert state.packed_key() == int.from_bytes(pack_positions(np.asarray(state)[None]).tobytes(), 'little')
+	assert state.packed_key() == StateVector.from_fen(state.to_fen()).packed_key() != StateVector().packed_key()
+
+	simulator = BatchedSimulator()
+	for state in random_states(number_of_games=3, seed=5):
+		keys = [s.packed_key() for s in StateTransitions.feasible_next_moves(state)]
+		assert len(keys) == len(set(keys))
+		assert len(StateTransitions.feasible_next_move_list(state)) == len(keys)
+		assert simulator.count_feasible_moves(np.asarray(state)[None]).tolist() == [len(keys)]
+		StateTransitions.set_backend('bitboard')
+		assert [s.packed_key() for s in StateTransitions.feasible_next_moves(state)] == keys
+		StateTransitions.set_backend('numpy')
+
+
+def test_alpha_beta_player_takes_winning_capture():
+	player = AlphaBetaPlayer(max_depth=3, time_limit_ms=None)
+	next_state = player.next_move(StateVector.from_fen('W:W1,18:B23'))
+
+	assert next_state.to_fen() == 'B:W1,27:B'
+	assert player.depth_reached >= 1
+	assert player.nodes_searched > 0
+
+
+def test_alpha_beta_player_respects_node_limit():
+	player = AlphaBetaPlayer(time_limit_ms=None, node_limit=500)
+	next_state = player.next_move(StateVector())
+
+	assert player.nodes_searched <= 500
+	assert next_state.tobytes() in {s.tobytes() for s in StateTransitions.feasible_next_moves(StateVector())}
+	assert player.next_move(StateVector.from_fen('W:W:B1')) is None
+
+
+def test_mcts_player_takes_winning_capture():
+	player = MCTSPlayer(playouts=32, seed=0)
+	assert player.next_move(StateVector.from_fen('W:W1,18:B23')).to_fen() == 'B:W1,27:B'
+	assert player.playouts_done == 32
+
+
+def test_mcts_player_reuses_tree():
+	player = MCTSPlayer(playouts=64, batch_size=8, seed=0)
+	state = player.next_move(StateVector())
+	reply = StateTransitions.feasible_next_moves(state)[0]
+
+	node = player._reuse_tree(reply)
+	assert node is not None and node.visits > 0
+	assert player.next_move(reply).tobytes() in {s.tobytes() for s in StateTransitions.feasible_next_moves(reply)}
+
+
+@pytest.mark.parametrize('policy', TranspositionTable.policies)
+def test_transposition_table_policies(policy):
+	table = TranspositionTable(memory_mb=0.001, policy=policy)
+	key = 12345
+	other = key + (table.number_of_entries // table.ways) * 7
+
+	table.store(key, 5, TranspositionTable.exact, 1.5, 42)
+	assert table.probe(key) == (5, TranspositionTable.exact, 1.5, 42)
+
+	table.store(other, 2, TranspositionTable.lower_bound, -3., 0)
+	if policy == 'depth':
+		assert table.probe(other) is None and table.rejections == 1 and table.collisions == 1
+	else:
+		assert table.probe(other) == (2, TranspositionTable.lower_bound, -3., 0)
+	assert (table.probe(key) is not None) == (policy != 'always')
+
+	if policy == 'two_tier':
+		# a deeper result takes the first tier and pushes the old entry to the second one.
+		third = key + (table.number_of_entries // table.ways) * 3
+		table.store(third, 7, TranspositionTable.exact, 0.5, 0)
+		assert table.probe(third)[0] == 7 and table.probe(key)[0] == 5 and table.probe(other) is None
+		# the position in the second tier moves up without leaving a stale copy behind.
+		table.store(key, 8, TranspositionTable.exact, 2.5, 0)
+		assert table.probe(key)[0] == 8 and table.probe(third)[0] == 7
+		first = (key & table._mask) * table.ways
+		assert table._keys[first:first + 2].tolist().count(key) == 1
+
+
+def test_alpha_beta_player_with_transposition_table():
+	table = TranspositionTable(memory_mb=1, policy='two_tier')
+	with_table = AlphaBetaPlayer(max_depth=5, time_limit_ms=None, transposition_table=table)
+	without_table = AlphaBetaPlayer(max_depth=5, time_limit_ms=None)
+
+	state = StateVector()
+	assert with_table.next_move(state).tobytes() == without_table.next_move(state).tobytes()
+	assert with_table.score == without_table.score
+	assert with_table.nodes_searched < without_table.nodes_searched
+	assert table.hits > 0 and table.stores > 0
+
+
+@pytest.mark.parametrize('compact, container', [('states', StateHistory), ('moves', MoveHistory)])
+def test_compact_histories_match_list_history(compact, container):
+	game = CheckersGame(light_player=UniformPlayer(), dark_player=UniformPlayer())
+
+	game.light_player.seed(1), game.dark_player.seed(2)
+	expected, expected_winner = game.simulate_game(number_of_moves=80)
+	game.light_player.seed(1), game.dark_player.seed(2)
+	history, winner = game.simulate_game(number_of_moves=80, compact=compact)
+
+	assert isinstance(history, container)
+	assert winner == expected_winner
+	assert len(history) == len(expected)
+	assert [s.tobytes() for s in history] == [s.tobytes() for s in expected]
+	assert history[-1].tobytes() == expected[-1].tobytes()
+	assert pickle.loads(pickle.dumps(history))[5].tobytes() == expected[5].tobytes()
+
+	empty = pickle.loads(pickle.dumps(StateHistory()))
+	empty.append(StateVector())
+	assert len(empty) == 1 and empty[0].tobytes() == StateVector().tobytes()
+
+
+def test_iter_game_streams_plies():
+	game = CheckersGame(light_player=UniformPlayer(), dark_player=UniformPlayer())
+	plies = [ply for ply, _ in game.iter_game(number_of_moves=5)]
+	assert plies == list(range(7))
+
+	state = StateVector()
+	for ply, move in game.iter_game(number_of_moves=5, yield_moves=True):
+		assert move in StateTransitions.feasible_next_move_list(state)
+		StateTransitions.make_move(state, move)
+
+	# without workers, every game is yielded before the next one is played.
+	with Instrumentation() as instrumentation:
+		games = game.iter_simulate_games(3, number_of_moves=5, seed=0)
+		assert next(games)[0] == 0
+		assert instrumentation.counters['games'] == 1
+		assert [i for i, _, _ in games] == [1, 2]
+		assert instrumentation.counters['games'] == 3
+
+
+def test_pack_positions_round_trip():
+	states = np.array([np.asarray(s) for s in random_states(3)], dtype=np.int8)
+	packed = pack_positions(states)
+	assert packed.shape == (len(states), 17)
+	assert (unpack_positions(packed) == states).all()
+
+
+def test_game_records_round_trip(tmp_path):
+	path = str(tmp_path / 'games.ckr')
+	game = CheckersGame(light_player=UniformPlayer(), dark_player=UniformPlayer())
+	histories, results = game.simulate_games(6, number_of_moves=60, seed=3)
+
+	with GameRecordWriter(path) as writer:
+		ordered, written = game.simulate_games(6, number_of_moves=60, n_workers=2, seed=3, writer=writer)
+	assert ordered == [] and written == results
+
+	with GameRecordWriter(path, append=True) as writer:
+		writer.write_game(histories[0], results[0])
+
+	reader = GameRecordReader(path)
+	assert len(reader) == 7
+	assert reader.number_of_positions == sum(len(h) for h in histories) + len(histories[0])
+	assert list(reader.results) == results + results[:1]
+	for i, history in enumerate(histories + histories[:1]):
+		assert [s.tobytes() for s in reader.game_states(i)] == [s.tobytes() for s in history]
+
+	j = reader.offsets[3] + 2
+	assert reader.game_of_position(j) == 3
+	assert reader.position(j).tobytes() == histories[3][2].tobytes()
+
+
+def test_batched_successors_match_reference():
+	states = list(random_states(3))
+	games, successors = BatchedSimulator().successors(np.array([np.asarray(s) for s in states]))
+	for i, state in enumerate(states):
+		expected = sorted(s.tobytes() for s in StateTransitions.feasible_next_moves(state))
+		assert sorted(s.tobytes() for s in successors[games == i]) == expected
+
+
+@pytest.fixture(scope='module')
+def small_tablebase():
+	return EndgameTablebase.generate(max_pieces=3, size_of_the_board=6)
+
+
+def test_tablebase_is_consistent_with_the_moves(small_tablebase):
+	tablebase = small_tablebase
+	states = tablebase._enumerate_positions()
+	assert (tablebase.indices(states) == np.arange(len(tablebase))).all()
+
+	for i in np.random.default_rng(0).integers(0, len(tablebase), 500):
+		state = StateVector(6)
+		state[:] = states[i]
+		assert tablebase.index(state) == i
+
+		winner, distance = tablebase.probe(state)
+		successors = [tablebase.probe(s) for s in StateTransitions.feasible_next_moves(state)]
+		if not successors:
+			assert (winner, distance) == (CheckersGame.decide_winner(state), 0)
+		elif winner == state.turn:
+			assert distance == 1 + min(d for w, d in successors if w == state.turn)
+		elif winner == -state.turn:
+			assert all(w == -state.turn for w, _ in successors)
+			assert distance == 1 + max(d for _, d in successors)
+		else:
+			assert all(w != state.turn for w, _ in successors) and (0, 0) in successors
+
+
+def test_tablebase_file_round_trip(small_tablebase, tmp_path):
+	path = str(tmp_path / 'tablebase.ckt')
+	small_tablebase.save(path)
+	loaded = EndgameTablebase.load(path)
+	assert (np.asarray(loaded.entries) == small_tablebase.entries).all()
+	assert pickle.loads(pickle.dumps(loaded)).path == path
+
+	state = StateVector.from_fen('W:WK1:B10,11', 6)
+	assert loaded.probe(state) == small_tablebase.probe(state)
+	assert loaded.probe(StateVector(6)) is None
+
+
+def test_game_stops_at_the_tablebase(small_tablebase):
+	state = StateVector.from_fen('W:WK1:B10,11', 6)
+	winner, distance = small_tablebase.probe(state)
+
+	game = CheckersGame(light_player=UniformPlayer(), dark_player=UniformPlayer(), tablebase=small_tablebase)
+	history, result = game.simulate_game(initial_state=state)
+	assert len(history) == 1 and result == winner
+
+	player = AlphaBetaPlayer(max_depth=distance + 1, time_limit_ms=None, tablebase=small_tablebase)
+	for _ in range(distance):
+		state = player.next_move(state)
+	assert player.next_move(state) is None
+	assert CheckersGame.decide_winner(state) == winner
+
+
+def test_vectorized_zobrist_hashes():
+	states = list(random_states(2))
+	hashes = get_zobrist_keys(8).hashes(np.array([np.asarray(s) for s in states]))
+	assert [int(h) for h in hashes] == [s.zobrist_hash for s in states]
+
+
+def test_opening_book(tmp_path):
+	book = OpeningBook.build(300, plies=4, seed=0)
+	assert (book.keys[1:] > book.keys[:-1]).all()
+	assert sum(book.lookup(StateVector())) == 300
+
+	path = str(tmp_path / 'book.ckb')
+	book.save(path)
+	loaded = OpeningBook.load(path)
+	assert len(loaded) == len(book) and loaded.lookup(StateVector()) == book.lookup(StateVector())
+
+	state = StateVector()
+	move = loaded.best_move(state)
+	assert any(move.tobytes() == s.tobytes() for s in StateTransitions.feasible_next_moves(state))
+	assert loaded.best_move(state, min_games=1000) is None
+
+	player = AlphaBetaPlayer(max_depth=3, time_limit_ms=None, opening_book=loaded)
+	assert player.next_move(state).tobytes() == move.tobytes()
+	assert player.nodes_searched == 0
+
+
+def test_piece_helper_kernels():
+	values = np.arange(-PieceHelper.queen, PieceHelper.queen + 1, dtype=PieceHelper.dtype)
+	expected = [PieceHelper.dark, PieceHelper.dark, PieceHelper.empty_square, PieceHelper.light, PieceHelper.light]
+	assert [PieceHelper.piece_color(v) for v in values] == expected
+	assert PieceHelper.piece_colors(values).tolist() == expected
+	assert PieceHelper.get_diagonals(PieceHelper.dark) == ((-1, 1), (-1, -1))
+	assert PieceHelper.get_diagonals(np.int8(PieceHelper.queen)) is PieceHelper.get_diagonals(PieceHelper.queen)
+	assert PieceHelper.get_diagonals(PieceHelper.empty_square) == ()
+
+
+def test_instrumentation_counts_the_games(tmp_path):
+	game = CheckersGame(light_player=UniformPlayer(), dark_player=UniformPlayer())
+	instrumentation = Instrumentation()
+	histories, _ = game.simulate_games(4, number_of_moves=60, seed=0, instrumentation=instrumentation)
+	assert StateTransitions.instrumentation is None
+
+	counters = instrumentation.counters
+	assert counters['games'] == 4
+	assert counters['plies'] == sum(len(h) - 1 for h in histories)
+	assert counters['captures'] == sum(
+		int(np.count_nonzero(h[0][:-1]) - np.count_nonzero(h[-1][:-1])) for h in histories)
+	assert counters['movegen_calls'] >= counters['plies'] and counters['deepcopies'] > 0
+	assert 0 < instrumentation.timers['next_move'] <= instrumentation.timers['total']
+	assert json.loads(instrumentation.to_json())['counters'] == counters
+
+	profiled = Instrumentation(profile=True)
+	game.simulate_games(4, number_of_moves=60, n_workers=2, seed=0, instrumentation=profiled)
+	assert profiled.counters == counters
+
+	path = str(tmp_path / 'games.pstats')
+	profiled.dump_stats(path)
+	functions = [f for _, _, f in pstats.Stats(path).stats]
+	assert 'feasible_next_moves' in functions
+
+
+def test_renderer_exports_games(tmp_path):
+	from PIL import Image
+	from gui import BoardRenderer, Visualizer, export_game
+
+	game = CheckersGame(light_player=UniformPlayer(), dark_player=UniformPlayer())
+	history, _ = game.simulate_game(number_of_moves=10)
+
+	renderer = BoardRenderer()
+	first = renderer.render(history[0]).copy()
+	assert first.shape == renderer.frame_shape and first.dtype == np.uint8
+	assert (renderer.render(history[1]) != first).any()
+	assert (renderer.render(history[0]) == first).all()
+
+	gif = str(tmp_path / 'game.gif')
+	assert export_game(history, gif, renderer=renderer) == [gif]
+	assert Image.open(gif).n_frames == len(history)
+
+	pngs = export_game(history[:3], str(tmp_path / 'game.png'))
+	assert [p.rsplit('_', 1)[1] for p in pngs] == ['0000.png', '0001.png', '0002.png']
+
+	with pytest.raises(Exception):
+		export_game(history, str(tmp_path / 'game.avi'))
+
+	animation = Visualizer.visualize_game(history[:3])
+	animation.save(str(tmp_path / 'animation.gif'), writer='pillow')
+
+
+def test_import_loads_only_the_engine(tmp_path):
+	# in a fresh interpreter, from a directory without the data files of the GUI.
+	path = os.pathsep.join(p for p in sys.path if p)
+	script = ('import sys, checkers; '
+	          'print(",".join(m for m in sys.modules if m.split(".")[0] in ("matplotlib", "PIL", "gui")))')
+	output = subprocess.run([sys.executable, '-c', script], cwd=tmp_path, env={**os.environ, 'PYTHONPATH': path},
+	                        capture_output=True, text=True, check=True)
+	assert output.stdout.strip() == ''
+
+	script = 'from gui import Visualizer; print(Visualizer.piece_image(1).shape)'
+	output = subprocess.run([sys.executable, '-c', script], cwd=tmp_path, env={**os.environ, 'PYTHONPATH': path},
+	                        capture_output=True, text=True, check=True)
+	assert output.stdout.startswith('(')
+
+
+def test_is_valid_and_move_notation():
+	state = StateVector()
+	moves = StateTransitions.feasible_next_move_list(state)
+	assert sorted(m.notation for m in moves) == ['10-14', '10-15', '11-15', '11-16', '12-16', '9-13', '9-14']
+	for next_state in StateTransitions.feasible_next_moves(state):
+		assert StateTransitions.is_valid(state, next_state)
+	assert not StateTransitions.is_valid(state, state)
+	assert not StateTransitions.is_valid(state, StateVector(6))
+
+	jump = StateVector.from_fen('W:W9:B14')
+	assert [m.notation for m in StateTransitions.feasible_next_move_list(jump)] == ['9x18']
+
+
+def test_match_server():
+	import asyncio
+	from checkers.server import MatchServer, _Match, load_test
+
+	server = MatchServer(move_time_ms=5000, number_of_moves=60, max_games=4)
+	report = asyncio.run(load_test(8, games_per_client=2, server=server))
+	assert report['games'] == 16 and report['moves'] > 0
+	assert report['server']['games_finished'] == 16 and report['server']['errors'] == 0
+
+	async def session():
+		server = MatchServer(move_time_ms=200)
+		_, port = await server.start()
+		reader, writer = await asyncio.open_connection('127.0.0.1', port)
+
+		async def send(line):
+			writer.write(line.encode() + b'\n')
+			await writer.drain()
+
+		async def receive():
+			return (await reader.readline()).decode().split()
+
+		await send('PLAY light')
+		assert (await receive())[2] == 'light'
+		assert (await receive())[:2] == ['STATE', StateVector().to_fen()]
+		await send('MOVE 9-18')
+		assert (await receive())[0] == 'ERROR'
+		next_state = StateTransitions.feasible_next_moves(StateVector())[0]
+		await send(f'MOVE {next_state.to_fen()}')
+		assert (await receive())[1] == next_state.to_fen()
+		while (line := await receive())[0] == 'STATE':
+			pass
+		assert line == ['END', 'dark', 'time']
+
+		# QUIT closes the connection during a game too.
+		await send('PLAY light')
+		assert (await receive())[0] == 'GAME'
+		assert (await receive())[0] == 'STATE'
+		await send('QUIT')
+		assert await asyncio.wait_for(reader.read(), 1) == b''
+
+		writer.close()
+		await server.close()
+		return server.statistics
+
+	statistics = asyncio.run(session())
+	assert statistics['timeouts'] == 1 and statistics['errors'] == 1
+
+	async def forward_to_finished_match():
+		# a line waiting for room in the inbox of a game is dropped when the game finishes.
+		match = _Match(0, None, None, inbox_size=1)
+		await MatchServer._forward(match, 'first')
+		waiting = asyncio.ensure_future(MatchServer._forward(match, 'second'))
+		await asyncio.sleep(0.01)
+		assert not waiting.done()
+		match.finished.set()
+		await asyncio.wait_for(waiting, 1)
+		await MatchServer._forward(match, 'third')
+		return match.inbox.qsize()
+
+	assert asyncio.run(forward_to_finished_match()) == 1
+
+
+def test_tournament_checkpoint_and_ratings(tmp_path):
+	from checkers.tournament import Tournament, elo_ratings, sprt
+
+	checkpoint = str(tmp_path / 'tournament.jsonl')
+	players = [UniformPlayer, UniformPlayer, UniformPlayer]
+	tournament = Tournament(players, names=['a', 'b', 'c'], rounds=2, number_of_moves=30, checkpoint=checkpoint)
+	assert len(tournament.schedule()) == 12
+	light, dark = [game[1] for game in tournament.schedule()[:2]], [game[2] for game in tournament.schedule()[:2]]
+	assert light == dark[::-1]
+
+	standings = tournament.run()
+	assert sum(row['games'] for row in standings) == 24 and sum(row['points'] for row in standings) == 12
+	assert abs(sum(row['elo'] for row in standings)) < 1e-6
+
+	resumed = Tournament(players, names=['a', 'b', 'c'], rounds=2, number_of_moves=30, checkpoint=checkpoint)
+	assert resumed.results == tournament.results
+	assert resumed.run() == standings
+	with pytest.raises(Exception):
+		Tournament(players, names=['a', 'b', 'c'], rounds=3, number_of_moves=30, checkpoint=checkpoint)
+
+	# a run killed while writing a game leaves a cut line, which is dropped and played again.
+	with open(checkpoint) as file:
+		text = file.read()
+	with open(checkpoint, 'w') as file:
+		file.write(text[:-10])
+	resumed = Tournament(players, names=['a', 'b', 'c'], rounds=2, number_of_moves=30, checkpoint=checkpoint)
+	assert len(resumed.results) == 11
+	assert resumed.run() == standings
+	resumed = Tournament(players, names=['a', 'b', 'c'], rounds=2, number_of_moves=30, checkpoint=checkpoint)
+	assert resumed.results == tournament.results
+
+	ratings, widths = elo_ratings(np.array([[0., 75.], [25., 0.]]), np.array([[0., 100.], [100., 0.]]))
+	assert ratings[0] - ratings[1] == pytest.approx(400 * np.log10(75.5 / 25.5))
+	assert (widths > 0).all()
+
+	assert sprt(100, 10, 5, 0, 50)[1] == 'H1'
+	assert sprt(5, 10, 100, 0, 50)[1] == 'H0'
+	assert sprt(5, 1, 5, 0, 50)[1] is None
+	# short one-sided starts of equal players do not stop the test.
+	for wins in range(1, 20):
+		assert sprt(wins, 0, 0) == (0., None) and sprt(0, 0, wins) == (0., None)
+		assert sprt(wins, wins, 0)[1] is None
+	assert sprt(3, 1, 1)[1] is None
+
+
+def test_symmetry_canonicalization(small_tablebase):
+	from checkers.symmetry import canonicalize, canonicalize_states, color_swap, transform_move, transform_result, \
+		transform_state, transform_states
+
+	states = list(random_states(3))
+	canonical, transforms = canonicalize_states(np.array([np.asarray(s) for s in states]))
+	assert (canonical[:, -1] == PieceHelper.light).all()
+	assert (transform_states(canonical, transforms) == np.array(states)).all()
+
+	for i, state in enumerate(states):
+		symmetric, transform = canonicalize(state)
+		assert transform == transforms[i] and symmetric.tobytes() == canonical[i].tobytes()
+		assert transform_state(symmetric, transform).tobytes() == state.tobytes()
+
+		swapped = transform_state(state, color_swap)
+		moves = StateTransitions.feasible_next_move_list(state)
+		assert sorted(m.notation for m in StateTransitions.feasible_next_move_list(swapped)) == \
+			sorted(transform_move(m, color_swap).notation for m in moves)
+		for move in moves[:2]:
+			next_state = state.copy()
+			StateTransitions.make_move(next_state, move)
+			swapped_next = swapped.copy()
+			StateTransitions.make_move(swapped_next, transform_move(move, color_swap))
+			assert transform_state(swapped_next, color_swap).tobytes() == next_state.tobytes()
+
+	assert transform_result(PieceHelper.light, color_swap) == PieceHelper.dark
+
+	state = StateVector.from_fen('B:WK1:B10,11', 6)
+	winner, distance = small_tablebase.probe(state)
+	assert small_tablebase.probe(transform_state(state, color_swap)) == (transform_result(winner, color_swap), distance)
+
+
+def test_adjudication():
+	from checkers.adjudication import Adjudicator
+
+	state = StateVector.from_fen('W:WK1:BK32')
+	game = CheckersGame(UniformPlayer(), UniformPlayer(), adjudicator=Adjudicator(repetitions=None, quiet_plies=10))
+	game.light_player.seed(0)
+	game.dark_player.seed(1)
+	history, winner = game.simulate_game(initial_state=state)
+	assert (len(history), winner, game.end_reason) == (11, PieceHelper.empty_square, 'quiet_moves')
+
+	game.adjudicator = Adjudicator(repetitions=3, quiet_plies=None)
+	game.light_player.seed(2)
+	game.dark_player.seed(3)
+	history, winner = game.simulate_game(initial_state=state)
+	hashes = [s.zobrist_hash for s in history]
+	assert game.end_reason == 'repetition' and winner == PieceHelper.empty_square
+	assert hashes.count(hashes[-1]) == 3 and max(hashes[:-1].count(h) for h in hashes) < 3
+
+	game.adjudicator = Adjudicator(material_margin=2, resign_plies=2)
+	history, winner = game.simulate_game(initial_state=StateVector.from_fen('W:WK1,K3:B32'))
+	assert (len(history), winner, game.end_reason) == (2, PieceHelper.light, 'material')
+
+	# the plies ahead in material are only counted in a row for the same player.
+	adjudicator = Adjudicator(repetitions=None, quiet_plies=None, material_margin=2, resign_plies=2)
+	reasons = [adjudicator.update(StateVector.from_fen(fen)) for fen in ('W:WK1,K3:B32', 'B:W1:BK30,K32', 'W:W1:BK30,K32')]
+	assert reasons == [None, None, 'material']
+
+	game.adjudicator = None
+	game.simulate_game(number_of_moves=3)
+	assert game.end_reason == 'move_limit'
+
+
+def test_feature_planes(tmp_path):
+	from checkers.features import FeatureExtractor
+
+	game = CheckersGame(light_player=UniformPlayer(), dark_player=UniformPlayer())
+	histories, results = game.simulate_games(4, number_of_moves=60, seed=0)
+	states = [s for history in histories for s in history]
+	labels = [r for history, r in zip(histories, results) for _ in history]
+
+	expected = np.zeros((len(states), 5, 8, 8), dtype=np.float32)
+	planes = {PieceHelper.piece: 0, PieceHelper.queen: 1, -PieceHelper.piece: 2, -PieceHelper.queen: 3}
+	for i, state in enumerate(states):
+		for k in np.flatnonzero(state[:-1]):
+			expected[(i, planes[state[k]]) + state.from_index_to_coordinate(k)] = 1
+		expected[i, 4] = state.turn == PieceHelper.light
+
+	extractor = FeatureExtractor()
+	batches = [(p.copy(), l) for p, l in extractor.iter_batches(histories, results, batch_size=50)]
+	assert [len(l) for _, l in batches[:-1]] == [50] * (len(batches) - 1)
+	assert (np.concatenate([p for p, _ in batches]) == expected).all()
+	assert list(np.concatenate([l for _, l in batches])) == labels
+
+	path = str(tmp_path / 'games.ckr')
+	with GameRecordWriter(path) as writer:
+		writer.write_games(histories, results)
+	planes, record_labels = FeatureExtractor(dtype=np.uint8).dataset(GameRecordReader(path), batch_size=64)
+	assert planes.dtype == np.uint8 and (planes == expected).all() and list(record_labels) == labels
+
+	canonical, canonical_labels = FeatureExtractor(canonical=True).dataset(histories, results)
+	turns = np.array([s.turn for s in states])
+	assert (canonical[:, 4] == 1).all() and (canonical_labels == turns * np.array(labels)).all()
+	assert (canonical[turns == 1] == expected[turns == 1]).all()
+
+
+def test_batch_evaluator(tmp_path):
+	from checkers.evaluation import BatchEvaluator
+	from checkers.symmetry import color_swap, transform_state
+
+	states = list(random_states(3))
+	array = np.array([np.asarray(s) for s in states])
+	evaluator = BatchEvaluator()
+	scores = evaluator.evaluate_batch(array)
+	assert evaluator.evaluate(StateVector()) == 0
+	assert scores.tolist() == pytest.approx([evaluator.evaluate(s) for s in states])
+	assert scores.tolist() == pytest.approx([evaluator.evaluate(transform_state(s, color_swap)) for s in states])
+
+	material = BatchEvaluator(weights={'man_table': np.zeros(32), 'king_table': np.zeros(32), 'back_rank': 0,
+	                                   'mobility': 0})
+	assert material.evaluate_batch(array).tolist() == [AlphaBetaPlayer.material(s) for s in states]
+
+	path = str(tmp_path / 'weights.json')
+	BatchEvaluator(weights={'mobility': 5}).save(path)
+	loaded = BatchEvaluator.load(path)
+	assert loaded.weights['mobility'] == 5 and (loaded.weights['man_table'] == evaluator.weights['man_table']).all()
+	with pytest.raises(Exception):
+		BatchEvaluator(weights={'queen': 1})
+
+	for state in states[::10]:
+		moves = StateTransitions.feasible_next_move_list(state)
+		for move, successor in zip(moves, StateTransitions.successor_array(state, moves)):
+			next_state = state.copy()
+			StateTransitions.make_move(next_state, move)
+			assert successor.tobytes() == next_state.tobytes()
+
+	state = states[20]
+	one_at_a_time = AlphaBetaPlayer(max_depth=4, time_limit_ms=None, evaluate=evaluator.evaluate)
+	batched = AlphaBetaPlayer(max_depth=4, time_limit_ms=None, evaluator=evaluator)
+	one_at_a_time.next_move(state)
+	batched.next_move(state)
+	assert batched.score == pytest.approx(one_at_a_time.score)
+	with pytest.raises(Exception):
+		AlphaBetaPlayer(evaluate=AlphaBetaPlayer.material, evaluator=evaluator)
+
+	next_state = MCTSPlayer(playouts=64, seed=0, evaluator=evaluator).next_move(state)
+	assert any(next_state.tobytes() == s.tobytes() for s in StateTransitions.feasible_next_moves(state))